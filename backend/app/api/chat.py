@@ -1,17 +1,27 @@
+import asyncio
+import base64
 import json
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from ..core.deps import get_db, get_current_user
-from ..database.connection import SessionLocal
-from ..database.models import User, ChatSession, ChatMessage
+from ..core.config import settings
+from ..core.deps import get_db, get_async_db, get_current_user
+from ..core.principal_cache import Principal
+from ..database.models import ChatSession, ChatMessage
+from ..services.conversation import conversation_memory
+from ..services.message_writer import message_writer
 from ..services.rag_pipeline import rag_pipeline
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
+MAX_PAGE_SIZE = 200
+
 
 class ChatRequest(BaseModel):
     message: str
@@ -23,6 +33,17 @@ class ChatMessageResponse(BaseModel):
     role: str
     content: str
     sources: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class ChatSessionSummary(BaseModel):
+    id: int
+    title: str
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -43,17 +64,15 @@ class ChatResponse(BaseModel):
     sources: List[dict]
 
 
-@router.post("/", response_model=ChatResponse)
-def chat(
-    request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
+async def _get_or_create_session(db: AsyncSession, request: ChatRequest, user_id: int) -> ChatSession:
     if request.session_id:
-        session = db.query(ChatSession).filter(
-            ChatSession.id == request.session_id,
-            ChatSession.user_id == current_user.id
-        ).first()
+        result = await db.execute(
+            select(ChatSession).where(
+                ChatSession.id == request.session_id,
+                ChatSession.user_id == user_id
+            )
+        )
+        session = result.scalars().first()
         if not session:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -62,97 +81,90 @@ def chat(
     else:
         session = ChatSession(
             title=request.message[:50] + "..." if len(request.message) > 50 else request.message,
-            user_id=current_user.id
+            user_id=user_id
         )
         db.add(session)
-        db.commit()
-        db.refresh(session)
-    
-    user_message = ChatMessage(
-        session_id=session.id,
-        role="user",
-        content=request.message
-    )
-    db.add(user_message)
-    db.commit()
-    
-    chat_history = []
-    previous_messages = db.query(ChatMessage).filter(
-        ChatMessage.session_id == session.id
-    ).order_by(ChatMessage.created_at).all()
-    
-    for msg in previous_messages[:-1]:
-        chat_history.append({"role": msg.role, "content": msg.content})
+        await db.commit()
+        await db.refresh(session)
+        conversation_memory.start_session(session.id)
+    return session
+
+
+def _persist_turn(
+    session_id: int,
+    question: str,
+    answer: Optional[str],
+    asked_at: datetime
+) -> asyncio.Future:
+    """Hand a turn to the write-behind message writer; resolves once it is committed.
+
+    Without an answer (generation failed) only the question is stored. The
+    question keeps `asked_at`, the time its request arrived.
+    """
+    messages = [("user", question)]
+    if answer is not None:
+        messages.append(("assistant", answer))
+    conversation_memory.record(session_id, messages)
+    committed = message_writer.submit(session_id, messages, asked_at=asked_at)
+
+    def on_committed(future: asyncio.Future) -> None:
+        # The summary is built from stored messages, so it waits for the commit
+        if not future.cancelled() and future.exception() is None:
+            conversation_memory.schedule_summary(session_id)
+
+    committed.add_done_callback(on_committed)
+    return committed
+
+
+@router.post("/", response_model=ChatResponse)
+async def chat(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    asked_at = datetime.utcnow()
+    session = await _get_or_create_session(db, request, current_user.id)
+    session_id = session.id
     
     try:
-        result = rag_pipeline.query(
+        result = await rag_pipeline.aquery(
             query=request.message,
             user_id=current_user.id,
-            chat_history=chat_history,
-            user_role=current_user.role
-        )
-        
-        assistant_message = ChatMessage(
-            session_id=session.id,
-            role="assistant",
-            content=result["response"]
-        )
-        db.add(assistant_message)
-        db.commit()
-        
-        return ChatResponse(
-            session_id=session.id,
-            response=result["response"],
-            sources=result["sources"]
+            user_role=current_user.role,
+            load_history=lambda: conversation_memory.aload_history(session_id)
         )
-        
     except Exception as e:
+        _persist_turn(session_id, request.message, None, asked_at)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating response: {str(e)}"
         )
 
+    committed = _persist_turn(session_id, request.message, result["response"], asked_at)
+    if settings.CHAT_WRITE_AWAIT_COMMIT:
+        try:
+            await committed
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Could not save the conversation, please try again"
+            )
+    
+    return ChatResponse(
+        session_id=session_id,
+        response=result["response"],
+        sources=result["sources"]
+    )
+
 
 @router.post("/stream")
 async def chat_stream(
     request: ChatRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
-    if request.session_id:
-        session = db.query(ChatSession).filter(
-            ChatSession.id == request.session_id,
-            ChatSession.user_id == current_user.id
-        ).first()
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Chat session not found"
-            )
-    else:
-        session = ChatSession(
-            title=request.message[:50] + "..." if len(request.message) > 50 else request.message,
-            user_id=current_user.id
-        )
-        db.add(session)
-        db.commit()
-        db.refresh(session)
-    
-    user_message = ChatMessage(
-        session_id=session.id,
-        role="user",
-        content=request.message
-    )
-    db.add(user_message)
-    db.commit()
-    
-    chat_history = []
-    previous_messages = db.query(ChatMessage).filter(
-        ChatMessage.session_id == session.id
-    ).order_by(ChatMessage.created_at).all()
-    
-    for msg in previous_messages[:-1]:
-        chat_history.append({"role": msg.role, "content": msg.content})
+    asked_at = datetime.utcnow()
+    session = await _get_or_create_session(db, request, current_user.id)
     
     # Extract primitive values needed for the generator to avoid DetachedInstanceError
     # because the request session will be closed when the streaming starts
@@ -160,49 +172,70 @@ async def chat_stream(
     user_role = current_user.role
     session_id = session.id
 
-    # Create generator for streaming
-    def generate():
+    # Async generator, so streaming runs on the event loop instead of a threadpool slot
+    async def generate():
         full_response = ""
-        # Create a new session for the background/streaming thread
-        stream_db = SessionLocal()
         try:
-            for chunk in rag_pipeline.query_stream(
+            # History loads while the query is embedded and retrieved
+            async for chunk in rag_pipeline.aquery_stream(
                 query=request.message,
                 user_id=user_id,
-                chat_history=chat_history,
-                user_role=user_role
+                user_role=user_role,
+                load_history=lambda: conversation_memory.aload_history(session_id)
             ):
                 full_response += chunk
                 yield f"data: {json.dumps({'content': chunk})}\n\n"
-            
-            # Save assistant message to DB using the thread-safe session
-            assistant_message = ChatMessage(
-                session_id=session_id,
-                role="assistant",
-                content=full_response
-            )
-            stream_db.add(assistant_message)
-            stream_db.commit()
-            
-            yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
-            
+        except (GeneratorExit, asyncio.CancelledError):
+            # Client went away mid-answer (Starlette cancels the response task while the
+            # generator awaits the pipeline); keep the question, like a failed answer
+            _persist_turn(session_id, request.message, None, asked_at)
+            raise
         except Exception as e:
             print(f"Streaming error: {e}")
+            _persist_turn(session_id, request.message, None, asked_at)
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        finally:
-            stream_db.close()
+            return
+
+        try:
+            committed = _persist_turn(session_id, request.message, full_response, asked_at)
+            if settings.CHAT_WRITE_AWAIT_COMMIT:
+                # The answer is already out; "done" confirms it is stored
+                await committed
+            yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
+        except Exception as e:
+            print(f"Could not save chat turn: {e}")
+            yield f"data: {json.dumps({'error': 'Could not save the conversation'})}\n\n"
     
     return StreamingResponse(generate(), media_type="text/event-stream")
 
 
-@router.get("/sessions", response_model=List[ChatSessionResponse])
+@router.get("/sessions", response_model=List[ChatSessionSummary])
 def list_chat_sessions(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    sessions = db.query(ChatSession).filter(
-        ChatSession.user_id == current_user.id
-    ).order_by(ChatSession.updated_at.desc()).all()
+    """The user's sessions, most recently active first, without their messages.
+
+    With `limit` one page is returned; the `X-Next-Cursor` response header
+    is the `cursor` for the next page and is absent on the last one.
+    """
+    query = db.query(
+        ChatSession.id, ChatSession.title, ChatSession.created_at, ChatSession.updated_at
+    ).filter(ChatSession.user_id == current_user.id)
+    if cursor:
+        updated_at, last_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(ChatSession.updated_at, ChatSession.id) < tuple_(updated_at, last_id))
+    query = query.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+    if limit is None:
+        return query.all()
+
+    sessions = query.limit(limit + 1).all()
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(sessions[-1].updated_at, sessions[-1].id)
     return sessions
 
 
@@ -210,42 +243,83 @@ def list_chat_sessions(
 def get_chat_session(
     session_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
-    
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Chat session not found"
-        )
-    
-    return session
+    session = _get_user_session(db, session_id, current_user.id)
+    messages = db.query(ChatMessage).filter(
+        ChatMessage.session_id == session_id
+    ).order_by(ChatMessage.created_at, ChatMessage.id).all()
+    return {"id": session.id, "title": session.title, "messages": messages}
+
+
+@router.get("/sessions/{session_id}/messages", response_model=List[ChatMessageResponse])
+def list_chat_messages(
+    session_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """The latest `limit` messages of a session in chronological order.
+
+    Pass the `X-Next-Cursor` response header as `cursor` to page back to
+    older messages; it is absent once the first message is reached.
+    """
+    _get_user_session(db, session_id, current_user.id)
+    query = db.query(ChatMessage).filter(ChatMessage.session_id == session_id)
+    if cursor:
+        created_at, last_id = _decode_cursor(cursor)
+        query = query.filter(tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(created_at, last_id))
+    messages = query.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+    if len(messages) > limit:
+        messages = messages[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(messages[-1].created_at, messages[-1].id)
+    return messages[::-1]
 
 
 @router.delete("/sessions/{session_id}")
 def delete_chat_session(
     session_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
+    session = _get_user_session(db, session_id, current_user.id)
+    
+    # Delete associated messages first (manual cascade)
+    db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete(synchronize_session=False)
+    db.delete(session)
+    db.commit()
+    conversation_memory.forget(session_id)
+    
+    return {"message": "Chat session deleted successfully"}
+
+
+def _get_user_session(db: Session, session_id: int, user_id: int) -> ChatSession:
     session = db.query(ChatSession).filter(
         ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
+        ChatSession.user_id == user_id
     ).first()
-    
     if not session:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat session not found"
         )
-    
-    # Delete associated messages first (manual cascade)
-    db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete(synchronize_session=False)
-    db.delete(session)
-    db.commit()
-    
-    return {"message": "Chat session deleted successfully"}
+    return session
+
+
+def _encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset cursor: the sort key of the last row of a page"""
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
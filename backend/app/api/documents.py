@@ -1,23 +1,38 @@
+import base64
+import hashlib
+import json
 import os
-import shutil
 import uuid
 from datetime import datetime
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from typing import Any, List, Literal, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status, UploadFile, File, Form
+from sqlalchemy import func, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
+from ..core.config import settings
 from ..core.deps import get_db, get_current_user, get_current_admin_user
-from ..database.models import User, Document
-from ..services.document_processor import document_processor
+from ..core.principal_cache import Principal
+from ..database.models import Document, DocumentChunk
 from ..services.rag_pipeline import rag_pipeline
+from ..services.ingestion import ingestion_queue
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
-UPLOAD_DIR = "./uploads"
+UPLOAD_DIR = settings.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 ALLOWED_EXTENSIONS = {"pdf", "docx", "txt"}
+MAX_PAGE_SIZE = 200
+MULTIPART_OVERHEAD_BYTES = 64 * 1024  # headers and boundaries around the file in an upload request
+
+# Sort keys for listing; each is paired with the id so keyset pages are stable
+SORT_COLUMNS = {
+    "created_at": Document.created_at,
+    "name": Document.original_filename,
+    "size": Document.file_size,
+}
 
 
 class DocumentResponse(BaseModel):
@@ -34,17 +49,34 @@ class DocumentResponse(BaseModel):
         from_attributes = True
 
 
+class DocumentStatusResponse(BaseModel):
+    id: int
+    status: str
+    stage: str
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    chunks_indexed: int = 0
+    error: Optional[str] = None
+
+
 def get_file_extension(filename: str) -> str:
     return filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
 
 
-@router.post("/upload", response_model=DocumentResponse)
-async def upload_document(
+@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
+def upload_document(
+    request: Request,
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)  # Only admin can upload
+    current_user: Principal = Depends(get_current_admin_user)  # Only admin can upload
 ):
-    """Upload a document to the knowledge base. Admin only."""
+    """Upload a document to the knowledge base. Admin only.
+
+    The file is saved and queued for background processing; poll
+    `/documents/{id}/status` for progress. Files over `UPLOAD_MAX_BYTES`
+    are rejected with 413, and, with `UPLOAD_REJECT_DUPLICATES`, a file
+    identical to an existing document with 409 before it is parsed.
+    """
     file_ext = get_file_extension(file.filename)
     
     if file_ext not in ALLOWED_EXTENSIONS:
@@ -53,69 +85,148 @@ async def upload_document(
             detail=f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"
         )
     
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and \
+            int(content_length) > settings.UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES:
+        _raise_too_large()
+    
     unique_filename = f"{uuid.uuid4()}.{file_ext}"
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
-    file_size = os.path.getsize(file_path)
+    partial_path = f"{file_path}.part"
+    try:
+        file_size, content_hash = _save_upload(file, partial_path)
+        if settings.UPLOAD_REJECT_DUPLICATES:
+            _check_duplicate(db, content_hash)
+        os.replace(partial_path, file_path)
+    finally:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
     
     document = Document(
         filename=unique_filename,
         original_filename=file.filename,
         file_type=file_ext,
         file_size=file_size,
+        content_hash=content_hash,
         status="processing",
         owner_id=current_user.id
     )
     db.add(document)
-    db.commit()
-    db.refresh(document)
-    
     try:
-        chunks, content_hash = document_processor.process_document(file_path, file_ext)
-        
-        # Index document
-        chunk_count = rag_pipeline.index_document(
-            document_id=document.id,
-            chunks=chunks,
-            filename=file.filename,
-            user_id=current_user.id
-        )
-        
-        document.content_hash = content_hash
-        document.chunk_count = chunk_count
-        document.status = "processed"
-        db.commit()
-        db.refresh(document)
-        
-    except Exception as e:
-        document.status = "failed"
         db.commit()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing document: {str(e)}"
-        )
+    except IntegrityError:
+        # An identical file was uploaded concurrently (unique index with UPLOAD_REJECT_DUPLICATES)
+        db.rollback()
+        os.remove(file_path)
+        _check_duplicate(db, content_hash)
+        raise
+    db.refresh(document)
+    
+    ingestion_queue.submit(
+        document_id=document.id,
+        file_path=file_path,
+        file_type=file_ext,
+        filename=file.filename,
+        user_id=current_user.id,
+        content_hash=content_hash
+    )
     
     return document
 
 
 @router.get("/", response_model=List[DocumentResponse])
 def list_documents(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    file_type: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    sort: Literal["created_at", "name", "size"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
-    """List all documents. All users can see all documents."""
-    documents = db.query(Document).all()
+    """List documents, newest first by default. All users can see all documents.
+
+    With `limit` one page is returned; the `X-Next-Cursor` response header
+    is the `cursor` for the next page (same filters and sort) and is absent
+    on the last one. Only the columns of `DocumentResponse` are read.
+    """
+    sort_column = SORT_COLUMNS[sort]
+    query = _filter_documents(
+        db.query(*(getattr(Document, field) for field in DocumentResponse.model_fields)),
+        status_filter, file_type, owner_id
+    )
+    if cursor:
+        value, last_id = _decode_cursor(cursor, sort)
+        key, after = tuple_(sort_column, Document.id), tuple_(value, last_id)
+        query = query.filter(key < after if order == "desc" else key > after)
+    if order == "desc":
+        query = query.order_by(sort_column.desc(), Document.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Document.id.asc())
+    if limit is None:
+        return query.all()
+
+    documents = query.limit(limit + 1).all()
+    if len(documents) > limit:
+        documents = documents[:limit]
+        last = documents[-1]
+        response.headers["X-Next-Cursor"] = _encode_cursor(sort, getattr(last, sort_column.key), last.id)
     return documents
 
 
+@router.get("/count")
+def count_documents(
+    status_filter: Optional[str] = Query(None, alias="status"),
+    file_type: Optional[str] = None,
+    owner_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Number of documents matching the filters, with a breakdown by status."""
+    query = _filter_documents(
+        db.query(Document.status, func.count(Document.id)), status_filter, file_type, owner_id
+    )
+    by_status = dict(query.group_by(Document.status).all())
+    return {"total": sum(by_status.values()), "by_status": by_status}
+
+
+@router.get("/{document_id}/status", response_model=DocumentStatusResponse)
+def get_document_status(
+    document_id: int,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    """Report ingestion progress for a document."""
+    document = db.query(Document).filter(Document.id == document_id).first()
+    
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+    
+    progress = ingestion_queue.get_progress(document_id)
+    if progress is None:
+        # Not tracked by this worker (e.g. processed before a restart)
+        chunk_count = document.chunk_count or 0
+        progress = {
+            "stage": document.status,
+            "chunks_total": chunk_count,
+            "chunks_embedded": chunk_count,
+            "chunks_indexed": chunk_count
+        }
+    
+    return DocumentStatusResponse(id=document.id, status=document.status, **progress)
+
+
 @router.get("/{document_id}", response_model=DocumentResponse)
 def get_document(
     document_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
 ):
     """Get a specific document."""
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -133,7 +244,7 @@ def get_document(
 def delete_document(
     document_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)  # Only admin can delete
+    current_user: Principal = Depends(get_current_admin_user)  # Only admin can delete
 ):
     """Delete a document. Admin only."""
     document = db.query(Document).filter(Document.id == document_id).first()
@@ -144,6 +255,8 @@ def delete_document(
             detail="Document not found"
         )
     
+    ingestion_queue.forget(document_id)
+    
     # Delete from vector store
     try:
         rag_pipeline.delete_document(document_id)
@@ -156,7 +269,79 @@ def delete_document(
         os.remove(file_path)
     
     # Delete from database
+    db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).delete(synchronize_session=False)
     db.delete(document)
     db.commit()
     
     return {"message": "Document deleted successfully"}
+
+
+def _save_upload(file: UploadFile, path: str) -> Tuple[int, str]:
+    """Copy an upload to `path` in large blocks, hashing it on the way; returns (size, sha256)"""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "wb") as buffer:
+        for block in iter(lambda: file.file.read(settings.UPLOAD_BUFFER_SIZE), b""):
+            size += len(block)
+            if size > settings.UPLOAD_MAX_BYTES:
+                _raise_too_large()
+            hasher.update(block)
+            buffer.write(block)
+    return size, hasher.hexdigest()
+
+
+def _check_duplicate(db: Session, content_hash: str) -> None:
+    """409 if a document that is not failed has the same content"""
+    existing = db.query(Document.id, Document.original_filename).filter(
+        Document.content_hash == content_hash,
+        Document.status != "failed"
+    ).first()
+    if existing is not None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"This file is already in the knowledge base as \"{existing.original_filename}\" (document {existing.id})"
+        )
+
+
+def _raise_too_large() -> None:
+    raise HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File is too large. Maximum size is {settings.UPLOAD_MAX_BYTES // (1024 * 1024)}MB"
+    )
+
+
+def _filter_documents(query, status_filter: Optional[str], file_type: Optional[str], owner_id: Optional[int]):
+    if status_filter:
+        query = query.filter(Document.status == status_filter)
+    if file_type:
+        query = query.filter(Document.file_type == file_type.lower())
+    if owner_id is not None:
+        query = query.filter(Document.owner_id == owner_id)
+    return query
+
+
+def _encode_cursor(sort: str, value: Any, row_id: int) -> str:
+    """Opaque keyset cursor: the sort key of the last row of a page"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        cursor_sort, value, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if cursor_sort != sort:
+            raise ValueError("cursor belongs to another sort order")
+        if sort == "created_at":
+            value = datetime.fromisoformat(value)
+        elif sort == "size":
+            value = int(value)
+        elif not isinstance(value, str):
+            raise ValueError("invalid name")
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
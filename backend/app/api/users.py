@@ -1,11 +1,16 @@
 from typing import List, Optional, Literal
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, computed_field
 
-from ..core.deps import get_db, get_current_user, get_current_admin_user
-from ..core.security import get_password_hash
+from ..core.deps import get_db, get_async_db, get_current_user, get_current_db_user, get_current_admin_user
+from ..core.principal_cache import Principal, principal_cache
+from ..core.password_hasher import password_hasher
 from ..database.models import User
+from ..services.profile_photos import profile_photos, InvalidPhotoError
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -20,7 +25,17 @@ class UserResponse(BaseModel):
     is_active: bool
     role: str
     phone: Optional[str] = None
-    profile_photo: Optional[str] = None
+    profile_photo_id: Optional[str] = Field(default=None, exclude=True)
+
+    @computed_field
+    @property
+    def profile_photo(self) -> Optional[str]:
+        return profile_photos.url(self.profile_photo_id)
+
+    @computed_field
+    @property
+    def profile_photo_thumb(self) -> Optional[str]:
+        return profile_photos.url(self.profile_photo_id, "thumb")
 
     class Config:
         from_attributes = True
@@ -30,7 +45,7 @@ class UserProfileUpdate(BaseModel):
     email: Optional[EmailStr] = None
     full_name: Optional[str] = None
     phone: Optional[str] = None
-    profile_photo: Optional[str] = None  # Base64 encoded image
+    profile_photo: Optional[str] = None  # Base64 data URL of a new image; "" removes the photo
     password: Optional[str] = None
 
 
@@ -54,22 +69,34 @@ class UserCreate(BaseModel):
 
 
 @router.get("/me", response_model=UserResponse)
-def get_current_user_profile(current_user: User = Depends(get_current_user)):
+def get_current_user_profile(current_user: User = Depends(get_current_db_user)):
     return current_user
 
 
 @router.put("/me", response_model=UserResponse)
-def update_current_user(
+async def update_current_user(
     user_update: UserProfileUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    principal: Principal = Depends(get_current_user)
 ):
-    """Update current user's profile including photo"""
+    """Update current user's profile including photo.
+
+    Async so that password hashing is awaited on the password pool instead
+    of holding a request thread; photo resizing runs in the threadpool.
+    """
+    current_user = await db.get(User, principal.id)
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     if user_update.email:
-        existing = db.query(User).filter(
+        existing = (await db.execute(select(User.id).where(
             User.email == user_update.email,
             User.id != current_user.id
-        ).first()
+        ))).first()
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -83,26 +110,64 @@ def update_current_user(
     if user_update.phone is not None:
         current_user.phone = user_update.phone
     
-    if user_update.profile_photo is not None:
-        current_user.profile_photo = user_update.profile_photo
+    # The form sends back the photo URL it was given when the photo is unchanged
+    if user_update.profile_photo is not None and not profile_photos.is_photo_url(user_update.profile_photo):
+        if user_update.profile_photo:
+            try:
+                current_user.profile_photo_id = await run_in_threadpool(
+                    profile_photos.store_data_url, user_update.profile_photo
+                )
+            except InvalidPhotoError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        else:
+            current_user.profile_photo_id = None
     
     if user_update.password:
-        current_user.hashed_password = get_password_hash(user_update.password)
+        current_user.hashed_password = await password_hasher.ahash(user_update.password)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     return current_user
 
 
+@router.get("/photos/{photo_id}")
+def get_profile_photo(
+    photo_id: str,
+    size: Literal["full", "thumb"] = "full",
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """Serve a profile photo; ids are content hashes, so responses never change"""
+    if not profile_photos.is_valid(photo_id, size):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Photo not found"
+        )
+    etag = f'"{photo_id}-{size}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    image = profile_photos.read(photo_id, size)
+    if image is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Photo not found"
+        )
+    return Response(content=image, media_type="image/jpeg", headers=headers)
+
+
 @router.post("/", response_model=UserResponse)
-def create_user(
+async def create_user(
     user_in: UserCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    existing_user = db.query(User).filter(
+    existing_user = (await db.execute(select(User.id).where(
         (User.username == user_in.username) | (User.email == user_in.email)
-    ).first()
+    ))).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -112,21 +177,21 @@ def create_user(
     new_user = User(
         username=user_in.username,
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await password_hasher.ahash(user_in.password),
         full_name=user_in.full_name,
         role=user_in.role,
         is_active=True
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
 @router.get("/", response_model=List[UserResponse])
 def list_users(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     users = db.query(User).all()
     return users
@@ -136,7 +201,7 @@ def list_users(
 def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -148,13 +213,13 @@ def get_user(
 
 
 @router.put("/{user_id}", response_model=UserResponse)
-def update_user(
+async def update_user(
     user_id: int,
     user_update: AdminUserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_admin_user)
 ):
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -162,10 +227,10 @@ def update_user(
         )
     
     if user_update.email:
-        existing = db.query(User).filter(
+        existing = (await db.execute(select(User.id).where(
             User.email == user_update.email,
             User.id != user_id
-        ).first()
+        ))).first()
         if existing:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -177,7 +242,7 @@ def update_user(
         user.full_name = user_update.full_name
     
     if user_update.password:
-        user.hashed_password = get_password_hash(user_update.password)
+        user.hashed_password = await password_hasher.ahash(user_update.password)
     
     if user_update.is_active is not None:
         user.is_active = user_update.is_active
@@ -185,8 +250,9 @@ def update_user(
     if user_update.role is not None:
         user.role = user_update.role
     
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    principal_cache.invalidate(user.id)
+    await db.refresh(user)
     return user
 
 
@@ -194,7 +260,7 @@ def update_user(
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_admin_user)
+    current_user: Principal = Depends(get_current_admin_user)
 ):
     if user_id == current_user.id:
         raise HTTPException(
@@ -211,5 +277,7 @@ def delete_user(
     
     db.delete(user)
     db.commit()
+    principal_cache.invalidate(user_id)
     
     return {"message": "User deleted successfully"}
+
@@ -7,4 +7,6 @@ from .security import (
     Token,
     TokenData
 )
-from .deps import get_db, get_current_user, get_current_admin_user
+from .deps import get_db, get_current_user, get_current_db_user, get_current_admin_user
+from .principal_cache import Principal, principal_cache
+from .password_hasher import password_hasher, PasswordHasher, PasswordHasherBusyError
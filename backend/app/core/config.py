@@ -13,14 +13,130 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.environ.get("SESSION_SECRET", "your-secret-key-change-in-production")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
-    
+    # Authenticated users' id/role/active flag are re-read from the DB at most this often
+    # (per worker); role and active changes made through the users API apply immediately
+    AUTH_CACHE_TTL_SECONDS: float = 30.0
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    # bcrypt runs on its own pool; calls beyond PASSWORD_HASH_MAX_QUEUE waiting ones get a 503
+    PASSWORD_HASH_WORKERS: int = 0  # 0 uses one worker per CPU
+    PASSWORD_HASH_MAX_QUEUE: int = 32
+
     OPENAI_API_KEY: Optional[str] = os.environ.get("OPENAI_API_KEY")
     
     CHROMA_PERSIST_DIRECTORY: str = "./chroma_db"
+
+    # Vector store backend: "pinecone" or "local" (in-process NumPy index)
+    VECTOR_STORE_BACKEND: str = os.environ.get("VECTOR_STORE_BACKEND", "pinecone")
+    LOCAL_VECTOR_STORE_PATH: str = os.environ.get("LOCAL_VECTOR_STORE_PATH", "./vector_index")
+    # Pinecone upserts (requests are capped at 2MB, so stay below it)
+    PINECONE_UPSERT_MAX_BYTES: int = 1_500_000
+    PINECONE_UPSERT_CONCURRENCY: int = 4
+    PINECONE_UPSERT_MAX_RETRIES: int = 3
+    # "flat" (exact scan) or "ivf" (approximate; LOCAL_ANN_NPROBE trades recall for latency)
+    LOCAL_VECTOR_INDEX_TYPE: str = os.environ.get("LOCAL_VECTOR_INDEX_TYPE", "flat")
+    LOCAL_ANN_NLIST: int = 0  # 0 picks ~4 * sqrt(rows) lists
+    LOCAL_ANN_NPROBE: int = 8
+    LOCAL_ANN_MIN_ROWS: int = 10000
+
+    # Hybrid retrieval: BM25 over chunk text fused with vector hits (reciprocal-rank fusion).
+    # The BM25 index is a local file, so it is off by default with Pinecone, whose deployments
+    # may run on ephemeral disks; enable it there only with LEXICAL_INDEX_PATH on a persistent volume
+    HYBRID_SEARCH_ENABLED: bool = os.environ.get("VECTOR_STORE_BACKEND", "pinecone") != "pinecone"
+    LEXICAL_INDEX_PATH: str = os.environ.get("LEXICAL_INDEX_PATH", "./lexical_index")
+    HYBRID_CANDIDATES: int = 10  # hits taken from each retriever before fusion
+    HYBRID_RRF_K: int = 60
+
+    # Rerank stage: retrieve RERANK_CANDIDATES chunks, keep the best RERANK_TOP_K for the prompt
+    RERANK_ENABLED: bool = True
+    RERANK_CANDIDATES: int = 12
+    RERANK_TOP_K: int = 3
+    RERANK_MMR_LAMBDA: float = 0.7  # 1.0 ranks by relevance only; lower values favour diversity
+    RERANK_TIME_BUDGET_MS: float = 30.0
+
+    # Prompt context packing (tokens counted with the chunker's cl100k_base encoding)
+    PROMPT_CONTEXT_TOKEN_BUDGET: int = 3000
+    PROMPT_DUPLICATE_THRESHOLD: float = 0.9  # share of a passage's words already in the prompt that makes it a duplicate
     
     CHUNK_SIZE: int = 1000
     CHUNK_OVERLAP: int = 200
-    
+
+    # PDFs with at least this many pages are extracted in a process pool
+    PDF_PARALLEL_MIN_PAGES: int = 50
+    PDF_PAGES_PER_TASK: int = 16
+    PDF_EXTRACT_WORKERS: int = 0  # 0 uses one worker per CPU
+
+    # Embedding throughput (Gemini accepts up to 100 texts per batch request)
+    EMBEDDING_BATCH_SIZE: int = 100
+    EMBEDDING_MAX_CONCURRENCY: int = 4
+    EMBEDDING_REQUESTS_PER_MINUTE: int = 1500
+    EMBEDDING_MAX_RETRIES: int = 3
+
+    # Conversation memory: messages go into the prompt verbatim until they are folded into a
+    # per-session summary, which happens once CHAT_SUMMARY_BATCH of them are older than the
+    # last CHAT_HISTORY_WINDOW
+    CHAT_HISTORY_WINDOW: int = 6
+    CHAT_HISTORY_TOKEN_BUDGET: int = 800
+    CHAT_SUMMARY_BATCH: int = 4
+    CHAT_SUMMARY_MAX_MESSAGES: int = 20  # folded per summary update
+    CHAT_REWRITE_FOLLOW_UPS: bool = True
+    # In-process cache of recent turns per session (entries are re-read from the DB after the TTL)
+    CHAT_HISTORY_CACHE_SESSIONS: int = 1000
+    CHAT_HISTORY_CACHE_TTL_SECONDS: int = 300
+    # Chat messages are written behind the response: turns from concurrent requests are
+    # bulk-inserted together every CHAT_WRITE_FLUSH_MS. With CHAT_WRITE_AWAIT_COMMIT the reply
+    # (or the stream's "done" event) is only sent once its turn is committed
+    CHAT_WRITE_BATCH_SIZE: int = 100  # turns per INSERT
+    CHAT_WRITE_FLUSH_MS: float = 20.0
+    CHAT_WRITE_MAX_RETRIES: int = 3
+    CHAT_WRITE_AWAIT_COMMIT: bool = True
+
+    # LLM gateway: providers in preference order ("huggingface", "gemini", or "local", an
+    # offline stand-in); empty uses every provider with an API key, Hugging Face first
+    LLM_PROVIDERS: str = os.environ.get("LLM_PROVIDERS", "")
+    # A request with no first token after the primary's p95 (clamped to these bounds) is also sent to the next provider
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_MIN_DELAY_MS: float = 250.0
+    LLM_HEDGE_MAX_DELAY_MS: float = 2000.0
+    # Consecutive failures (or calls slower than LLM_SLOW_CALL_SECONDS) that take a provider out of rotation
+    LLM_BREAKER_FAILURES: int = 3
+    LLM_BREAKER_COOLDOWN_SECONDS: float = 30.0
+    LLM_SLOW_CALL_SECONDS: float = 15.0
+    LOCAL_LLM_LATENCY_MS: float = 50.0
+
+    # Profile photos are cropped and resized on upload and stored as content-addressed JPEGs
+    # under BLOB_STORE_PATH; users rows only keep the photo's hash
+    BLOB_STORE_PATH: str = os.environ.get("BLOB_STORE_PATH", "./blobs")
+    PROFILE_PHOTO_MAX_BYTES: int = 5 * 1024 * 1024
+    PROFILE_PHOTO_MAX_PIXELS: int = 40_000_000
+    PROFILE_PHOTO_SIZE: int = 256
+    PROFILE_PHOTO_THUMB_SIZE: int = 64
+    # Prefix for photo URLs when the API is served from another origin than the frontend
+    PUBLIC_API_URL: str = os.environ.get("PUBLIC_API_URL", "")
+
+    # Document uploads are hashed while they stream to disk; larger ones are rejected with 413
+    UPLOAD_DIR: str = os.environ.get("UPLOAD_DIR", "./uploads")
+    UPLOAD_MAX_BYTES: int = 100 * 1024 * 1024
+    UPLOAD_BUFFER_SIZE: int = 1024 * 1024
+    # A file identical to an existing document is indexed from the original's vectors;
+    # with UPLOAD_REJECT_DUPLICATES it is refused with 409 instead (enforced by a unique index)
+    UPLOAD_REJECT_DUPLICATES: bool = False
+
+    # Background document ingestion
+    INGESTION_WORKERS: int = 2
+
+    # Embedding cache (set EMBEDDING_CACHE_PATH to persist vectors across restarts)
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 50000
+    EMBEDDING_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    EMBEDDING_CACHE_TTL_SECONDS: int = 7 * 24 * 60 * 60
+    EMBEDDING_CACHE_PATH: Optional[str] = os.environ.get("EMBEDDING_CACHE_PATH")
+
+    # Answer cache for repeated questions (a similarity threshold of 0 only
+    # matches the same normalized question; e.g. 0.95 also matches rephrasings)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 60 * 60
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = 0.0
+
     class Config:
         case_sensitive = True
 
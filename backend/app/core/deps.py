@@ -1,12 +1,15 @@
-from typing import Generator, Optional, List
+from typing import AsyncGenerator, Generator, Optional, List
 from functools import lru_cache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..database.connection import SessionLocal
+from ..database.connection import SessionLocal, AsyncSessionLocal
 from ..database.models import User
 from .security import decode_token
+from .principal_cache import Principal, principal_cache
 
 security = HTTPBearer()
 
@@ -19,10 +22,15 @@ def get_db() -> Generator:
         db.close()
 
 
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     token = credentials.credentials
     token_data = decode_token(token)
     
@@ -33,7 +41,7 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    user = await _load_principal(db, token_data.username, token_data.user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,9 +58,52 @@ async def get_current_user(
     return user
 
 
+async def _load_principal(db: AsyncSession, username: str, user_id: Optional[int]) -> Optional[Principal]:
+    """Principal for a verified token, from the cache or one narrow query.
+
+    The query goes through the async session: this dependency runs on the
+    event loop, also for the streaming chat endpoints.
+    """
+    if user_id is not None:
+        cached = principal_cache.get(user_id)
+        if cached is not None and cached.username == username:
+            return cached
+        generation = principal_cache.generation(user_id)
+    
+    row = (await db.execute(
+        select(User.id, User.username, User.role, User.is_active).where(User.username == username)
+    )).first()
+    if row is None:
+        return None
+    
+    principal = Principal(id=row.id, username=row.username, role=row.role, is_active=bool(row.is_active))
+    # Tokens without a user_id claim are still accepted, just not cached
+    if user_id is not None and principal.id == user_id:
+        principal_cache.put(principal, generation)
+    return principal
+
+
+def get_current_db_user(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+) -> User:
+    """The authenticated user's full row, for endpoints that return or modify the profile.
+
+    A plain function, so FastAPI runs the sync query in the threadpool.
+    """
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
 def require_roles(allowed_roles: List[str]):
     """Dependency factory that checks if user has one of the allowed roles"""
-    async def role_checker(current_user: User = Depends(get_current_user)) -> User:
+    async def role_checker(current_user: Principal = Depends(get_current_user)) -> Principal:
         if current_user.role not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -64,8 +115,8 @@ def require_roles(allowed_roles: List[str]):
 
 # Backward compatible alias for admin-only endpoints
 async def get_current_admin_user(
-    current_user: User = Depends(get_current_user)
-) -> User:
+    current_user: Principal = Depends(get_current_user)
+) -> Principal:
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Optional
+
+from .config import settings
+from .security import get_password_hash, verify_password
+
+LATENCY_WINDOW = 200  # recent calls kept for the percentiles in stats()
+
+
+class PasswordHasherBusyError(Exception):
+    """Raised instead of queueing when too much password work is already waiting"""
+
+
+class PasswordHasher:
+    """Bounded worker pool for bcrypt hashing and verification.
+
+    A bcrypt call takes a few hundred milliseconds of CPU. Run directly in
+    endpoints, a login wave fills the server's shared threadpool and starves
+    every other sync endpoint. Here password work gets its own `workers`
+    threads (bcrypt releases the GIL, so threads run in parallel), and at most
+    `max_queue` calls may wait for one. Beyond that, calls fail fast with
+    `PasswordHasherBusyError`, which the API turns into a 503 with
+    Retry-After, so callers don't hang behind a growing backlog.
+
+    Endpoints await `ahash`/`averify` without holding a thread. Sync callers
+    (scripts, threadpool code) use `hash`/`verify`, which block their thread
+    but still count against the same CPU bound.
+    """
+
+    def __init__(self, workers: int = 0, max_queue: int = 32):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._run_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="password"
+            )
+        return self._executor
+
+    def hash(self, password: str) -> str:
+        return self._submit(get_password_hash, password).result()
+
+    def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return self._submit(verify_password, plain_password, hashed_password).result()
+
+    async def ahash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(get_password_hash, password))
+
+    async def averify(self, plain_password: str, hashed_password: str) -> bool:
+        return await asyncio.wrap_future(self._submit(verify_password, plain_password, hashed_password))
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = self._pending
+            wait_ms, run_ms = sorted(self._wait_ms), sorted(self._run_ms)
+        return {
+            "workers": self.workers,
+            "running": min(pending, self.workers),
+            "queued": max(0, pending - self.workers),
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_p50": _percentile(wait_ms, 0.5),
+            "wait_ms_p95": _percentile(wait_ms, 0.95),
+            "run_ms_p50": _percentile(run_ms, 0.5),
+            "run_ms_p95": _percentile(run_ms, 0.95),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        with self._lock:
+            if self._pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                raise PasswordHasherBusyError(
+                    f"{self._pending} password operations in progress"
+                )
+            self._pending += 1
+        queued_at = time.perf_counter()
+        try:
+            return self.executor.submit(self._run, fn, args, queued_at)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+    def _run(self, fn: Callable, args: tuple, queued_at: float):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+                self._wait_ms.append((started - queued_at) * 1000)
+                self._run_ms.append((finished - started) * 1000)
+
+
+def _percentile(sorted_values: list, q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return round(sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))], 1)
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE
+)
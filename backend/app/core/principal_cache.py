@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from .config import settings
+
+
+class Principal(NamedTuple):
+    """Immutable snapshot of the authenticated user, enough for authorization checks"""
+    id: int
+    username: str
+    role: str
+    is_active: bool
+
+
+class PrincipalCache:
+    """Short-lived per-process cache of principals, keyed by the token's user id.
+
+    A JWT proves who the caller is, but role and active flag can change after
+    the token was issued, so they are still read from the database - at most
+    once per `ttl_seconds` per user instead of on every request. Changes made
+    through the users API call `invalidate`; changes made by other workers or
+    directly in the database are picked up once the entry expires.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, Tuple[Principal, float]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._lock = threading.Lock()  # sync endpoints invalidate from the threadpool
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] < self.ttl_seconds:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def generation(self, user_id: int) -> int:
+        """Read before loading a principal from the database and pass to `put`"""
+        with self._lock:
+            return self._generations.get(user_id, 0)
+
+    def put(self, principal: Principal, generation: int) -> None:
+        """Cache `principal` unless the user was invalidated since `generation` was read"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if self._generations.get(principal.id, 0) != generation:
+                return
+            self._entries[principal.id] = (principal, time.monotonic())
+            self._entries.move_to_end(principal.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.AUTH_CACHE_TTL_SECONDS,
+    max_entries=settings.AUTH_CACHE_MAX_ENTRIES
+)
@@ -1,2 +1,2 @@
 from .connection import Base, engine, SessionLocal, init_db
-from .models import User, Document, ChatSession, ChatMessage
+from .models import User, Document, DocumentChunk, ChatSession, ChatMessage
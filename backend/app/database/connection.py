@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -40,14 +43,105 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the request paths that run on the event loop (chat)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+async_url = make_url(DATABASE_URL)
+async_url = async_url.set(drivername=ASYNC_DRIVERS.get(async_url.get_backend_name(), async_url.drivername))
+async_connect_args = {}
+async_pool_args = {}
+if async_url.get_backend_name() == "postgresql":
+    async_pool_args = {"pool_size": 5, "max_overflow": 10}
+    # asyncpg takes SSL and timeout as connect arguments, not libpq URL parameters
+    sslmode = async_url.query.get("sslmode")
+    async_url = async_url.difference_update_query(["sslmode", "channel_binding"])
+    if sslmode and sslmode != "disable":
+        async_connect_args["ssl"] = "require"
+    if "neon.tech" in DATABASE_URL:
+        async_connect_args.update({"ssl": "require", "timeout": 10})
+
+async_engine = create_async_engine(
+    async_url,
+    connect_args=async_connect_args,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=False,
+    **async_pool_args
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+# Partial unique index on documents.content_hash, managed by upgrade_schema
+DUPLICATE_UPLOAD_INDEX = "uq_documents_content_hash"
+
+
+def upgrade_schema():
+    """Add columns and indexes that were introduced after a table was first created.
+
+    create_all only creates missing tables, so new nullable columns and new
+    indexes on existing tables are added here. Safe to run on every start.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                print(f"✓ Added column {table.name}.{column.name}")
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    print(f"✓ Added index {index.name}")
+        # Sessions created before updated_at had an insert default would sort last
+        if inspector.has_table("chat_sessions"):
+            conn.execute(text("UPDATE chat_sessions SET updated_at = created_at WHERE updated_at IS NULL"))
+        if inspector.has_table("documents"):
+            _sync_duplicate_upload_index(conn, {index["name"] for index in inspector.get_indexes("documents")})
+
+
+def _sync_duplicate_upload_index(conn, existing_indexes):
+    """With UPLOAD_REJECT_DUPLICATES, make content hashes of live documents unique.
+
+    The upload endpoint checks for an identical document before inserting;
+    the index closes the race between two concurrent uploads of one file.
+    Without the setting, identical uploads are allowed (they reuse the
+    original's vectors), so the index is dropped again.
+    """
+    from ..core.config import settings
+
+    if not settings.UPLOAD_REJECT_DUPLICATES:
+        if DUPLICATE_UPLOAD_INDEX in existing_indexes:
+            conn.execute(text(f"DROP INDEX {DUPLICATE_UPLOAD_INDEX}"))
+            print(f"✓ Dropped index {DUPLICATE_UPLOAD_INDEX}")
+        return
+    if DUPLICATE_UPLOAD_INDEX in existing_indexes:
+        return
+    try:
+        with conn.begin_nested():
+            conn.execute(text(
+                f"CREATE UNIQUE INDEX {DUPLICATE_UPLOAD_INDEX} ON documents (content_hash) "
+                "WHERE content_hash IS NOT NULL AND status <> 'failed'"
+            ))
+        print(f"✓ Added index {DUPLICATE_UPLOAD_INDEX}")
+    except IntegrityError:
+        print(f"⚠️ Not adding {DUPLICATE_UPLOAD_INDEX}: the documents table already holds identical files")
+
 
 def init_db():
     from . import models
     from ..core.security import get_password_hash
+    from ..services.profile_photos import profile_photos
     
     Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    profile_photos.migrate_inline_photos(engine)
     
     # Seed default admin
     db = SessionLocal()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, LargeBinary
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Index, Text, LargeBinary
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -16,7 +16,7 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     role = Column(String(50), default="employee")  # admin, manager, hr, employee
     phone = Column(String(20), nullable=True)
-    profile_photo = Column(Text, nullable=True)  # Base64 encoded image
+    profile_photo_id = Column(String(64), nullable=True)  # SHA-256 of the upload; images live in the blob store
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, onupdate=datetime.utcnow)
 
@@ -32,7 +32,7 @@ class Document(Base):
     original_filename = Column(String(255))
     file_type = Column(String(50))
     file_size = Column(Integer)
-    content_hash = Column(String(64), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
     chunk_count = Column(Integer, default=0)
     status = Column(String(50), default="pending")
     owner_id = Column(Integer, ForeignKey("users.id"))
@@ -41,6 +41,26 @@ class Document(Base):
 
     owner = relationship("User", back_populates="documents")
 
+    # Keyset listing: one index per sort key, and per filter with the default sort
+    __table_args__ = (
+        Index("ix_documents_created", "created_at", "id"),
+        Index("ix_documents_name", "original_filename", "id"),
+        Index("ix_documents_size", "file_size", "id"),
+        Index("ix_documents_status_created", "status", "created_at"),
+        Index("ix_documents_type_created", "file_type", "created_at"),
+        Index("ix_documents_owner_created", "owner_id", "created_at"),
+    )
+
+
+class DocumentChunk(Base):
+    """Content hash of each indexed chunk, used to reuse existing embeddings"""
+    __tablename__ = "document_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), index=True)
+    chunk_index = Column(Integer)
+    content_hash = Column(String(64), index=True)
+
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
@@ -48,12 +68,17 @@ class ChatSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255))
     user_id = Column(Integer, ForeignKey("users.id"))
+    summary = Column(Text, nullable=True)  # rolling summary of messages older than the history window
+    summary_until = Column(Integer, nullable=True)  # id of the last message folded into the summary
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, onupdate=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # last activity
 
     user = relationship("User", back_populates="chat_sessions")
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
 
+    # A user's sessions, most recently active first (sidebar listing)
+    __table_args__ = (Index("ix_chat_sessions_user_updated", "user_id", "updated_at"),)
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -65,3 +90,6 @@ class ChatMessage(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
 
     session = relationship("ChatSession", back_populates="messages")
+
+    # A session's messages in order (history, pagination)
+    __table_args__ = (Index("ix_chat_messages_session_created", "session_id", "created_at"),)
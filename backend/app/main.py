@@ -7,12 +7,17 @@ from pathlib import Path
 env_path = Path(__file__).resolve().parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from .core.config import settings
-from .database.connection import init_db
+from .core.password_hasher import password_hasher, PasswordHasherBusyError
+from .database.connection import init_db, async_engine
 from .api import api_router
+from .services.ingestion import ingestion_queue
+from .services.message_writer import message_writer
+from .services.rag_pipeline import rag_pipeline
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -31,14 +36,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+@app.exception_handler(PasswordHasherBusyError)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusyError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in requests, please retry shortly"},
+        headers={"Retry-After": "1"}
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    # Jobs queued when the previous process stopped were dropped with it
+    ingestion_queue.recover(settings.UPLOAD_DIR)
     # Verify Google API key is loaded
     api_key = os.environ.get("GOOGLE_API_KEY")
     if api_key:
@@ -47,6 +64,15 @@ async def startup_event():
         print("⚠ Warning: GOOGLE_API_KEY not found in environment")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    ingestion_queue.shutdown()
+    password_hasher.shutdown()
+    await message_writer.shutdown()
+    await rag_pipeline.aclose()
+    await async_engine.dispose()
+
+
 @app.get("/")
 def root():
     return {
@@ -61,5 +87,6 @@ def health_check():
     api_key = os.environ.get("GOOGLE_API_KEY")
     return {
         "status": "healthy",
-        "google_api_configured": bool(api_key)
+        "google_api_configured": bool(api_key),
+        "password_hasher": password_hasher.stats()
     }
@@ -1,5 +1,10 @@
 from .embeddings import get_embeddings_generator, EmbeddingsGenerator
-from .vector_store import get_vector_store, VectorStore
+from .vector_store import get_vector_store, BaseVectorStore, VectorStore
+from .local_vector_store import LocalVectorStore
+from .lexical_index import get_lexical_index, BM25Index
+from .reranker import get_reranker, Reranker
+from .context_packer import get_context_packer, ContextPacker
+from .llm_gateway import get_llm_gateway, LLMGateway, LLMProvider, LocalProvider
 from .llm import get_llm_handler, LLMHandler
 
 # Lazy-loaded instances (initialized on first access)
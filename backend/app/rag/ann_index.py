@@ -0,0 +1,139 @@
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+CENTROIDS_FILE = "ivf_centroids.npy"
+ASSIGNMENTS_FILE = "ivf_assignments.npy"
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest neighbour index over normalised vectors.
+
+    Vectors are clustered with spherical k-means; a query only scores the rows
+    in the `nprobe` clusters whose centroids are closest to it, so `nprobe`
+    trades recall for latency. The index stores only centroids and one list
+    id per row, and both are snapshotted next to the vectors file so workers
+    load a prebuilt index instead of re-clustering on boot. A snapshot may
+    lag behind the vectors file; rows appended since are assigned on load.
+    """
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8, train_iterations: int = 10):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_iterations = train_iterations
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_size = 0
+
+        # (row order sorted by list id, list start offsets), built lazily
+        self._lists: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray, seed: int = 0) -> None:
+        """Cluster `vectors` and assign every row to its nearest centroid"""
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.default_rng(seed)
+
+        # Train on a sample; 64 points per list is plenty for k-means
+        sample_size = min(n, nlist * 64)
+        sample = np.asarray(vectors[rng.choice(n, sample_size, replace=False)])
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty clusters with random sample points
+            sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = (sums / norms).astype(np.float32)
+
+        self.centroids = centroids
+        self.trained_size = n
+        self.assignments = self._assign(vectors)
+        self._lists = None
+
+    def add(self, vectors: np.ndarray) -> None:
+        """Assign newly appended rows to their nearest lists"""
+        if not self.is_trained or len(vectors) == 0:
+            return
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._lists = None
+
+    def overwrite(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Re-assign rows whose vectors were replaced in place"""
+        if not self.is_trained or len(rows) == 0:
+            return
+        assignments = np.array(self.assignments)
+        assignments[rows] = self._assign(vectors)
+        self.assignments = assignments
+        self._lists = None
+
+    def compact(self, keep: np.ndarray) -> None:
+        """Drop tombstoned rows, matching a compaction of the vectors file"""
+        if not self.is_trained:
+            return
+        self.assignments = np.asarray(self.assignments[keep])
+        self._lists = None
+
+    def candidates(self, query_vector: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """Rows stored in the `nprobe` lists closest to the query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        order, offsets = self._build_lists()
+        centroid_scores = self.centroids @ query_vector
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in probe])
+
+    def save(self, directory: str) -> None:
+        if not self.is_trained:
+            return
+        for name, array in ((CENTROIDS_FILE, self.centroids), (ASSIGNMENTS_FILE, self.assignments)):
+            path = os.path.join(directory, name)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+
+    def load(self, directory: str, rows: int) -> bool:
+        """Load a snapshot of at most `rows` rows; returns False if there is none.
+
+        Rows beyond the snapshot are left for the caller to `add`.
+        """
+        centroids_path = os.path.join(directory, CENTROIDS_FILE)
+        assignments_path = os.path.join(directory, ASSIGNMENTS_FILE)
+        if not (os.path.exists(centroids_path) and os.path.exists(assignments_path)):
+            return False
+        assignments = np.load(assignments_path, mmap_mode="r")
+        if len(assignments) > rows:
+            return False
+        self.centroids = np.load(centroids_path)
+        self.assignments = assignments
+        self.trained_size = len(assignments)
+        self._lists = None
+        return True
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        labels = np.empty(len(vectors), dtype=np.int32)
+        # Assign in blocks to keep the score matrix small
+        block = 65536
+        for start in range(0, len(vectors), block):
+            chunk = np.asarray(vectors[start:start + block])
+            labels[start:start + block] = np.argmax(chunk @ self.centroids.T, axis=1)
+        return labels
+
+    def _build_lists(self) -> Tuple[np.ndarray, np.ndarray]:
+        lists = self._lists
+        if lists is None:
+            order = np.argsort(self.assignments, kind="stable")
+            counts = np.bincount(self.assignments, minlength=len(self.centroids))
+            lists = (order, np.concatenate([[0], np.cumsum(counts)]))
+            self._lists = lists
+        return lists
@@ -0,0 +1,169 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from ..core.config import settings
+
+ENCODING_NAME = "cl100k_base"  # same encoding the chunker uses
+MIN_TRUNCATED_TOKENS = 64  # don't include a passage cut shorter than this
+OVERLAP_PROBE_CHARS = 200  # prefix used to find overlap between chunks without offsets
+
+
+class Passage(NamedTuple):
+    text: str
+    rank: int  # best retrieval rank among the chunks merged into it
+    document_id: Any
+
+
+class ContextPacker:
+    """Fit retrieved chunks into a prompt token budget.
+
+    Chunks of the same document that overlap or touch (the chunker's
+    `chunk_overlap`) are merged into one passage, so the shared text is sent
+    once. Offsets come from the `char_start`/`char_end` chunk metadata; older
+    chunks without them are merged when consecutive chunks share a prefix.
+    Near-duplicate passages (e.g. the same text uploaded twice) are dropped,
+    then passages are added in relevance order until `token_budget` is
+    reached, cutting the last one short if enough room is left.
+    """
+
+    def __init__(self, token_budget: int = 3000, duplicate_threshold: float = 0.9):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+        self._encoding = None
+
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(ENCODING_NAME)
+        return self._encoding
+
+    def pack(self, context: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Passages to put in the prompt, most relevant first"""
+        if not context:
+            return []
+        passages = self._merge(context, metadatas or [{} for _ in context])
+        passages = self._drop_duplicates(passages)
+
+        packed = []
+        remaining = self.token_budget
+        for passage in passages:
+            tokens = self.encoding.encode(passage.text, disallowed_special=())
+            if len(tokens) <= remaining:
+                packed.append(passage.text)
+                remaining -= len(tokens)
+            elif remaining >= MIN_TRUNCATED_TOKENS:
+                packed.append(self.encoding.decode(tokens[:remaining]))
+                remaining = 0
+            if remaining < MIN_TRUNCATED_TOKENS:
+                break
+        return packed
+
+    def pack_history(self, chat_history: Optional[List[Dict[str, str]]], token_budget: int) -> str:
+        """Conversation text for the prompt: the rolling summary (a message with
+        role "summary"), then the most recent turns that fit in `token_budget`"""
+        if not chat_history or token_budget <= 0:
+            return ""
+        lines = []
+        remaining = token_budget
+        summaries = [message for message in chat_history if message["role"] == "summary"]
+        if summaries:
+            # The summary may use at most half the budget; recent turns matter more
+            tokens = self.encoding.encode(summaries[-1]["content"], disallowed_special=())[:token_budget // 2]
+            lines.append(f"Summary of earlier conversation: {self.encoding.decode(tokens)}")
+            remaining -= len(tokens)
+
+        recent = []
+        for message in reversed([message for message in chat_history if message["role"] != "summary"]):
+            line = f"{message['role'].capitalize()}: {message['content']}"
+            tokens = self.encoding.encode(line, disallowed_special=())
+            if len(tokens) > remaining:
+                if not recent and remaining >= MIN_TRUNCATED_TOKENS:
+                    recent.append(self.encoding.decode(tokens[:remaining]))
+                break
+            recent.append(line)
+            remaining -= len(tokens)
+        return "\n".join(lines + recent[::-1])
+
+    def _merge(self, context: List[str], metadatas: List[Dict[str, Any]]) -> List[Passage]:
+        by_document: Dict[Any, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            # Chunks without a document id are never merged
+            by_document.setdefault(meta.get("document_id", ("rank", i)), []).append(i)
+
+        passages = []
+        for document_id, ranks in by_document.items():
+            ranks.sort(key=lambda i: self._position(metadatas[i], i))
+            text, rank, last = context[ranks[0]], ranks[0], metadatas[ranks[0]]
+            for i in ranks[1:]:
+                merged = self._join(text, context[i], last, metadatas[i])
+                if merged is None:
+                    passages.append(Passage(text, rank, document_id))
+                    text, rank, last = context[i], i, metadatas[i]
+                    continue
+                if merged is not text:
+                    last = metadatas[i]  # the passage now ends with this chunk
+                text, rank = merged, min(rank, i)
+            passages.append(Passage(text, rank, document_id))
+        return sorted(passages, key=lambda passage: passage.rank)
+
+    @staticmethod
+    def _position(meta: Dict[str, Any], rank: int) -> tuple:
+        if "char_start" in meta:
+            return (0, meta["char_start"])
+        if "chunk_index" in meta:
+            return (1, meta["chunk_index"])
+        return (2, rank)
+
+    @staticmethod
+    def _join(text: str, following: str, meta: Dict[str, Any], following_meta: Dict[str, Any]) -> Optional[str]:
+        """`text` extended by `following` if they are contiguous in the document, else None.
+
+        `meta` describes the chunk that ends `text`. Returns `text` itself when
+        `following` adds nothing.
+        """
+        if "char_end" in meta and "char_start" in following_meta:
+            overlap = meta["char_end"] - following_meta["char_start"]
+            if overlap < 0:
+                return None
+            following_end = following_meta.get("char_end", following_meta["char_start"] + len(following))
+            if following_end <= meta["char_end"]:
+                return text  # contained in what we already have
+            return text + following[overlap:]
+
+        if following_meta.get("chunk_index") != meta.get("chunk_index", -2) + 1:
+            return None
+        probe = following[:OVERLAP_PROBE_CHARS]
+        start = text.rfind(probe) if probe else -1
+        # The shared text must run from `start` to the end of `text`
+        if start < 0 or not following.startswith(text[start:]):
+            return None
+        return text + following[len(text) - start:]
+
+    def _drop_duplicates(self, passages: List[Passage]) -> List[Passage]:
+        kept: List[Passage] = []
+        kept_terms: List[frozenset] = []
+        for passage in passages:
+            terms = frozenset(passage.text.lower().split())
+            # Containment rather than Jaccard: a chunk repeated inside a longer
+            # merged passage is still a duplicate
+            if terms and any(
+                len(terms & other) / len(terms) >= self.duplicate_threshold
+                for other in kept_terms
+            ):
+                continue
+            kept.append(passage)
+            kept_terms.append(terms)
+        return kept
+
+
+_context_packer_instance = None
+
+def get_context_packer() -> ContextPacker:
+    """Get or create the ContextPacker instance (lazy initialization)"""
+    global _context_packer_instance
+    if _context_packer_instance is None:
+        _context_packer_instance = ContextPacker(
+            token_budget=settings.PROMPT_CONTEXT_TOKEN_BUDGET,
+            duplicate_threshold=settings.PROMPT_DUPLICATE_THRESHOLD
+        )
+    return _context_packer_instance
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CacheKey = Tuple[str, str, str]  # (model, task_type, sha256 of text)
+
+
+class EmbeddingCache:
+    """Bounded LRU cache for embedding vectors.
+
+    Entries are keyed by (model, task_type, text hash) so document and query
+    embeddings of the same text never collide. The cache is limited by entry
+    count and by vector bytes, entries expire after ``ttl_seconds`` (0 keeps
+    them forever), and an optional SQLite file mirrors the cache so restarted
+    workers start warm.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50000,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl_seconds: int = 0,
+        persist_path: Optional[str] = None
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = persist_path
+
+        self._entries: "OrderedDict[CacheKey, Tuple[array, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if persist_path:
+            self._open_db(persist_path)
+
+    @staticmethod
+    def make_key(model: str, task_type: str, text: str) -> CacheKey:
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return (model, task_type, text_hash)
+
+    def get(self, model: str, task_type: str, text: str) -> Optional[List[float]]:
+        key = self.make_key(model, task_type, text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            vector, created_at = entry
+            if self._is_expired(created_at):
+                self._remove(key)
+                self._delete_persisted([key])
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector.tolist()
+
+    def set(self, model: str, task_type: str, text: str, vector: Sequence[float]) -> None:
+        self.set_many(model, task_type, [(text, vector)])
+
+    def set_many(
+        self,
+        model: str,
+        task_type: str,
+        items: Sequence[Tuple[str, Sequence[float]]]
+    ) -> None:
+        """Insert several vectors with a single persistence transaction"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in items:
+                key = self.make_key(model, task_type, text)
+                packed = array("f", vector)
+                self._insert(key, packed, now)
+                rows.append((*key, packed.tobytes(), now))
+            evicted = self._evict()
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings "
+                    "(model, task_type, text_hash, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._delete_persisted(evicted, commit=False)
+                self._db.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Internal helpers (callers must hold self._lock)
+
+    def _is_expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _insert(self, key: CacheKey, vector: array, created_at: float) -> None:
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (vector, created_at)
+        self._bytes += vector.itemsize * len(vector)
+
+    def _remove(self, key: CacheKey) -> None:
+        vector, _ = self._entries.pop(key)
+        self._bytes -= vector.itemsize * len(vector)
+
+    def _evict(self) -> List[CacheKey]:
+        evicted = []
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            key = next(iter(self._entries))
+            self._remove(key)
+            evicted.append(key)
+        self.evictions += len(evicted)
+        return evicted
+
+    def _delete_persisted(self, keys: List[CacheKey], commit: bool = True) -> None:
+        if self._db is None or not keys:
+            return
+        self._db.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND task_type = ? AND text_hash = ?",
+            keys
+        )
+        if commit:
+            self._db.commit()
+
+    def _open_db(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, task_type TEXT NOT NULL, text_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (model, task_type, text_hash))"
+        )
+        if self.ttl_seconds > 0:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+        self._db.commit()
+
+        # Warm the in-memory LRU with the most recent entries, oldest first
+        rows = self._db.execute(
+            "SELECT model, task_type, text_hash, vector, created_at FROM embeddings "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        with self._lock:
+            for model, task_type, text_hash, blob, created_at in reversed(rows):
+                vector = array("f")
+                vector.frombytes(blob)
+                self._insert((model, task_type, text_hash), vector, created_at)
+            evicted = self._evict()
+            self._delete_persisted(evicted)
+        print(f"✓ Embedding cache loaded {len(self._entries)} vectors from {path}")
@@ -1,8 +1,13 @@
 import os
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 import time
 
+from ..core.config import settings
+from .embedding_cache import EmbeddingCache
+from .rate_limiter import TokenBucket
+
 # Load environment variables first
 load_dotenv()
 
@@ -13,7 +18,20 @@ class EmbeddingsGenerator:
     def __init__(self):
         self.model = "models/text-embedding-004"
         self._genai = None
-        self._cache = {}  # Simple embedding cache
+        self._cache = EmbeddingCache(
+            max_entries=settings.EMBEDDING_CACHE_MAX_ENTRIES,
+            max_bytes=settings.EMBEDDING_CACHE_MAX_BYTES,
+            ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+            persist_path=settings.EMBEDDING_CACHE_PATH
+        )
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        self.max_concurrency = settings.EMBEDDING_MAX_CONCURRENCY
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES
+        requests_per_second = settings.EMBEDDING_REQUESTS_PER_MINUTE / 60
+        self._rate_limiter = TokenBucket(
+            rate=requests_per_second,
+            capacity=max(1.0, requests_per_second)
+        )
 
     @property
     def genai(self):
@@ -27,37 +45,86 @@ class EmbeddingsGenerator:
         return self._genai
     
     def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of texts using Gemini"""
-        embeddings = []
-        try:
-            # Gemini has batch limit, handle safely
-            for text in texts:
-                # Use cache if available
-                if text in self._cache:
-                    embeddings.append(self._cache[text])
-                    continue
-
-                # Add small delay to avoid rate limits on free tier
-                time.sleep(0.5) 
-                
+        """Generate embeddings for a list of texts using Gemini.
+
+        Uncached texts are grouped into provider-sized batches which are sent
+        concurrently, paced by a token bucket instead of fixed sleeps. Results
+        are returned in input order. Each batch is cached as soon as it
+        arrives; if any batch still fails after its retries, the first error
+        is raised once the others have settled, and a retry of the same texts
+        only embeds the batches that failed.
+        """
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        pending: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            # Use cache if available
+            cached = self._cache.get(self.model, "retrieval_document", text)
+            if cached is not None:
+                embeddings[i] = cached
+            else:
+                # Identical chunks are only embedded once
+                pending.setdefault(text, []).append(i)
+
+        unique_texts = list(pending)
+        batches = [
+            unique_texts[i:i + self.batch_size]
+            for i in range(0, len(unique_texts), self.batch_size)
+        ]
+
+        def embed(batch: List[str]) -> None:
+            vectors = self._embed_batch(batch)
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+            self._cache.set_many(self.model, "retrieval_document", list(zip(batch, vectors)))
+            for text, vector in zip(batch, vectors):
+                for i in pending[text]:
+                    embeddings[i] = vector
+
+        errors: List[Exception] = []
+        if len(batches) <= 1:
+            for batch in batches:
+                try:
+                    embed(batch)
+                except Exception as e:
+                    errors.append(e)
+        else:
+            _ = self.genai  # configure the client before fanning out to threads
+            workers = min(self.max_concurrency, len(batches))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(embed, batch) for batch in batches]
+            errors = [future.exception() for future in futures if future.exception() is not None]
+
+        if errors:
+            print(f"❌ Error generating embeddings: {len(errors)} of {len(batches)} batches failed: {errors[0]}")
+            raise errors[0]
+        return embeddings
+
+    def _embed_batch(self, batch: List[str]) -> List[List[float]]:
+        """Embed one provider batch, retrying with exponential backoff"""
+        for attempt in range(self.max_retries + 1):
+            self._rate_limiter.acquire()
+            try:
                 result = self.genai.embed_content(
                     model=self.model,
-                    content=text,
+                    content=batch,
                     task_type="retrieval_document",
                     title="Embedded Document"
                 )
-                self._cache[text] = result['embedding']
-                embeddings.append(result['embedding'])
-            return embeddings
-        except Exception as e:
-            print(f"❌ Error generating embeddings: {e}")
-            return []
-    
+                return result['embedding']
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"⚠️ Embedding batch failed ({e}), retrying in {delay}s...")
+                time.sleep(delay)
+        return []
+
     def generate_single_embedding(self, text: str) -> List[float]:
         """Generate embedding for query"""
         # Return from cache if we've seen this query before
-        if text in self._cache:
-            return self._cache[text]
+        cached = self._cache.get(self.model, "retrieval_query", text)
+        if cached is not None:
+            return cached
 
         try:
             result = self.genai.embed_content(
@@ -65,7 +132,26 @@ class EmbeddingsGenerator:
                 content=text,
                 task_type="retrieval_query"
             )
-            self._cache[text] = result['embedding']
+            self._cache.set(self.model, "retrieval_query", text, result['embedding'])
+            return result['embedding']
+        except Exception as e:
+            print(f"❌ Error generating single embedding: {e}")
+            return []
+
+    async def agenerate_single_embedding(self, text: str) -> List[float]:
+        """Generate embedding for query without blocking the event loop"""
+        cached = self._cache.get(self.model, "retrieval_query", text)
+        if cached is not None:
+            return cached
+
+        try:
+            await self._rate_limiter.aacquire()
+            result = await self.genai.embed_content_async(
+                model=self.model,
+                content=text,
+                task_type="retrieval_query"
+            )
+            self._cache.set(self.model, "retrieval_query", text, result['embedding'])
             return result['embedding']
         except Exception as e:
             print(f"❌ Error generating single embedding: {e}")
@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import re
+import threading
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+
+POSTINGS_FILE = "postings.jsonl"
+COMPACT_THRESHOLD = 0.25  # compact once this fraction of rows is tombstoned
+MAX_TERM_FREQUENCY = 65535  # term frequencies are stored as uint16
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "do", "does", "for", "from", "how", "i",
+    "in", "is", "it", "me", "my", "of", "on", "or", "our", "that", "the", "this", "to", "we",
+    "what", "when", "where", "which", "who", "why", "will", "with", "you", "your"
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric terms without stopwords ("Form 27B" -> ["form", "27b"])"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+
+class BM25Index:
+    """In-process BM25 inverted index over chunk text.
+
+    Each term's postings are two parallel typed arrays, row numbers (uint32)
+    and term frequencies (uint16), so the index costs about six bytes per
+    distinct term per chunk. Row-level data (chunk id, document id, length,
+    liveness) are parallel arrays as well.
+
+    Like `LocalVectorStore`, the index persists as an append-only JSONL log of
+    rows and document deletions that is replayed on start. Deleted and
+    overwritten rows are tombstones until compaction; document frequencies
+    count them until then, which only slightly skews idf.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+
+        self._ids: List[str] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._document_ids = array("q")
+        self._lengths = array("I")
+        self._alive = bytearray()
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._live_rows = 0
+        self._live_length = 0
+
+        self._log_path = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._log_path = os.path.join(path, POSTINGS_FILE)
+            self._load()
+
+    def __len__(self) -> int:
+        return self._live_rows
+
+    def add(self, ids: List[str], document_ids: List[int], texts: List[str]) -> None:
+        """Index chunks, replacing rows whose id is already present"""
+        rows = []
+        for vector_id, document_id, text in zip(ids, document_ids, texts):
+            terms = Counter(tokenize(text))
+            rows.append({"id": vector_id, "document_id": document_id, "terms": dict(terms)})
+        with self._lock:
+            for row in rows:
+                self._append_row(row["id"], row["document_id"], row["terms"])
+            self._write_log(rows)
+
+    def delete_by_document_id(self, document_id: int) -> None:
+        with self._lock:
+            if not self._tombstone(document_id):
+                return
+            dead = len(self._ids) - self._live_rows
+            if dead > COMPACT_THRESHOLD * len(self._ids):
+                self._compact()
+            else:
+                self._write_log([{"deleted_document_id": document_id}])
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """Top `n_results` (chunk id, BM25 score) pairs, best first"""
+        terms = set(tokenize(query))
+        if not terms or n_results <= 0:
+            return []
+
+        with self._lock:
+            count = len(self._ids)
+            if not self._live_rows:
+                return []
+            lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+            avg_length = self._live_length / self._live_rows
+            scores = np.zeros(count, dtype=np.float32)
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                rows = np.frombuffer(postings[0], dtype=np.uint32)
+                frequencies = np.frombuffer(postings[1], dtype=np.uint16).astype(np.float32)
+                df = len(rows)
+                idf = math.log(1 + (self._live_rows - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[rows] / avg_length)
+                # Each row appears at most once per term, so fancy-index += is safe
+                scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+                del rows
+            scores[np.frombuffer(self._alive, dtype=np.bool_) == 0] = 0
+            ids = self._ids
+            del lengths
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) == 0:
+            return []
+        k = min(n_results, len(hits))
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[row], float(scores[row])) for row in top]
+
+    # Internal helpers (callers must hold self._lock)
+
+    def _append_row(self, vector_id: str, document_id: int, terms: Dict[str, int]) -> None:
+        previous = self._id_to_row.get(vector_id)
+        if previous is not None:
+            self._kill(previous)
+
+        row = len(self._ids)
+        length = sum(terms.values())
+        self._ids.append(vector_id)
+        self._id_to_row[vector_id] = row
+        self._document_ids.append(document_id)
+        self._lengths.append(length)
+        self._alive.append(1)
+        self._live_rows += 1
+        self._live_length += length
+        for term, frequency in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("H"))
+            postings[0].append(row)
+            postings[1].append(min(frequency, MAX_TERM_FREQUENCY))
+
+    def _kill(self, row: int) -> None:
+        if not self._alive[row]:
+            return
+        self._alive[row] = 0
+        self._live_rows -= 1
+        self._live_length -= self._lengths[row]
+        if self._id_to_row.get(self._ids[row]) == row:
+            del self._id_to_row[self._ids[row]]
+
+    def _tombstone(self, document_id: int) -> int:
+        document_ids = np.frombuffer(self._document_ids, dtype=np.int64)
+        rows = np.flatnonzero(document_ids == document_id).tolist()
+        del document_ids
+        live = [row for row in rows if self._alive[row]]
+        for row in live:
+            self._kill(row)
+        return len(live)
+
+    def _compact(self) -> None:
+        """Drop tombstoned rows from memory and from the log"""
+        alive = np.frombuffer(self._alive, dtype=np.bool_).copy()
+        remap = np.cumsum(alive, dtype=np.int64) - 1
+
+        postings = {}
+        for term, (rows, frequencies) in self._postings.items():
+            row_array = np.frombuffer(rows, dtype=np.uint32)
+            keep = alive[row_array]
+            if keep.any():
+                postings[term] = (
+                    array("I", remap[row_array[keep]].astype(np.uint32).tobytes()),
+                    array("H", np.frombuffer(frequencies, dtype=np.uint16)[keep].tobytes())
+                )
+            del row_array
+        self._postings = postings
+
+        keep_rows = np.flatnonzero(alive).tolist()
+        self._ids = [self._ids[row] for row in keep_rows]
+        self._id_to_row = {vector_id: row for row, vector_id in enumerate(self._ids)}
+        self._document_ids = array("q", (self._document_ids[row] for row in keep_rows))
+        self._lengths = array("I", (self._lengths[row] for row in keep_rows))
+        self._alive = bytearray(b"\x01" * len(keep_rows))
+
+        if self._log_path:
+            # Row records appear in the log in row order, so live rows can be
+            # copied over by position without re-tokenizing any text
+            tmp_path = self._log_path + ".tmp"
+            row = 0
+            with open(self._log_path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+                for line in src:
+                    if not line.strip() or line.startswith('{"deleted_document_id"'):
+                        continue
+                    if alive[row]:
+                        dst.write(line)
+                    row += 1
+            os.replace(tmp_path, self._log_path)
+
+    def _write_log(self, records: List[Dict]) -> None:
+        if not self._log_path or not records:
+            return
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def _load(self) -> None:
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if "deleted_document_id" in record:
+                    self._tombstone(record["deleted_document_id"])
+                else:
+                    self._append_row(record["id"], record["document_id"], record["terms"])
+        print(f"✓ Lexical index loaded {self._live_rows} chunks from {self.path}")
+
+
+_lexical_index_instance = None
+
+def get_lexical_index() -> BM25Index:
+    """Get or create the BM25 index (lazy initialization)"""
+    global _lexical_index_instance
+    if _lexical_index_instance is None:
+        _lexical_index_instance = BM25Index(path=settings.LEXICAL_INDEX_PATH)
+    return _lexical_index_instance
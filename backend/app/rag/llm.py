@@ -1,35 +1,63 @@
-import os
-from dotenv import load_dotenv
-from typing import List, Dict, Optional, Generator
+import re
+from typing import Any, List, Dict, Optional, Generator, AsyncGenerator
 
-# Load environment variables first
-load_dotenv()
+from ..core.config import settings
+from .context_packer import get_context_packer
+from .llm_gateway import get_llm_gateway, ProviderUnavailableError, StreamInterruptedError
 
-# Configure API Keys
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
+# Short questions containing one of these usually refer back to the conversation
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "those", "these", "they", "them", "their", "there",
+    "he", "she", "his", "her", "same", "above", "previous", "former", "latter"
+}
+FOLLOW_UP_PREFIXES = ("and ", "what about", "how about", "also ", "what if", "then ")
+FOLLOW_UP_MAX_WORDS = 12
+SUMMARY_MESSAGE_CHARS = 2000  # per message fed to the summarizer
+
+REWRITE_INSTRUCTION = """Rewrite the user's latest question as a standalone search query for a company knowledge base.
+Use the conversation only to resolve what the question refers to (names, policies, documents).
+Reply with the rewritten query only, on one line."""
+
+SUMMARY_INSTRUCTION = """You maintain a running summary of a conversation between an employee and the company AI assistant.
+Update the current summary with the new messages. Keep the topics, facts, names and numbers that later
+questions might refer to, and drop pleasantries. Reply with the updated summary only, in at most 150 words."""
+
+# Fallback replies returned instead of a generated answer
+PROVIDER_UNAVAILABLE = "Configured AI provider is unavailable."
+CONNECTION_ERROR = "I apologize, but I'm having trouble connecting to the AI service. Please try again later."
+QUOTA_ERROR = "I apologize, but I am currently experiencing high traffic (Quota Exceeded). Please try again in a minute."
+AUTH_ERROR = "I apologize, but there seems to be an issue with AI security keys."
+ALL_PROVIDERS_ERROR = "I apologize, but I'm having trouble connecting to all AI services."
+PROCESSING_ERROR = "I apologize, but I'm having trouble processing your request. Please try again."
+ERROR_RESPONSES = {
+    PROVIDER_UNAVAILABLE, CONNECTION_ERROR, QUOTA_ERROR, AUTH_ERROR, ALL_PROVIDERS_ERROR, PROCESSING_ERROR
+}
 
 class LLMHandler:
+    """Prompt construction on top of the LLM gateway.
+
+    Which provider answers, failover between providers and hedging are
+    handled by `LLMGateway`.
+    """
+
     def __init__(self):
-        self.provider = "none"
-        self.client = None
-        self.model = None
-        self.model_name = "Qwen/Qwen2.5-Coder-7B-Instruct"
-
-        if HUGGINGFACE_API_KEY:
-            self.provider = "huggingface"
-            from huggingface_hub import InferenceClient
-            self.client = InferenceClient(api_key=HUGGINGFACE_API_KEY)
-            print(f"✓ Hugging Face API Key loaded. Using {self.model_name}")
-        elif GOOGLE_API_KEY:
-            self.provider = "gemini"
-            import google.generativeai as genai
-            genai.configure(api_key=GOOGLE_API_KEY)
-            # Use Gemini 1.5 Flash (Fast & Free)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            print("✓ Google Gemini API Key loaded")
-        else:
-            print("⚠️ WARNING: No API keys found. LLM will fail.")
+        self.gateway = get_llm_gateway()
+
+    @property
+    def provider(self) -> str:
+        """Name of the preferred provider ("none" if none is configured)"""
+        return self.gateway.primary
+
+    async def awarm_up(self) -> None:
+        """Open provider connections ahead of a request (TCP + TLS handshake).
+
+        Meant to run while the query is being embedded and retrieved, so the
+        generation request starts on an established connection.
+        """
+        await self.gateway.awarm_up()
+
+    async def aclose(self) -> None:
+        await self.gateway.aclose()
     
     def _is_casual_chat(self, query: str) -> bool:
         query_lower = query.lower().strip().strip('.!?')
@@ -50,10 +78,33 @@ class LLMHandler:
             return True
             
         return False
+
+    def _is_follow_up(self, query: str) -> bool:
+        """Whether a question likely depends on the conversation to be understood"""
+        query_lower = query.lower().strip()
+        words = re.findall(r"[a-z0-9']+", query_lower)
+        if not words or len(words) > FOLLOW_UP_MAX_WORDS:
+            return False
+        return query_lower.startswith(FOLLOW_UP_PREFIXES) or any(word in FOLLOW_UP_WORDS for word in words)
     
-    def _build_prompt(self, query: str, context: List[str]) -> tuple[str, str]:
-        """Build system and user messages for the LLM"""
-        context_text = "\n\n---\n\n".join(context[:5]) if context else ""
+    def _build_prompt(
+        self,
+        query: str,
+        context: List[str],
+        metadatas: Optional[List[Dict[str, Any]]] = None,
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> tuple[str, str]:
+        """Build system and user messages for the LLM.
+
+        Context is packed into the prompt token budget: overlapping chunks of
+        a document are merged and near-duplicates dropped (see ContextPacker).
+        Recent conversation (and its rolling summary) gets a budget of its own.
+        """
+        packer = get_context_packer()
+        passages = packer.pack(context, metadatas)
+        context_text = "\n\n---\n\n".join(passages) if passages else ""
+        conversation = packer.pack_history(chat_history, settings.CHAT_HISTORY_TOKEN_BUDGET)
+        conversation_text = f"CONVERSATION SO FAR:\n{conversation}\n\n" if conversation else ""
         
         if context_text:
             system_instruction = """You are a helpful and friendly enterprise AI assistant. Answer the user's question based on the provided context.
@@ -67,9 +118,10 @@ INSTRUCTIONS:
    - Use > blockquotes for direct citations or important notes.
 3. Structure your answer with paragraphs for readability.
 4. Be conversational and friendly, but maintain a professional tone.
-5. If the context doesn't contain the answer, politely say "I couldn't find that specific information in the available documents." do not hallucinate."""
+5. If the context doesn't contain the answer, politely say "I couldn't find that specific information in the available documents." do not hallucinate.
+6. Use the conversation so far only to understand what the question refers to."""
             
-            user_message = f"CONTEXT:\n{context_text}\n\nUSER QUESTION: {query}"
+            user_message = f"{conversation_text}CONTEXT:\n{context_text}\n\nUSER QUESTION: {query}"
         else:
             system_instruction = """You are a helpful and friendly enterprise AI assistant.
 Unfortunately, I couldn't find any relevant documents in the knowledge base to answer the question.
@@ -80,7 +132,7 @@ Please provide a helpful response that:
 3. Recommends contacting HR or IT support for assistance.
 4. Maintains a helpful and polite tone."""
             
-            user_message = f"USER QUESTION: {query}"
+            user_message = f"{conversation_text}USER QUESTION: {query}"
             
         return system_instruction, user_message
     
@@ -89,7 +141,8 @@ Please provide a helpful response that:
         query: str,
         context: List[str],
         chat_history: Optional[List[Dict[str, str]]] = None,
-        user_role: str = "employee"
+        user_role: str = "employee",
+        metadatas: Optional[List[Dict[str, Any]]] = None
     ) -> str:
         """Generate response using the configured provider"""
         
@@ -97,42 +150,59 @@ Please provide a helpful response that:
         if self._is_casual_chat(query):
             return "How can I help you regarding company documents?"
         
-        system_instruction, user_message = self._build_prompt(query, context)
+        system_instruction, user_message = self._build_prompt(query, context, metadatas, chat_history)
+
+        if not self.gateway.providers:
+            return PROVIDER_UNAVAILABLE
 
         try:
-            if self.provider == "huggingface":
-                messages = [
-                    {"role": "system", "content": system_instruction},
-                    {"role": "user", "content": user_message}
-                ]
-                completion = self.client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    max_tokens=1024,
-                    temperature=0.7
-                )
-                return completion.choices[0].message.content.strip()
-
-            elif self.provider == "gemini":
-                # Gemini combines system/user prompt usually, or we can use the legacy prompt construction
-                # Using the legacy prompt construction from previous code for stability, adapted slightly
-                full_prompt = f"{system_instruction}\n\n{user_message}"
-                response = self.model.generate_content(full_prompt)
-                return response.text.strip()
-            
-            else:
-                return "Configured AI provider is unavailable."
+            return self._complete(system_instruction, user_message)
+        except Exception as e:
+            print(f"❌ LLM Error: {e}")
+            return self._fallback_error_message(e)
+
+    def _complete(
+        self,
+        system_instruction: str,
+        user_message: str,
+        max_tokens: int = 1024,
+        temperature: Optional[float] = None
+    ) -> str:
+        """One non-streaming completion through the gateway; raises on failure"""
+        return self.gateway.complete(
+            system_instruction, user_message, max_tokens, 0.7 if temperature is None else temperature
+        )
 
+    def rewrite_query(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        """Standalone retrieval query for a follow-up question; the original on failure"""
+        try:
+            return self._clean_rewrite(query, self._complete(
+                REWRITE_INSTRUCTION, self._rewrite_message(query, chat_history), max_tokens=64, temperature=0.0
+            ))
         except Exception as e:
-            print(f"❌ LLM Error ({self.provider}): {e}")
-            return "I apologize, but I'm having trouble connecting to the AI service. Please try again later."
+            print(f"⚠️ Query rewrite failed: {e}")
+            return query
+
+    def _rewrite_message(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        conversation = get_context_packer().pack_history(chat_history, settings.CHAT_HISTORY_TOKEN_BUDGET)
+        return f"CONVERSATION:\n{conversation}\n\nLATEST QUESTION: {query}"
+
+    @staticmethod
+    def _clean_rewrite(query: str, rewritten: str) -> str:
+        rewritten = rewritten.strip().splitlines()[0].strip().strip('"') if rewritten.strip() else ""
+        # Anything empty or essay-like means the model did not follow the instruction
+        if not rewritten or len(rewritten) > 4 * len(query) + 200:
+            return query
+        print(f"✏️ Rewrote follow-up '{query}' -> '{rewritten}'")
+        return rewritten
 
     def generate_response_stream(
         self,
         query: str,
         context: List[str],
         chat_history: Optional[List[Dict[str, str]]] = None,
-        user_role: str = "employee"
+        user_role: str = "employee",
+        metadatas: Optional[List[Dict[str, Any]]] = None
     ) -> Generator[str, None, None]:
         """Stream response"""
         # Handle casual chat instantly
@@ -140,63 +210,119 @@ Please provide a helpful response that:
             yield "How can I help you regarding company documents?"
             return
 
-        system_instruction, user_message = self._build_prompt(query, context)
+        system_instruction, user_message = self._build_prompt(query, context, metadatas, chat_history)
+
+        if not self.gateway.providers:
+            yield PROVIDER_UNAVAILABLE
+            return
+
+        try:
+            yield from self.gateway.stream(system_instruction, user_message)
+        except StreamInterruptedError as e:
+            print(f"❌ {e}")
+            # Part of the answer is out already; end it with an error rather than restart it
+            yield CONNECTION_ERROR
+        except Exception as e:
+            print(f"❌ All LLM providers failed: {e}")
+            yield self._fallback_error_message(e)
+
+    @staticmethod
+    def _fallback_error_message(error: Exception) -> str:
+        if isinstance(error, ProviderUnavailableError):
+            return ALL_PROVIDERS_ERROR
+        error_msg = str(error)
+        if "429" in error_msg or "quota" in error_msg.lower():
+            return QUOTA_ERROR
+        if "401" in error_msg or "authorized" in error_msg.lower():
+            return AUTH_ERROR
+        return ALL_PROVIDERS_ERROR
+
+    async def agenerate_response(
+        self,
+        query: str,
+        context: List[str],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_role: str = "employee",
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> str:
+        """Async `generate_response`"""
+        if self._is_casual_chat(query):
+            return "How can I help you regarding company documents?"
+
+        system_instruction, user_message = self._build_prompt(query, context, metadatas, chat_history)
+
+        if not self.gateway.providers:
+            return PROVIDER_UNAVAILABLE
 
         try:
-            # Primary Provider Attempt
-            if self.provider == "huggingface":
-                yield from self._stream_huggingface(system_instruction, user_message)
-            elif self.provider == "gemini":
-                yield from self._stream_gemini(system_instruction, user_message)
-            else:
-                yield "Configured AI provider is unavailable."
+            return await self._acomplete(system_instruction, user_message)
+        except Exception as e:
+            print(f"❌ LLM Error: {e}")
+            return self._fallback_error_message(e)
 
+    async def _acomplete(
+        self,
+        system_instruction: str,
+        user_message: str,
+        max_tokens: int = 1024,
+        temperature: Optional[float] = None
+    ) -> str:
+        """Async `_complete`; hedged across providers when enabled"""
+        return await self.gateway.acomplete(
+            system_instruction, user_message, max_tokens, 0.7 if temperature is None else temperature
+        )
+
+    async def arewrite_query(self, query: str, chat_history: List[Dict[str, str]]) -> str:
+        """Async `rewrite_query`"""
+        try:
+            return self._clean_rewrite(query, await self._acomplete(
+                REWRITE_INSTRUCTION, self._rewrite_message(query, chat_history), max_tokens=64, temperature=0.0
+            ))
         except Exception as e:
-            print(f"❌ Primary LLM Error ({self.provider}): {e}")
-            
-            # Fallback Logic
-            fallback_provider = "gemini" if self.provider == "huggingface" else "huggingface"
-            print(f"🔄 Attempting fallback to {fallback_provider}...")
-            
-            try:
-                if fallback_provider == "gemini":
-                    yield from self._stream_gemini(system_instruction, user_message)
-                else:
-                    yield from self._stream_huggingface(system_instruction, user_message)
-            except Exception as e2:
-                error_msg = str(e2)
-                print(f"❌ Fallback also failed: {e2}")
-                if "429" in error_msg or "quota" in error_msg.lower():
-                    yield "I apologize, but I am currently experiencing high traffic (Quota Exceeded). Please try again in a minute."
-                elif "401" in error_msg or "authorized" in error_msg.lower():
-                    yield "I apologize, but there seems to be an issue with AI security keys."
-                else:
-                    yield "I apologize, but I'm having trouble connecting to all AI services."
-
-    def _stream_huggingface(self, system_instruction: str, user_message: str):
-        messages = [
-            {"role": "system", "content": system_instruction},
-            {"role": "user", "content": user_message}
-        ]
-        stream = self.client.chat.completions.create(
-            model=os.getenv("AI_MODEL", "Qwen/Qwen2.5-72B-Instruct"),
-            messages=messages,
-            max_tokens=1024,
-            temperature=0.7,
-            stream=True
+            print(f"⚠️ Query rewrite failed: {e}")
+            return query
+
+    async def asummarize(self, summary: Optional[str], messages: List[Dict[str, str]]) -> Optional[str]:
+        """Fold `messages` into a conversation summary; None on failure"""
+        lines = "\n".join(
+            f"{message['role'].capitalize()}: {message['content'][:SUMMARY_MESSAGE_CHARS]}" for message in messages
         )
-        for chunk in stream:
-            if chunk.choices:
-                content = chunk.choices[0].delta.content
-                if content:
-                    yield content
-
-    def _stream_gemini(self, system_instruction: str, user_message: str):
-        full_prompt = f"{system_instruction}\n\n{user_message}"
-        response = self.model.generate_content(full_prompt, stream=True)
-        for chunk in response:
-            if chunk.text:
-                yield chunk.text
+        user_message = f"CURRENT SUMMARY:\n{summary or '(none yet)'}\n\nNEW MESSAGES:\n{lines}"
+        try:
+            updated = await self._acomplete(SUMMARY_INSTRUCTION, user_message, max_tokens=300, temperature=0.2)
+            return updated or None
+        except Exception as e:
+            print(f"⚠️ Conversation summary failed: {e}")
+            return None
+
+    async def agenerate_response_stream(
+        self,
+        query: str,
+        context: List[str],
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_role: str = "employee",
+        metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Async `generate_response_stream`; hedged across providers when enabled"""
+        if self._is_casual_chat(query):
+            yield "How can I help you regarding company documents?"
+            return
+
+        system_instruction, user_message = self._build_prompt(query, context, metadatas, chat_history)
+
+        if not self.gateway.providers:
+            yield PROVIDER_UNAVAILABLE
+            return
+
+        try:
+            async for chunk in self.gateway.astream(system_instruction, user_message):
+                yield chunk
+        except StreamInterruptedError as e:
+            print(f"❌ {e}")
+            yield CONNECTION_ERROR
+        except Exception as e:
+            print(f"❌ All LLM providers failed: {e}")
+            yield self._fallback_error_message(e)
 
 llm_handler = None
 
@@ -0,0 +1,657 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from ..core.config import settings
+
+load_dotenv()
+
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+HUGGINGFACE_API_KEY = os.getenv("HUGGINGFACE_API_KEY")
+HF_INFERENCE_URL = os.getenv("HF_INFERENCE_ENDPOINT", "https://api-inference.huggingface.co")
+
+# Idle connections are kept this long; a warm-up within it is skipped
+LLM_KEEPALIVE_SECONDS = 60.0
+
+LATENCY_WINDOW = 200  # recent latencies kept per provider and call kind
+MIN_HEDGE_SAMPLES = 10  # below this the maximum hedge delay is used
+
+FIRST_TOKEN = "first_token"
+COMPLETE = "complete"
+
+
+class ProviderUnavailableError(RuntimeError):
+    """No provider is configured, or every provider's circuit is open"""
+
+
+class StreamInterruptedError(RuntimeError):
+    """A provider failed after part of the answer was already streamed"""
+
+
+class LLMProvider(ABC):
+    """One chat-completion backend.
+
+    `complete`/`stream` serve the sync pipeline, `acomplete`/`astream` the
+    async one. Implementations raise on any failure; retries, fallback and
+    hedging are the gateway's job.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._last_used = 0.0
+
+    @abstractmethod
+    def complete(self, system_instruction: str, user_message: str, max_tokens: int, temperature: float) -> str:
+        pass
+
+    @abstractmethod
+    def stream(self, system_instruction: str, user_message: str, max_tokens: int, temperature: float) -> Iterator[str]:
+        pass
+
+    @abstractmethod
+    async def acomplete(self, system_instruction: str, user_message: str, max_tokens: int, temperature: float) -> str:
+        pass
+
+    @abstractmethod
+    def astream(
+        self, system_instruction: str, user_message: str, max_tokens: int, temperature: float
+    ) -> AsyncIterator[str]:
+        pass
+
+    async def awarm_up(self) -> None:
+        """Open the provider connection ahead of a request (TCP + TLS handshake).
+
+        Skipped while a pooled connection is most likely still open. Failures
+        are ignored; the request itself will surface them.
+        """
+        if time.monotonic() - self._last_used < LLM_KEEPALIVE_SECONDS / 2:
+            return
+        self._last_used = time.monotonic()
+        try:
+            await self._aconnect()
+        except Exception as e:
+            print(f"⚠️ LLM warm-up failed ({self.name}): {e}")
+
+    async def _aconnect(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        """Release pooled connections"""
+        pass
+
+
+class HuggingFaceProvider(LLMProvider):
+    """Hugging Face inference API over a pooled keep-alive HTTP client"""
+
+    name = "huggingface"
+
+    def __init__(self, api_key: str, base_url: str = HF_INFERENCE_URL):
+        super().__init__()
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model_name = "Qwen/Qwen2.5-Coder-7B-Instruct"
+        self.stream_model_name = os.getenv("AI_MODEL", "Qwen/Qwen2.5-72B-Instruct")
+        self._client = None
+        self._http = None
+        print(f"✓ Hugging Face API Key loaded. Using {self.model_name}")
+
+    @property
+    def client(self):
+        """Sync client for the threadpool code path"""
+        if self._client is None:
+            from huggingface_hub import InferenceClient
+            self._client = InferenceClient(api_key=self.api_key)
+        return self._client
+
+    @property
+    def http(self):
+        """Pooled keep-alive HTTP client for the async code path.
+
+        AsyncInferenceClient opens a new session per call; keeping one pool
+        lets `awarm_up` pre-open the connection the next request will reuse.
+        """
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=httpx.Timeout(60.0, connect=10.0),
+                limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=LLM_KEEPALIVE_SECONDS)
+            )
+        return self._http
+
+    @staticmethod
+    def _messages(system_instruction: str, user_message: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system_instruction},
+            {"role": "user", "content": user_message}
+        ]
+
+    def complete(self, system_instruction, user_message, max_tokens, temperature):
+        completion = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=self._messages(system_instruction, user_message),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+        return completion.choices[0].message.content.strip()
+
+    def stream(self, system_instruction, user_message, max_tokens, temperature):
+        stream = self.client.chat.completions.create(
+            model=self.stream_model_name,
+            messages=self._messages(system_instruction, user_message),
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True
+        )
+        for chunk in stream:
+            if chunk.choices:
+                content = chunk.choices[0].delta.content
+                if content:
+                    yield content
+
+    async def acomplete(self, system_instruction, user_message, max_tokens, temperature):
+        response = await self.http.post(
+            f"/models/{self.model_name}/v1/chat/completions",
+            json={
+                "model": self.model_name,
+                "messages": self._messages(system_instruction, user_message),
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+        )
+        response.raise_for_status()
+        self._last_used = time.monotonic()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    async def astream(self, system_instruction, user_message, max_tokens, temperature):
+        model = self.stream_model_name
+        payload = {
+            "model": model,
+            "messages": self._messages(system_instruction, user_message),
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True
+        }
+        async with self.http.stream("POST", f"/models/{model}/v1/chat/completions", json=payload) as response:
+            response.raise_for_status()
+            # Server-sent events: "data: {chunk}" lines, terminated by "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("choices"):
+                    content = chunk["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+        self._last_used = time.monotonic()
+
+    async def _aconnect(self) -> None:
+        await self.http.head("/")
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini; the SDK keeps one gRPC channel per model"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+        super().__init__()
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        # Use Gemini 1.5 Flash (Fast & Free)
+        self.model = genai.GenerativeModel(model_name)
+        print("✓ Google Gemini API Key loaded")
+
+    @staticmethod
+    def _prompt(system_instruction: str, user_message: str) -> str:
+        # Gemini gets system and user text as one prompt
+        return f"{system_instruction}\n\n{user_message}"
+
+    @staticmethod
+    def _generation_config(max_tokens: int, temperature: float) -> Dict[str, Any]:
+        return {"max_output_tokens": max_tokens, "temperature": temperature}
+
+    def complete(self, system_instruction, user_message, max_tokens, temperature):
+        response = self.model.generate_content(
+            self._prompt(system_instruction, user_message),
+            generation_config=self._generation_config(max_tokens, temperature)
+        )
+        return response.text.strip()
+
+    def stream(self, system_instruction, user_message, max_tokens, temperature):
+        response = self.model.generate_content(
+            self._prompt(system_instruction, user_message),
+            generation_config=self._generation_config(max_tokens, temperature),
+            stream=True
+        )
+        for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+    async def acomplete(self, system_instruction, user_message, max_tokens, temperature):
+        response = await self.model.generate_content_async(
+            self._prompt(system_instruction, user_message),
+            generation_config=self._generation_config(max_tokens, temperature)
+        )
+        self._last_used = time.monotonic()
+        return response.text.strip()
+
+    async def astream(self, system_instruction, user_message, max_tokens, temperature):
+        response = await self.model.generate_content_async(
+            self._prompt(system_instruction, user_message),
+            generation_config=self._generation_config(max_tokens, temperature),
+            stream=True
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+        self._last_used = time.monotonic()
+
+    async def _aconnect(self) -> None:
+        # Creates the model's gRPC channel and connects it
+        await self.model.count_tokens_async("ping")
+
+
+class LocalProvider(LLMProvider):
+    """Offline stand-in for tests and local development.
+
+    Answers by echoing the last line of the user message (the question),
+    with a configurable delay before the first token and between tokens,
+    so streaming, hedging and failover can be exercised without API keys.
+    """
+
+    name = "local"
+
+    def __init__(self, first_token_ms: float = 50.0, token_ms: float = 5.0):
+        super().__init__()
+        self.first_token_ms = first_token_ms
+        self.token_ms = token_ms
+        print("✓ Local stand-in LLM enabled")
+
+    @staticmethod
+    def _reply(user_message: str) -> List[str]:
+        last_line = user_message.strip().splitlines()[-1] if user_message.strip() else ""
+        # "USER QUESTION: ..." -> "..."
+        label, _, text = last_line.partition(": ")
+        reply = text if text and label.isupper() else last_line
+        return [word + " " for word in reply.split()]
+
+    def complete(self, system_instruction, user_message, max_tokens, temperature):
+        time.sleep(self.first_token_ms / 1000)
+        return "".join(self._reply(user_message)[:max_tokens]).strip()
+
+    def stream(self, system_instruction, user_message, max_tokens, temperature):
+        time.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self._reply(user_message)[:max_tokens]):
+            if i:
+                time.sleep(self.token_ms / 1000)
+            yield token
+
+    async def acomplete(self, system_instruction, user_message, max_tokens, temperature):
+        await asyncio.sleep(self.first_token_ms / 1000)
+        return "".join(self._reply(user_message)[:max_tokens]).strip()
+
+    async def astream(self, system_instruction, user_message, max_tokens, temperature):
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for i, token in enumerate(self._reply(user_message)[:max_tokens]):
+            if i:
+                await asyncio.sleep(self.token_ms / 1000)
+            yield token
+
+
+class CircuitBreaker:
+    """Health of one provider.
+
+    `failure_threshold` consecutive failures open the circuit: the provider
+    is skipped for `cooldown_seconds`, then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit. A
+    call slower than `slow_call_seconds` counts as a failure, so a provider
+    that degrades without erroring is also taken out of rotation. Recent
+    latencies are kept per call kind for the gateway's hedge delay.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown_seconds: float = 30.0, slow_call_seconds: float = 15.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.slow_call_seconds = slow_call_seconds
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; claims the trial call when half-open"""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_seconds or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self, kind: str, latency: float) -> None:
+        if latency > self.slow_call_seconds:
+            print(f"🐢 {self.name} took {latency:.1f}s ({kind})")
+            self.record_failure()
+            return
+        with self._lock:
+            self._latencies.setdefault(kind, deque(maxlen=LATENCY_WINDOW)).append(latency)
+            if self._opened_at is not None:
+                print(f"🔌 Circuit closed for {self.name}")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            half_open = self._trial_in_flight
+            self._trial_in_flight = False
+            if half_open or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                print(f"🔌 Circuit open for {self.name} for {self.cooldown_seconds:g}s")
+
+    def release(self) -> None:
+        """Give back a claimed trial call that was abandoned without an outcome"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def percentile(self, kind: str, q: float) -> Optional[float]:
+        """Latency percentile in seconds, or None with too few samples"""
+        with self._lock:
+            samples = list(self._latencies.get(kind, ()))
+        if len(samples) < MIN_HEDGE_SAMPLES:
+            return None
+        return float(np.percentile(samples, q))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "p50_first_token_ms": self._ms(self.percentile(FIRST_TOKEN, 50)),
+            "p95_first_token_ms": self._ms(self.percentile(FIRST_TOKEN, 95)),
+            "p95_complete_ms": self._ms(self.percentile(COMPLETE, 95))
+        }
+
+    @staticmethod
+    def _ms(seconds: Optional[float]) -> Optional[float]:
+        return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class LLMGateway:
+    """Routes completions over providers in preference order.
+
+    Calls go to the first provider whose circuit is closed; if it fails
+    before producing output, the next one is tried. With hedging enabled, a
+    request that has not produced its first token (or, for completions, its
+    answer) after the primary's p95 latency is also sent to the next
+    provider, and whichever answers first is used while the other is
+    cancelled. Once a stream has yielded text it is never switched to
+    another provider, so answers are not spliced together; a failure then
+    raises StreamInterruptedError.
+    """
+
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge_enabled: bool = True,
+        hedge_min_delay_ms: float = 250.0,
+        hedge_max_delay_ms: float = 2000.0,
+        failure_threshold: int = 3,
+        cooldown_seconds: float = 30.0,
+        slow_call_seconds: float = 15.0
+    ):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay_ms / 1000
+        self.hedge_max_delay = hedge_max_delay_ms / 1000
+        self.breakers = {
+            provider.name: CircuitBreaker(provider.name, failure_threshold, cooldown_seconds, slow_call_seconds)
+            for provider in providers
+        }
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    @property
+    def primary(self) -> str:
+        return self.providers[0].name if self.providers else "none"
+
+    def _candidates(self) -> Iterator[LLMProvider]:
+        # Lazy, so a half-open trial is only claimed for a call actually made
+        for provider in self.providers:
+            if self.breakers[provider.name].allow():
+                yield provider
+
+    def _hedge_delay(self, provider: LLMProvider, kind: str) -> float:
+        p95 = self.breakers[provider.name].percentile(kind, 95)
+        if p95 is None:
+            return self.hedge_max_delay
+        return min(max(p95, self.hedge_min_delay), self.hedge_max_delay)
+
+    def complete(self, system_instruction: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.7) -> str:
+        """Sync completion with failover (no hedging on the threadpool path)"""
+        last_error: Optional[Exception] = None
+        for provider in self._candidates():
+            started = time.monotonic()
+            try:
+                result = provider.complete(system_instruction, user_message, max_tokens, temperature)
+            except Exception as e:
+                self._failed(provider, e)
+                last_error = e
+                continue
+            self.breakers[provider.name].record_success(COMPLETE, time.monotonic() - started)
+            return result
+        raise last_error or ProviderUnavailableError("No LLM provider available")
+
+    def stream(
+        self, system_instruction: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.7
+    ) -> Iterator[str]:
+        """Sync stream with failover until the first token"""
+        last_error: Optional[Exception] = None
+        for provider in self._candidates():
+            started = time.monotonic()
+            chunks = provider.stream(system_instruction, user_message, max_tokens, temperature)
+            try:
+                first = next(chunks, None)
+            except Exception as e:
+                self._failed(provider, e)
+                last_error = e
+                continue
+            self.breakers[provider.name].record_success(FIRST_TOKEN, time.monotonic() - started)
+            if first is None:
+                return
+            yield first
+            try:
+                yield from chunks
+            except Exception as e:
+                self._failed(provider, e)
+                raise StreamInterruptedError(f"{provider.name} failed mid-stream: {e}") from e
+            return
+        raise last_error or ProviderUnavailableError("No LLM provider available")
+
+    async def acomplete(
+        self, system_instruction: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.7
+    ) -> str:
+        async def start(provider: LLMProvider) -> str:
+            return await provider.acomplete(system_instruction, user_message, max_tokens, temperature)
+
+        async def discard(result: str) -> None:
+            pass
+
+        _, result = await self._arace(COMPLETE, start, discard)
+        return result
+
+    async def astream(
+        self, system_instruction: str, user_message: str, max_tokens: int = 1024, temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        async def start(provider: LLMProvider) -> Tuple[AsyncIterator[str], Optional[str]]:
+            chunks = provider.astream(system_instruction, user_message, max_tokens, temperature)
+            try:
+                return chunks, await chunks.__anext__()
+            except StopAsyncIteration:
+                return chunks, None
+            except BaseException:
+                await chunks.aclose()
+                raise
+
+        async def discard(opened: Tuple[AsyncIterator[str], Optional[str]]) -> None:
+            await opened[0].aclose()
+
+        provider, (chunks, first) = await self._arace(FIRST_TOKEN, start, discard)
+        try:
+            if first is None:
+                return
+            yield first
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except Exception as e:
+                self._failed(provider, e)
+                raise StreamInterruptedError(f"{provider.name} failed mid-stream: {e}") from e
+        finally:
+            await chunks.aclose()
+
+    async def _arace(
+        self,
+        kind: str,
+        start: Callable[[LLMProvider], Awaitable[Any]],
+        discard: Callable[[Any], Awaitable[None]]
+    ) -> Tuple[LLMProvider, Any]:
+        """First successful `start(provider)`, failing over and hedging as configured"""
+        candidates = self._candidates()
+        pending: Dict[asyncio.Task, Tuple[LLMProvider, float]] = {}
+        last_error: Optional[Exception] = None
+        hedged = False
+
+        def launch() -> bool:
+            provider = next(candidates, None)
+            if provider is None:
+                return False
+            pending[asyncio.create_task(start(provider))] = (provider, time.monotonic())
+            return True
+
+        if not launch():
+            raise ProviderUnavailableError("No LLM provider available")
+        try:
+            while pending:
+                timeout = None
+                if self.hedge_enabled and not hedged and len(pending) == 1:
+                    primary, started = next(iter(pending.values()))
+                    timeout = max(0.0, started + self._hedge_delay(primary, kind) - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        self.hedges += 1
+                        print(f"🏁 No {kind.replace('_', ' ')} from {primary.name} after {timeout * 1000:.0f}ms, hedging")
+                    continue
+
+                winner = None
+                for task in done:
+                    provider, started = pending.pop(task)
+                    if task.exception() is not None:
+                        last_error = task.exception()
+                        self._failed(provider, last_error)
+                    elif winner is None:
+                        self.breakers[provider.name].record_success(kind, time.monotonic() - started)
+                        winner = (provider, task.result())
+                    else:
+                        await discard(task.result())
+                if winner is not None:
+                    if hedged and winner[0] is not primary:
+                        self.hedge_wins += 1
+                    return winner
+                if not pending and launch():
+                    print(f"🔄 Failing over to {next(iter(pending.values()))[0].name}")
+            raise last_error or ProviderUnavailableError("No LLM provider available")
+        finally:
+            # Losers of a hedge race (or everything, if the caller was cancelled)
+            for task in pending:
+                task.cancel()
+            results = await asyncio.gather(*pending, return_exceptions=True)
+            for (provider, _), result in zip(pending.values(), results):
+                self.breakers[provider.name].release()
+                if not isinstance(result, BaseException):
+                    await discard(result)
+
+    def _failed(self, provider: LLMProvider, error: Exception) -> None:
+        print(f"❌ LLM Error ({provider.name}): {error}")
+        self.breakers[provider.name].record_failure()
+
+    async def awarm_up(self) -> None:
+        """Warm the providers a request may use (the primary, and the hedge target)"""
+        count = 2 if self.hedge_enabled else 1
+        await asyncio.gather(*(provider.awarm_up() for provider in self.providers[:count]))
+
+    async def aclose(self) -> None:
+        for provider in self.providers:
+            await provider.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {provider.name: self.breakers[provider.name].stats() for provider in self.providers},
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins
+        }
+
+
+def create_provider(name: str) -> Optional[LLMProvider]:
+    """Provider by name, or None if its API key is not set"""
+    if name == "huggingface":
+        return HuggingFaceProvider(HUGGINGFACE_API_KEY) if HUGGINGFACE_API_KEY else None
+    if name == "gemini":
+        return GeminiProvider(GOOGLE_API_KEY) if GOOGLE_API_KEY else None
+    if name == "local":
+        return LocalProvider(first_token_ms=settings.LOCAL_LLM_LATENCY_MS)
+    raise ValueError(f"Unsupported LLM provider: {name}")
+
+
+_llm_gateway_instance = None
+
+def get_llm_gateway() -> LLMGateway:
+    """Get or create the LLM gateway (lazy initialization)"""
+    global _llm_gateway_instance
+    if _llm_gateway_instance is None:
+        names = [name.strip().lower() for name in settings.LLM_PROVIDERS.split(",") if name.strip()]
+        providers = [provider for provider in map(create_provider, names or ["huggingface", "gemini"]) if provider]
+        if not providers:
+            print("⚠️ WARNING: No API keys found. LLM will fail.")
+        _llm_gateway_instance = LLMGateway(
+            providers,
+            hedge_enabled=settings.LLM_HEDGE_ENABLED,
+            hedge_min_delay_ms=settings.LLM_HEDGE_MIN_DELAY_MS,
+            hedge_max_delay_ms=settings.LLM_HEDGE_MAX_DELAY_MS,
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            cooldown_seconds=settings.LLM_BREAKER_COOLDOWN_SECONDS,
+            slow_call_seconds=settings.LLM_SLOW_CALL_SECONDS
+        )
+    return _llm_gateway_instance
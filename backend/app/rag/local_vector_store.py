@@ -0,0 +1,451 @@
+import asyncio
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .ann_index import IVFIndex
+from .vector_store import BaseVectorStore, DIMENSION
+
+VECTORS_FILE = "vectors.npy"
+RECORDS_FILE = "records.jsonl"
+INITIAL_CAPACITY = 1024
+COMPACT_THRESHOLD = 0.25  # compact once this fraction of rows is tombstoned
+ANN_RETRAIN_GROWTH = 2  # re-cluster once the index doubles since training
+
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Pinecone-style metadata filter against one metadata dict"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if not _compare(op, value, operand, key in metadata):
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _compare(op: str, value: Any, operand: Any, present: bool) -> bool:
+    if op == "$eq":
+        return value == operand
+    if op == "$ne":
+        return value != operand
+    if op == "$in":
+        return value in operand
+    if op == "$nin":
+        return value not in operand
+    if op == "$exists":
+        return present == bool(operand)
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > operand
+    if op == "$gte":
+        return value >= operand
+    if op == "$lt":
+        return value < operand
+    if op == "$lte":
+        return value <= operand
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+class LocalVectorStore(BaseVectorStore):
+    """In-process vector store backed by a memory-mapped float32 matrix.
+
+    Vectors are L2-normalised on insert so cosine similarity is a single
+    matrix-vector product. Row metadata (including chunk text) lives in an
+    append-only JSONL file whose line count is the committed row count, so a
+    crash between writing a vector and its record never exposes a half row.
+    Deletes are tombstones in that log; rows are physically removed once
+    enough of them are dead.
+
+    With ``index_type="ivf"`` queries go through an IVF approximate index
+    (see `IVFIndex`) once the store holds ``ann_min_rows`` vectors; smaller
+    stores and heavily filtered queries use the exact scan. The index is
+    snapshotted when it is (re)built or compacted and on `snapshot`/`aclose`,
+    not on every add, which would rewrite the whole assignment array per
+    upsert batch.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dimension: int = DIMENSION,
+        index_type: str = "flat",
+        nlist: int = 0,
+        nprobe: int = 8,
+        ann_min_rows: int = 10000
+    ):
+        self.path = path
+        self.dimension = dimension
+        self.ann_min_rows = ann_min_rows
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        if index_type == "ivf":
+            self._ann: Optional[IVFIndex] = IVFIndex(nlist=nlist, nprobe=nprobe)
+        elif index_type == "flat":
+            self._ann = None
+        else:
+            raise ValueError(f"Unsupported local index type: {index_type}")
+
+        self._vectors_path = os.path.join(path, VECTORS_FILE)
+        self._records_path = os.path.join(path, RECORDS_FILE)
+
+        self._ids: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._document_ids = np.empty(0, dtype=np.int64)
+        self._alive = np.empty(0, dtype=bool)
+        self._matrix: Optional[np.memmap] = None
+        self._ann_dirty = False  # incremental ANN updates not in the snapshot yet
+        self._load()
+
+    @property
+    def count(self) -> int:
+        """Number of stored rows, including tombstoned ones"""
+        return len(self._ids)
+
+    def add_documents(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str]
+    ) -> None:
+        """Append vectors, overwriting rows whose id already exists"""
+        if not ids:
+            return
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        if vectors.shape != (len(ids), self.dimension):
+            raise ValueError(
+                f"Expected embeddings of shape ({len(ids)}, {self.dimension}), got {vectors.shape}"
+            )
+
+        with self._lock:
+            new_rows = []
+            appended: Dict[str, Dict[str, Any]] = {}
+            appended_rows: Dict[str, int] = {}
+            overwritten = []
+            first_new_row = next_row = self.count
+            for i, vector_id in enumerate(ids):
+                # Ensure metadata doesn't contain nulls
+                clean_meta = {k: v for k, v in metadatas[i].items() if v is not None}
+                clean_meta['text'] = documents[i]
+                row = self._id_to_row.get(vector_id)
+                if row is not None:
+                    self._metadatas[row] = clean_meta
+                    self._document_ids[row] = clean_meta.get("document_id", -1)
+                    overwritten.append(row)
+                else:
+                    row = appended_rows.get(vector_id)
+                    if row is None:
+                        row = next_row
+                        next_row += 1
+                        appended_rows[vector_id] = row
+                    appended[vector_id] = clean_meta
+                new_rows.append(row)
+
+            # Last write wins for ids repeated within the batch
+            last_index = {row: i for i, row in enumerate(new_rows)}
+            self._ensure_capacity(next_row)
+            self._matrix[list(last_index)] = vectors[list(last_index.values())]
+            self._matrix.flush()
+
+            appended = list(appended.items())
+            if overwritten:
+                # Some rows were overwritten in place; rewrite the record log
+                self._append_in_memory(appended)
+                self._rewrite_records()
+            else:
+                with open(self._records_path, "a", encoding="utf-8") as f:
+                    for vector_id, meta in appended:
+                        f.write(json.dumps({"id": vector_id, "metadata": meta}) + "\n")
+                self._append_in_memory(appended)
+
+            self._update_ann(first_new_row, sorted(set(overwritten)))
+
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Cosine top-k over live rows matching `where`"""
+        empty = {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+        try:
+            if not query_embedding or n_results <= 0:
+                return empty
+            query_vector = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+
+            with self._lock:
+                count = self.count
+                if count == 0:
+                    return empty
+                matrix = self._matrix[:count]
+                ids = self._ids
+                metadatas = self._metadatas
+                alive = self._alive
+                candidates = None
+                if self._ann is not None and self._ann.is_trained:
+                    candidates = self._ann.candidates(query_vector)
+                    candidates = candidates[candidates < count]
+                    candidates = candidates[alive[candidates]]
+                    candidates = candidates[self._filter_mask(where, candidates)]
+                    if len(candidates) < n_results:
+                        # Too few hits in the probed lists; fall back to an exact scan
+                        candidates = None
+                if candidates is None:
+                    candidates = np.flatnonzero(alive[:count])
+                    if where:
+                        candidates = candidates[self._filter_mask(where, candidates)]
+
+            k = min(n_results, len(candidates))
+            if k == 0:
+                return empty
+            if len(candidates) == count:
+                scores = matrix @ query_vector
+            else:
+                scores = matrix[candidates] @ query_vector
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            rows = top if len(candidates) == count else candidates[top]
+            return self._format_results(rows, ids, metadatas)
+
+        except Exception as e:
+            print(f"❌ Query Error: {e}")
+            return empty
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        with self._lock:
+            for vector_id in ids:
+                row = self._id_to_row.get(vector_id)
+                if row is not None:
+                    found[vector_id] = {
+                        "values": self._matrix[row].tolist(),
+                        "metadata": dict(self._metadatas[row])
+                    }
+        return found
+
+    def delete_by_document_id(self, document_id: int) -> None:
+        with self._lock:
+            if not self._tombstone(document_id):
+                return
+            live = int(self._alive.sum())
+            if self.count - live > COMPACT_THRESHOLD * self.count:
+                self._compact(np.flatnonzero(self._alive))
+            else:
+                with open(self._records_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"deleted_document_id": document_id}) + "\n")
+
+    def get_document_count(self) -> int:
+        return int(self._alive.sum())
+
+    def snapshot(self) -> None:
+        """Flush vectors and persist the ANN index so other workers can load it"""
+        with self._lock:
+            self._matrix.flush()
+            if self._ann is not None and self._ann_dirty:
+                self._ann.save(self.path)
+                self._ann_dirty = False
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self.snapshot)
+
+    # Internal helpers
+
+    def _normalize(self, vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _filter_mask(self, where: Optional[Dict[str, Any]], rows: np.ndarray) -> np.ndarray:
+        if not where:
+            return np.ones(len(rows), dtype=bool)
+        # Fast path for the common single document filter
+        if set(where) == {"document_id"} and not isinstance(where["document_id"], dict):
+            return self._document_ids[rows] == where["document_id"]
+        return np.fromiter(
+            (matches_filter(self._metadatas[row], where) for row in rows),
+            dtype=bool,
+            count=len(rows)
+        )
+
+    def _format_results(
+        self,
+        rows: np.ndarray,
+        ids: List[str],
+        metadatas: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        result_ids = []
+        documents = []
+        result_metas = []
+        for row in rows:
+            meta = dict(metadatas[row])
+            documents.append(meta.pop('text', ""))
+            result_metas.append(meta)
+            result_ids.append(ids[row])
+        return {
+            "ids": [result_ids],
+            "documents": [documents],
+            "metadatas": [result_metas]
+        }
+
+    def _append_in_memory(self, appended: List[tuple]) -> None:
+        start = self.count
+        for offset, (vector_id, meta) in enumerate(appended):
+            self._id_to_row[vector_id] = start + offset
+            self._ids.append(vector_id)
+            self._metadatas.append(meta)
+        if appended:
+            new_doc_ids = np.array(
+                [meta.get("document_id", -1) for _, meta in appended], dtype=np.int64
+            )
+            self._document_ids = np.concatenate([self._document_ids, new_doc_ids])
+            self._alive = np.concatenate([self._alive, np.ones(len(appended), dtype=bool)])
+
+    def _tombstone(self, document_id: int) -> int:
+        """Mark live rows of a document as deleted; returns how many were marked"""
+        rows = np.flatnonzero((self._document_ids == document_id) & self._alive)
+        if len(rows) == 0:
+            return 0
+        # Copy-on-write so concurrent readers keep a consistent snapshot
+        alive = self._alive.copy()
+        alive[rows] = False
+        self._alive = alive
+        for row in rows:
+            self._forget_id(row)
+        return len(rows)
+
+    def _forget_id(self, row: int) -> None:
+        vector_id = self._ids[row]
+        if self._id_to_row.get(vector_id) == row:
+            del self._id_to_row[vector_id]
+
+    def _update_ann(self, first_new_row: int, overwritten: List[int]) -> None:
+        if self._ann is None:
+            return
+        if not self._ann.is_trained:
+            if self.get_document_count() < self.ann_min_rows:
+                return
+            self._ann.train(self._matrix[:self.count])
+        elif self.count > ANN_RETRAIN_GROWTH * self._ann.trained_size:
+            self._ann.train(self._matrix[:self.count])
+        else:
+            if overwritten:
+                rows = np.array(overwritten)
+                self._ann.overwrite(rows, self._matrix[rows])
+            self._ann.add(self._matrix[first_new_row:self.count])
+            self._ann_dirty = self._ann_dirty or bool(overwritten) or first_new_row < self.count
+            return
+        self._ann.save(self.path)
+        self._ann_dirty = False
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = self._matrix.shape[0] if self._matrix is not None else 0
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        self._replace_matrix(new_capacity, self._matrix[:self.count] if self._matrix is not None else None)
+
+    def _replace_matrix(self, capacity: int, existing: Optional[np.ndarray]) -> None:
+        """Write a new vectors file of `capacity` rows and atomically swap it in"""
+        tmp_path = self._vectors_path + ".tmp"
+        matrix = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dimension)
+        )
+        if existing is not None and len(existing):
+            matrix[:len(existing)] = existing
+        matrix.flush()
+        # Release our mappings before swapping files (required on Windows)
+        del matrix, existing
+        self._matrix = None
+        os.replace(tmp_path, self._vectors_path)
+        self._matrix = np.load(self._vectors_path, mmap_mode="r+")
+
+    def _compact(self, keep: np.ndarray) -> None:
+        kept = np.asarray(self._matrix[keep])
+        ids = [self._ids[row] for row in keep]
+        metadatas = [self._metadatas[row] for row in keep]
+        capacity = max(INITIAL_CAPACITY, self._matrix.shape[0])
+
+        # Readers hold references to the old lists and matrix, so build new ones
+        self._replace_matrix(capacity, kept)
+        self._ids = ids
+        self._metadatas = metadatas
+        self._id_to_row = {vector_id: row for row, vector_id in enumerate(ids)}
+        self._document_ids = self._document_ids[keep].copy()
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._rewrite_records()
+        if self._ann is not None and self._ann.is_trained:
+            self._ann.compact(keep)
+            self._ann.save(self.path)
+            self._ann_dirty = False
+
+    def _rewrite_records(self) -> None:
+        tmp_path = self._records_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for vector_id, meta, alive in zip(self._ids, self._metadatas, self._alive):
+                record = {"id": vector_id, "metadata": meta}
+                if not alive:
+                    record["deleted"] = True
+                f.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, self._records_path)
+
+    def _load(self) -> None:
+        if os.path.exists(self._records_path):
+            with open(self._records_path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f if line.strip()]
+            # Replay the log in order so tombstones only hit rows written before them
+            pending = []
+            dead_rows = []
+            for record in records:
+                if "deleted_document_id" in record:
+                    self._append_in_memory(pending)
+                    pending = []
+                    self._tombstone(record["deleted_document_id"])
+                    continue
+                if record.get("deleted"):
+                    dead_rows.append(self.count + len(pending))
+                pending.append((record["id"], record["metadata"]))
+            self._append_in_memory(pending)
+            if dead_rows:
+                self._alive[dead_rows] = False
+                for row in dead_rows:
+                    self._forget_id(row)
+
+        if os.path.exists(self._vectors_path):
+            self._matrix = np.load(self._vectors_path, mmap_mode="r+")
+            if self._matrix.shape[1] != self.dimension:
+                raise ValueError(
+                    f"Local index dimension {self._matrix.shape[1]} does not match {self.dimension}"
+                )
+            if self._matrix.shape[0] < self.count:
+                raise ValueError(f"Local index at {self.path} is missing vectors")
+        else:
+            self._replace_matrix(INITIAL_CAPACITY, None)
+
+        if self._ann is not None:
+            if self._ann.load(self.path, self.count):
+                # Rows appended after the snapshot was taken
+                self._update_ann(self._ann.trained_size, [])
+            else:
+                # No usable snapshot; build one if the store is large enough
+                self._update_ann(self.count, [])
+
+        print(f"✓ Local vector store loaded {self.get_document_count()} vectors from {self.path}")
@@ -0,0 +1,96 @@
+import time
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from ..core.config import settings
+from .lexical_index import tokenize
+
+SCORE_BATCH_SIZE = 8  # candidates tokenized between deadline checks
+
+
+class Reranker:
+    """CPU-only re-ranking of retrieved chunks before they reach the prompt.
+
+    Relevance blends the retrieval rank with how many of the query's terms a
+    chunk covers; selection then uses maximal marginal relevance (MMR) over
+    the chunks' term sets, so near-duplicate chunks (e.g. overlapping
+    windows) do not crowd out other evidence. Scoring runs in small batches
+    against `time_budget_ms`; candidates not scored in time keep their
+    retrieval rank only.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 3,
+        mmr_lambda: float = 0.7,
+        rank_weight: float = 0.5,
+        time_budget_ms: float = 30.0
+    ):
+        self.top_k = top_k
+        self.mmr_lambda = mmr_lambda
+        self.rank_weight = rank_weight
+        self.time_budget_ms = time_budget_ms
+
+    def rerank(self, query: str, results: Dict[str, Any], top_k: Optional[int] = None) -> Dict[str, Any]:
+        """Reorder and cut `results` (vector store query shape) to the best `top_k`"""
+        top_k = top_k or self.top_k
+        ids = results.get("ids", [[]])[0] if results.get("ids") else []
+        documents = results.get("documents", [[]])[0] if results.get("documents") else []
+        metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+        if len(ids) <= 1:
+            return results
+
+        order = self._select(query, documents, top_k)
+        return {
+            "ids": [[ids[i] for i in order]],
+            "documents": [[documents[i] for i in order]],
+            "metadatas": [[metadatas[i] for i in order]]
+        }
+
+    def _select(self, query: str, documents: List[str], top_k: int) -> List[int]:
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+        query_terms = frozenset(tokenize(query))
+        count = len(documents)
+
+        # Earlier retrieval ranks start with higher relevance
+        relevance = [(count - rank) / count for rank in range(count)]
+        term_sets: List[FrozenSet[str]] = [frozenset()] * count
+        for start in range(0, count, SCORE_BATCH_SIZE):
+            if time.perf_counter() > deadline:
+                print(f"⚠️ Rerank time budget exhausted after {start} of {count} candidates")
+                break
+            for i in range(start, min(start + SCORE_BATCH_SIZE, count)):
+                term_sets[i] = frozenset(tokenize(documents[i]))
+                coverage = len(query_terms & term_sets[i]) / len(query_terms) if query_terms else 0.0
+                relevance[i] = self.rank_weight * relevance[i] + (1 - self.rank_weight) * coverage
+
+        selected: List[int] = []
+        remaining = list(range(count))
+        while remaining and len(selected) < top_k:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i]
+                - (1 - self.mmr_lambda) * max((self._similarity(term_sets[i], term_sets[j]) for j in selected), default=0.0)
+            )
+            selected.append(best)
+            remaining.remove(best)
+        return selected
+
+    @staticmethod
+    def _similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
+
+
+_reranker_instance = None
+
+def get_reranker() -> Reranker:
+    """Get or create the Reranker instance (lazy initialization)"""
+    global _reranker_instance
+    if _reranker_instance is None:
+        _reranker_instance = Reranker(
+            top_k=settings.RERANK_TOP_K,
+            mmr_lambda=settings.RERANK_MMR_LAMBDA,
+            time_budget_ms=settings.RERANK_TIME_BUDGET_MS
+        )
+    return _reranker_instance
@@ -1,21 +1,120 @@
 import os
+import json
 import time
-from pinecone import Pinecone, ServerlessSpec
-from typing import List, Dict, Any, Optional
+import asyncio
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Callable
+
+from ..core.config import settings
 
 # Constants
 INDEX_NAME = "enterprise-rag"
 DIMENSION = 768  # Gemini Embedding (embedding-001) Output Dimension
+UPSERT_MAX_VECTORS = 1000  # Pinecone per-request vector limit
+PINECONE_API_VERSION = "2024-07"
+
+
+class BaseVectorStore(ABC):
+    """Interface shared by all vector store backends.
+
+    `query` returns results in the ChromaDB-style shape the pipeline expects:
+    {"ids": [[...]], "documents": [[...]], "metadatas": [[...]]}. Filters use
+    Pinecone's metadata filter syntax.
+    """
+
+    @abstractmethod
+    def add_documents(
+        self,
+        documents: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[Dict[str, Any]],
+        ids: List[str]
+    ) -> None:
+        ...
+
+    def add_records(
+        self,
+        records: Iterable[Dict[str, Any]],
+        on_upserted: Optional[Callable[[int], None]] = None,
+        batch_size: int = 100
+    ) -> int:
+        """Upsert a stream of {"id", "document", "embedding", "metadata"} records.
+
+        Records are consumed lazily in batches, so callers can pass a generator
+        that embeds chunks as it goes. Returns the number of records written.
+        """
+        written = 0
+        record_iter = iter(records)
+        while True:
+            batch = list(islice(record_iter, batch_size))
+            if not batch:
+                return written
+            self.add_documents(
+                documents=[record["document"] for record in batch],
+                embeddings=[record["embedding"] for record in batch],
+                metadatas=[record["metadata"] for record in batch],
+                ids=[record["id"] for record in batch]
+            )
+            written += len(batch)
+            if on_upserted:
+                on_upserted(len(batch))
+
+    @abstractmethod
+    def query(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        ...
+
+    async def aquery(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Async `query`; backends without a native async client run it in a thread"""
+        return await asyncio.to_thread(self.query, query_embedding, n_results, where)
+
+    async def aclose(self) -> None:
+        """Release async resources held by the backend"""
+
+    @abstractmethod
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return {id: {"values": [...], "metadata": {...}}} for the ids that exist.
+
+        The chunk text is included in the metadata under "text".
+        """
+        ...
+
+    @abstractmethod
+    def delete_by_document_id(self, document_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def get_document_count(self) -> int:
+        ...
+
+
+class VectorStore(BaseVectorStore):
+    """Pinecone-backed vector store"""
 
-class VectorStore:
     def __init__(self):
         api_key = os.getenv("PINECONE_API_KEY")
         if not api_key:
             print("⚠️ WARNING: PINECONE_API_KEY not found. Vector Store will fail.")
             return
 
+        from pinecone import Pinecone
         self.pc = Pinecone(api_key=api_key)
+        self._api_key = api_key
         self._index = None
+        self._host: Optional[str] = None
+        self._async_client = None
 
     @property
     def index(self):
@@ -32,25 +131,98 @@ class VectorStore:
         ids: List[str]
     ) -> None:
         """Upload vectors to Pinecone"""
-        # Prepare data in Pinecone format: (id, vector, metadata)
-        # Add 'text' to metadata since Pinecone doesn't store separate 'documents'
-        vectors = []
-        for i, doc_id in enumerate(ids):
+        self.add_records(
+            {"id": ids[i], "document": documents[i], "embedding": embeddings[i], "metadata": metadatas[i]}
+            for i in range(len(ids))
+        )
+
+    def add_records(
+        self,
+        records: Iterable[Dict[str, Any]],
+        on_upserted: Optional[Callable[[int], None]] = None,
+        batch_size: int = UPSERT_MAX_VECTORS
+    ) -> int:
+        """Pipelined upsert of a record stream.
+
+        Batches are cut by estimated payload bytes (and at most `batch_size`
+        vectors) and up to PINECONE_UPSERT_CONCURRENCY batches are in flight
+        while the next ones are still being produced. Each batch is retried
+        with exponential backoff; a batch that still fails aborts the upload
+        once in-flight batches have settled.
+        """
+        max_in_flight = max(1, settings.PINECONE_UPSERT_CONCURRENCY)
+        in_flight: deque = deque()
+        written = 0
+
+        def settle(future: Future) -> None:
+            nonlocal written
+            count = future.result()
+            written += count
+            if on_upserted:
+                on_upserted(count)
+
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="pinecone-upsert") as pool:
+            try:
+                for batch in self._iter_batches(records, batch_size):
+                    if len(in_flight) >= max_in_flight:
+                        settle(in_flight.popleft())
+                    in_flight.append(pool.submit(self._upsert_with_retry, batch))
+                while in_flight:
+                    settle(in_flight.popleft())
+            finally:
+                # On error, drop batches that have not started and let running ones settle
+                for future in in_flight:
+                    future.cancel()
+                wait(in_flight)
+        return written
+
+    def _iter_batches(
+        self,
+        records: Iterable[Dict[str, Any]],
+        batch_size: int
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Convert records to Pinecone vectors and group them by payload size"""
+        max_bytes = settings.PINECONE_UPSERT_MAX_BYTES
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for record in records:
             # Ensure metadata doesn't contain nulls
-            clean_meta = {k: v for k, v in metadatas[i].items() if v is not None}
-            clean_meta['text'] = documents[i]  # Store text content in metadata
-            
-            vectors.append({
-                "id": doc_id,
-                "values": embeddings[i],
+            clean_meta = {k: v for k, v in record["metadata"].items() if v is not None}
+            # Add 'text' to metadata since Pinecone doesn't store separate 'documents'
+            clean_meta['text'] = record["document"]
+            vector = {
+                "id": record["id"],
+                "values": record["embedding"],
                 "metadata": clean_meta
-            })
-            
-        # Upsert in batches of 100
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            self.index.upsert(vectors=batch)
+            }
+            # ~12 bytes per serialised float plus the JSON-encoded metadata
+            size = len(vector["values"]) * 12 + len(json.dumps(clean_meta)) + len(vector["id"]) + 64
+            if batch and (batch_bytes + size > max_bytes or len(batch) >= batch_size):
+                yield batch
+                batch = []
+                batch_bytes = 0
+            batch.append(vector)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def _upsert_with_retry(self, batch: List[Dict[str, Any]]) -> int:
+        max_retries = settings.PINECONE_UPSERT_MAX_RETRIES
+        for attempt in range(max_retries + 1):
+            try:
+                response = self.index.upsert(vectors=batch)
+                upserted = getattr(response, "upserted_count", None)
+                if upserted is not None and upserted < len(batch):
+                    # Upserts are idempotent, so the whole batch can be resent
+                    raise RuntimeError(f"Partial upsert: {upserted} of {len(batch)} vectors written")
+                return len(batch)
+            except Exception as e:
+                if attempt == max_retries:
+                    raise
+                delay = 2 ** attempt
+                print(f"⚠️ Pinecone upsert failed ({e}), retrying in {delay}s...")
+                time.sleep(delay)
+        return 0
 
     def query(
         self,
@@ -62,7 +234,7 @@ class VectorStore:
         try:
             if not hasattr(self, 'index') or self.index is None:
                 print("⚠️ Vector store index not initialized. Skipping query.")
-                return {"documents": [[]], "metadatas": [[]]}
+                return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
 
             # Pinecone filter format is simply the dict
             results = self.index.query(
@@ -75,23 +247,104 @@ class VectorStore:
             # Reformat to match original ChromaDB interface expected by pipeline
             # Chroma: {"documents": [[text1, text2]], "metadatas": [[meta1, meta2]]}
             
+            cleaned_ids = []
             cleaned_docs = []
             cleaned_metas = []
             
             for match in results['matches']:
                 meta = match['metadata']
                 text = meta.pop('text', "") # Extract text back out
+                cleaned_ids.append(match['id'])
                 cleaned_docs.append(text)
                 cleaned_metas.append(meta)
                 
             return {
+                "ids": [cleaned_ids],
                 "documents": [cleaned_docs],
                 "metadatas": [cleaned_metas]
             }
             
         except Exception as e:
             print(f"❌ Query Error: {e}")
-            return {"documents": [[]], "metadatas": [[]]}
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+
+    async def aquery(
+        self,
+        query_embedding: List[float],
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Query Pinecone's data plane over a pooled async HTTP connection.
+
+        pinecone-client 5 has no asyncio client, so this calls the REST query
+        endpoint directly; the result shape matches `query`.
+        """
+        if not hasattr(self, "pc"):
+            print("⚠️ Vector store index not initialized. Skipping query.")
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+
+        try:
+            if self._host is None:
+                # One-off control plane lookup, cached for the process lifetime
+                description = await asyncio.to_thread(self.pc.describe_index, INDEX_NAME)
+                self._host = description.host
+            if self._async_client is None:
+                import httpx
+                self._async_client = httpx.AsyncClient(
+                    base_url=f"https://{self._host}",
+                    headers={
+                        "Api-Key": self._api_key,
+                        "X-Pinecone-API-Version": PINECONE_API_VERSION
+                    },
+                    timeout=30.0
+                )
+
+            body: Dict[str, Any] = {
+                "vector": query_embedding,
+                "topK": n_results,
+                "includeMetadata": True
+            }
+            if where:
+                body["filter"] = where
+            response = await self._async_client.post("/query", json=body)
+            response.raise_for_status()
+
+            cleaned_ids = []
+            cleaned_docs = []
+            cleaned_metas = []
+            for match in response.json().get("matches", []):
+                meta = match.get("metadata") or {}
+                cleaned_docs.append(meta.pop("text", ""))
+                cleaned_ids.append(match["id"])
+                cleaned_metas.append(meta)
+
+            return {
+                "ids": [cleaned_ids],
+                "documents": [cleaned_docs],
+                "metadatas": [cleaned_metas]
+            }
+
+        except Exception as e:
+            print(f"❌ Query Error: {e}")
+            return {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+
+    async def aclose(self) -> None:
+        if getattr(self, "_async_client", None) is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def fetch(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch stored vectors by id, in batches of 100"""
+        found = {}
+        batch_size = 100
+        for i in range(0, len(ids), batch_size):
+            response = self.index.fetch(ids=ids[i:i + batch_size])
+            for vector_id, vector in response.vectors.items():
+                found[vector_id] = {
+                    "values": list(vector.values),
+                    "metadata": dict(vector.metadata or {})
+                }
+        return found
 
     def delete_by_document_id(self, document_id: int) -> None:
         # Pinecone delete by metadata filter
@@ -109,11 +362,25 @@ class VectorStore:
 
 _vector_store_instance = None
 
-def get_vector_store():
-    """Get or create the VectorStore instance (lazy initialization)"""
+def get_vector_store() -> BaseVectorStore:
+    """Get or create the configured vector store backend (lazy initialization)"""
     global _vector_store_instance
     if _vector_store_instance is None:
-        _vector_store_instance = VectorStore()
+        backend = settings.VECTOR_STORE_BACKEND.lower()
+        if backend == "local":
+            from .local_vector_store import LocalVectorStore
+            _vector_store_instance = LocalVectorStore(
+                path=settings.LOCAL_VECTOR_STORE_PATH,
+                dimension=DIMENSION,
+                index_type=settings.LOCAL_VECTOR_INDEX_TYPE.lower(),
+                nlist=settings.LOCAL_ANN_NLIST,
+                nprobe=settings.LOCAL_ANN_NPROBE,
+                ann_min_rows=settings.LOCAL_ANN_MIN_ROWS
+            )
+        elif backend == "pinecone":
+            _vector_store_instance = VectorStore()
+        else:
+            raise ValueError(f"Unsupported vector store backend: {settings.VECTOR_STORE_BACKEND}")
     return _vector_store_instance
 
 # For backward compatibility
@@ -1,2 +1,7 @@
 from .document_processor import document_processor, DocumentProcessor
 from .rag_pipeline import rag_pipeline, RAGPipeline
+from .ingestion import ingestion_queue, IngestionQueue
+from .message_writer import message_writer, ChatMessageWriter
+from .conversation import conversation_memory, ConversationMemory
+from .blob_store import get_blob_store, BaseBlobStore, LocalBlobStore
+from .profile_photos import profile_photos, ProfilePhotoService
@@ -0,0 +1,161 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+CacheKey = Tuple[str, FrozenSet[str], str]  # (normalized query, retrieved chunk ids, conversation digest)
+
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace/punctuation-insensitive form of a question"""
+    return re.sub(r"\s+", " ", query.lower()).strip().strip(".!?")
+
+
+def conversation_digest(chat_history: Optional[List[Dict[str, str]]]) -> str:
+    """Fingerprint of the history (summary and messages) that goes into the prompt; "" for none"""
+    if not chat_history:
+        return ""
+    payload = json.dumps([[message["role"], message["content"]] for message in chat_history])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    """LRU cache of generated answers for repeated questions.
+
+    An entry is keyed by the normalized question, the exact set of chunk ids
+    retrieved for it and a digest of the conversation in the prompt, so an
+    answer is only reused when it would have been generated from the same
+    context. With `similarity_threshold` > 0 a differently worded question
+    also hits if it retrieved the same chunks in the same conversation and
+    its query embedding is at least that cosine-similar. Entries are dropped
+    when any of their source documents is re-indexed or deleted.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: int = 3600, similarity_threshold: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._by_context: Dict[Tuple[FrozenSet[str], str], Set[CacheKey]] = {}
+        self._by_document: Dict[Any, Set[CacheKey]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(
+        self,
+        query: str,
+        chunk_ids: Iterable[str],
+        query_embedding: Optional[List[float]] = None,
+        conversation: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        key = (normalize_query(query), frozenset(chunk_ids), conversation)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None and self.similarity_threshold > 0 and query_embedding:
+                entry = self._similar_entry(key[1:], self._unit(query_embedding))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return {"response": entry["response"], "sources": entry["sources"]}
+
+    def put(
+        self,
+        query: str,
+        chunk_ids: Iterable[str],
+        query_embedding: Optional[List[float]],
+        response: str,
+        sources: List[Dict[str, Any]],
+        document_ids: Iterable[Any],
+        conversation: str = ""
+    ) -> None:
+        key = (normalize_query(query), frozenset(chunk_ids), conversation)
+        entry = {
+            "response": response,
+            "sources": sources,
+            "embedding": self._unit(query_embedding) if query_embedding else None,
+            "document_ids": set(document_ids),
+            "created_at": time.time()
+        }
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._by_context.setdefault(key[1:], set()).add(key)
+            for document_id in entry["document_ids"]:
+                self._by_document.setdefault(document_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_document(self, document_id: Any) -> None:
+        """Drop every answer that used a chunk of `document_id`"""
+        with self._lock:
+            for key in list(self._by_document.get(document_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_context.clear()
+            self._by_document.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # Internal helpers (callers must hold self._lock)
+
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+
+    def _live_entry(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self.ttl_seconds > 0 and time.time() - entry["created_at"] > self.ttl_seconds:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _similar_entry(
+        self,
+        context: Tuple[FrozenSet[str], str],
+        embedding: np.ndarray
+    ) -> Optional[Dict[str, Any]]:
+        best_key, best_score = None, self.similarity_threshold
+        for key in self._by_context.get(context, ()):
+            candidate = self._entries[key]["embedding"]
+            if candidate is None or candidate.shape != embedding.shape:
+                continue
+            score = float(candidate @ embedding)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return self._live_entry(best_key) if best_key is not None else None
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_context.get(key[1:])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_context[key[1:]]
+        for document_id in entry["document_ids"]:
+            keys = self._by_document.get(document_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[document_id]
@@ -0,0 +1,93 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from ..core.config import settings
+
+
+class BaseBlobStore(ABC):
+    """Interface for immutable binary objects addressed by key (e.g. "photos/<sha256>_256.jpg").
+
+    Callers derive keys from content hashes, so an existing key never needs
+    to be overwritten and `put` of an existing key is a no-op.
+    """
+
+    @abstractmethod
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        ...
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+
+class LocalBlobStore(BaseBlobStore):
+    """Blobs as files under `root`, fanned out by the first two characters of the name.
+
+    Stands in for object storage: keys map one-to-one onto object names, so a
+    bucket-backed store can replace it without changing callers.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, key: str, data: bytes, content_type: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial blob
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, key: str) -> str:
+        prefix, _, name = key.rpartition("/")
+        path = os.path.abspath(os.path.join(self.root, prefix, name[:2], name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return path
+
+
+# Lazy singleton
+_blob_store_instance = None
+
+
+def get_blob_store() -> BaseBlobStore:
+    """Get or create the blob store (lazy initialization)"""
+    global _blob_store_instance
+    if _blob_store_instance is None:
+        _blob_store_instance = LocalBlobStore(settings.BLOB_STORE_PATH)
+    return _blob_store_instance
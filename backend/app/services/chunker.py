@@ -0,0 +1,126 @@
+import hashlib
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import numpy as np
+
+SENTENCE_ENDINGS = ".?!"
+
+
+def hash_text(text: str) -> str:
+    """Stable content hash used to recognise identical chunks across documents"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TextChunk(NamedTuple):
+    text: str
+    start: int  # character offset of the chunk in the document
+    end: int
+    token_count: int
+
+
+class TextChunker:
+    """Split a stream of text segments into overlapping token windows.
+
+    Each segment is tokenized once and its token boundaries are mapped to
+    character offsets with a vectorised lookup of token byte lengths, so
+    chunks are cut by slicing the original text rather than decoding tokens
+    (overlapping tokens are never decoded twice). Chunk ends snap back to the
+    nearest heading, paragraph or sentence boundary in the last
+    `boundary_window` fraction of the chunk when one exists.
+    """
+
+    def __init__(self, tokenizer, chunk_size: int, chunk_overlap: int, boundary_window: float = 0.2):
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.tokenizer = tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # Never shrink a chunk so far that the next one would not advance
+        self.min_end = max(chunk_overlap + 1, int(chunk_size * (1 - boundary_window)))
+        self._token_lengths: Optional[np.ndarray] = None
+
+    @property
+    def token_lengths(self) -> np.ndarray:
+        """UTF-8 byte length of every token id, built once per tokenizer"""
+        if self._token_lengths is None:
+            lengths = np.zeros(self.tokenizer.n_vocab, dtype=np.int64)
+            for token in range(self.tokenizer.n_vocab):
+                try:
+                    lengths[token] = len(self.tokenizer.decode_single_token_bytes(token))
+                except KeyError:
+                    pass  # unused ids between the BPE ranks and special tokens
+            self._token_lengths = lengths
+        return self._token_lengths
+
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        buf = ""                                # pending text, starting at document offset buf_start
+        buf_start = 0
+        starts = np.empty(0, dtype=np.int64)    # document offset of each pending token
+        head = 0                                # index of the first token of the next chunk
+        emitted = False
+
+        for segment in segments:
+            if not segment:
+                continue
+            seg_start = buf_start + len(buf)
+            starts = np.concatenate([starts, seg_start + self._token_offsets(segment)])
+            buf += segment
+
+            while len(starts) - head >= self.chunk_size:
+                end = self._find_end(buf, buf_start, starts, head)
+                yield self._make_chunk(buf, buf_start, starts, head, end)
+                emitted = True
+                head = end - self.chunk_overlap
+
+            # Drop consumed text and offsets once they dominate the buffers,
+            # which keeps the total copying linear in the document size
+            if head > len(starts) // 2:
+                cut = int(starts[head]) - buf_start
+                buf = buf[cut:]
+                buf_start += cut
+                starts = starts[head:]
+                head = 0
+
+        # The final partial window, unless it is only the overlap of the last chunk
+        remaining = len(starts) - head
+        if remaining and (not emitted or remaining > self.chunk_overlap):
+            yield self._make_chunk(buf, buf_start, starts, head, len(starts))
+
+    def _token_offsets(self, segment: str) -> np.ndarray:
+        """Character offset within `segment` at which each token starts"""
+        tokens = np.asarray(self.tokenizer.encode(segment, disallowed_special=()), dtype=np.int64)
+        byte_lengths = self.token_lengths[tokens]
+        byte_starts = np.cumsum(byte_lengths) - byte_lengths
+        if segment.isascii():
+            return byte_starts
+        # Map byte offsets to character offsets; a token starting inside a
+        # multi-byte character maps to that character's start
+        raw = np.frombuffer(segment.encode("utf-8"), dtype=np.uint8)
+        char_index = np.cumsum((raw & 0xC0) != 0x80) - 1
+        return char_index[byte_starts]
+
+    def _find_end(self, buf: str, buf_start: int, starts: np.ndarray, head: int) -> int:
+        """Token index (exclusive) where the chunk starting at `head` should end"""
+        limit = head + self.chunk_size
+        best_sentence = None
+        for end in range(limit, head + self.min_end - 1, -1):
+            if end >= len(starts):
+                continue
+            pos = int(starts[end]) - buf_start
+            if pos <= 0:
+                continue
+            prev = buf[pos - 1]
+            nxt = buf[pos] if pos < len(buf) else ""
+            if buf[max(0, pos - 2):pos] == "\n\n" or buf.startswith("\n\n", pos) or (prev == "\n" and nxt == "#"):
+                return end  # paragraph break or markdown heading
+            if best_sentence is None and (
+                prev == "\n" or nxt == "\n" or (prev in SENTENCE_ENDINGS and nxt.isspace())
+            ):
+                best_sentence = end
+        return best_sentence if best_sentence is not None else limit
+
+    def _make_chunk(self, buf: str, buf_start: int, starts: np.ndarray, first: int, end: int) -> TextChunk:
+        start_char = int(starts[first])
+        end_char = int(starts[end]) if end < len(starts) else buf_start + len(buf)
+        text = buf[start_char - buf_start:end_char - buf_start]
+        return TextChunk(text=text, start=start_char, end=end_char, token_count=end - first)
@@ -0,0 +1,237 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+
+from ..core.config import settings
+from ..database.connection import AsyncSessionLocal
+from ..database.models import ChatMessage, ChatSession
+from .message_writer import message_writer
+from .rag_pipeline import rag_pipeline
+
+Turn = Tuple[str, str]  # (role, content)
+
+
+class _SessionHistory:
+    """Cached tail of one session: its summary and the messages not yet folded into it.
+
+    `complete` is true while `turns` holds every unsummarized message, i.e.
+    the ring buffer has not dropped any.
+    """
+
+    def __init__(self, summary: Optional[str], turns: List[Turn], maxlen: int, complete: bool = True):
+        self.summary = summary
+        self.turns: Deque[Turn] = deque(turns, maxlen=maxlen)
+        self.complete = complete
+        self.loaded_at = time.monotonic()
+
+
+class ConversationMemory:
+    """Bounded chat history for prompts, backed by a rolling summary per session.
+
+    Messages that have left the last `window` are folded into
+    `ChatSession.summary` by a background LLM call once `summary_batch` of
+    them have accumulated, so prompt size and history queries stay flat as a
+    conversation grows. Until they are folded they stay in the history, so
+    the prompt holds the summary plus every message after it (the window
+    plus up to `summary_batch - 1` pending ones, or at most
+    `summary_max_messages` more while summaries fail). The summary is
+    returned as a leading message with role "summary".
+
+    The tail of recently active sessions is kept in memory as a ring buffer,
+    appended to as turns are handed to the message writer, so a turn
+    normally needs no history query at all; a summary update drops the
+    folded messages from its front. On a miss the session's pending writes
+    are awaited and the tail is read with one keyset query on message id.
+    The cache is per process: `ttl_seconds` bounds how stale it can get when
+    other workers write to the same session.
+    """
+
+    def __init__(
+        self,
+        window: int = 6,
+        summary_batch: int = 4,
+        summary_max_messages: int = 20,
+        cache_sessions: int = 1000,
+        ttl_seconds: int = 300
+    ):
+        self.window = window
+        self.summary_batch = summary_batch
+        self.summary_max_messages = summary_max_messages
+        self.cache_sessions = cache_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_history = window + summary_max_messages
+        self._sessions: "OrderedDict[int, _SessionHistory]" = OrderedDict()
+        self._lock = threading.Lock()  # sync endpoints call forget() from the threadpool
+        self._summarizing: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.hits = 0
+        self.misses = 0
+
+    async def aload_history(self, session_id: int) -> List[Dict[str, str]]:
+        """Summary plus the session's messages that are not folded into it yet.
+
+        Uses its own DB session so it can run concurrently with retrieval.
+        """
+        entry = self._cached(session_id)
+        if entry is None:
+            self.misses += 1
+            entry = await self._aload(session_id)
+        else:
+            self.hits += 1
+
+        history = [{"role": role, "content": content} for role, content in entry.turns]
+        if entry.summary:
+            history.insert(0, {"role": "summary", "content": entry.summary})
+        return history
+
+    def start_session(self, session_id: int) -> None:
+        """Cache a session that was just created, so its first turns never hit the DB"""
+        self._store(session_id, _SessionHistory(None, [], self.max_history))
+
+    def record(self, session_id: int, messages: List[Turn]) -> None:
+        """Append a turn's (role, content) messages to the session's cached tail, if it is cached"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                if len(entry.turns) + len(messages) > self.max_history:
+                    entry.complete = False
+                entry.turns.extend(messages)
+
+    def forget(self, session_id: int) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "hits": self.hits, "misses": self.misses}
+
+    def _cached(self, session_id: int) -> Optional[_SessionHistory]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            return entry
+
+    def _store(self, session_id: int, entry: _SessionHistory, replace: bool = True) -> None:
+        with self._lock:
+            if not replace and session_id in self._sessions:
+                return
+            self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.cache_sessions:
+                self._sessions.popitem(last=False)
+
+    async def _aload(self, session_id: int) -> _SessionHistory:
+        """Read a session's summary and tail from the DB"""
+        submitted = message_writer.submitted
+        await message_writer.wait_for_session(session_id)
+        async with AsyncSessionLocal() as db:
+            session = (await db.execute(
+                select(ChatSession.summary, ChatSession.summary_until).where(ChatSession.id == session_id)
+            )).first()
+            summary, summary_until = session if session is not None else (None, None)
+            # Keyset read: newest first, stopping at the summary
+            conditions = [ChatMessage.session_id == session_id]
+            if summary_until is not None:
+                conditions.append(ChatMessage.id > summary_until)
+            rows = (await db.execute(
+                select(ChatMessage.role, ChatMessage.content).where(*conditions).order_by(
+                    ChatMessage.created_at.desc(), ChatMessage.id.desc()
+                ).limit(self.max_history)
+            )).all()
+
+        entry = _SessionHistory(
+            summary,
+            [tuple(row) for row in reversed(rows)],
+            self.max_history,
+            complete=len(rows) < self.max_history
+        )
+        # A turn submitted while we were reading may be missing from `rows`;
+        # use the entry for this request but don't cache it
+        if message_writer.submitted == submitted:
+            # An entry cached meanwhile (a new session) is at least as fresh; keep it
+            self._store(session_id, entry, replace=False)
+        return entry
+
+    def schedule_summary(self, session_id: int) -> None:
+        """Update the session summary in the background, after the response is sent"""
+        if session_id in self._summarizing:
+            return
+        self._summarizing.add(session_id)
+        task = asyncio.create_task(self.aupdate_summary(session_id))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._summarizing.discard(session_id))
+
+    async def aupdate_summary(self, session_id: int) -> None:
+        """Fold messages that have left the history window into the summary"""
+        try:
+            async with AsyncSessionLocal() as db:
+                session = await db.get(ChatSession, session_id)
+                if session is None:
+                    return
+                conditions = [ChatMessage.session_id == session_id]
+                if session.summary_until is not None:
+                    conditions.append(ChatMessage.id > session.summary_until)
+                # Oldest unsummarized messages first. If the limit is reached, the
+                # first summary_max_messages rows are still outside the window
+                rows = (await db.execute(
+                    select(ChatMessage.id, ChatMessage.role, ChatMessage.content).where(*conditions).order_by(
+                        ChatMessage.created_at, ChatMessage.id
+                    ).limit(self.summary_max_messages + self.window)
+                )).all()
+                older = rows[:-self.window] if self.window else rows
+                if len(older) < self.summary_batch:
+                    return
+
+                summary = await rag_pipeline.llm.asummarize(
+                    session.summary,
+                    [{"role": role, "content": content} for _, role, content in older]
+                )
+                if summary is None:
+                    return
+                # Folding is not activity: keep the session's place in the list
+                await db.execute(
+                    update(ChatSession).where(ChatSession.id == session_id).values(
+                        summary=summary,
+                        summary_until=older[-1].id,
+                        updated_at=ChatSession.updated_at
+                    )
+                )
+                await db.commit()
+                self._update_summary(session_id, summary, len(older))
+                print(f"🧠 Folded {len(older)} messages into the summary of chat session {session_id}")
+        except Exception as e:
+            print(f"⚠️ Could not update summary of chat session {session_id}: {e}")
+
+    def _update_summary(self, session_id: int, summary: str, folded: int) -> None:
+        """Swap in the new summary and drop the `folded` oldest messages from the cached tail"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            if not entry.complete:
+                # The buffer has dropped messages, so which ones were folded is unknown; re-read it
+                del self._sessions[session_id]
+                return
+            entry.summary = summary
+            for _ in range(min(folded, len(entry.turns))):
+                entry.turns.popleft()
+
+conversation_memory = ConversationMemory(
+    window=settings.CHAT_HISTORY_WINDOW,
+    summary_batch=settings.CHAT_SUMMARY_BATCH,
+    summary_max_messages=settings.CHAT_SUMMARY_MAX_MESSAGES,
+    cache_sessions=settings.CHAT_HISTORY_CACHE_SESSIONS,
+    ttl_seconds=settings.CHAT_HISTORY_CACHE_TTL_SECONDS
+)
@@ -1,11 +1,21 @@
 import os
 import hashlib
-from typing import List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
 from pypdf import PdfReader
 from docx import Document as DocxDocument
 import tiktoken
 
 from ..core.config import settings
+from .chunker import TextChunk, TextChunker
+
+TXT_READ_SIZE = 1024 * 1024
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[str]:
+    """Extract text for pages [start, end); runs inside a worker process"""
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() + "\n" for i in range(start, end)]
 
 
 class DocumentProcessor:
@@ -13,59 +23,83 @@ class DocumentProcessor:
         self.chunk_size = settings.CHUNK_SIZE
         self.chunk_overlap = settings.CHUNK_OVERLAP
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
+        self.chunker = TextChunker(self.tokenizer, self.chunk_size, self.chunk_overlap)
+        self._pdf_pool: Optional[ProcessPoolExecutor] = None
+    
+    @property
+    def pdf_pool(self) -> ProcessPoolExecutor:
+        if self._pdf_pool is None:
+            self._pdf_pool = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACT_WORKERS or None)
+        return self._pdf_pool
     
     def extract_text(self, file_path: str, file_type: str) -> str:
+        return "".join(self.iter_segments(file_path, file_type))
+    
+    def iter_segments(self, file_path: str, file_type: str) -> Iterator[str]:
+        """Yield the document text as page/paragraph segments in order"""
         if file_type == "pdf":
-            return self._extract_pdf(file_path)
+            return self._iter_pdf(file_path)
         elif file_type == "docx":
-            return self._extract_docx(file_path)
+            return self._iter_docx(file_path)
         elif file_type == "txt":
-            return self._extract_txt(file_path)
+            return self._iter_txt(file_path)
         else:
             raise ValueError(f"Unsupported file type: {file_type}")
     
-    def _extract_pdf(self, file_path: str) -> str:
+    def _iter_pdf(self, file_path: str) -> Iterator[str]:
         reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
+        page_count = len(reader.pages)
+        if page_count < settings.PDF_PARALLEL_MIN_PAGES:
+            for page in reader.pages:
+                yield page.extract_text() + "\n"
+            return
+        
+        # Large PDFs: extract page ranges in worker processes, yielded in order
+        del reader
+        batch = settings.PDF_PAGES_PER_TASK
+        ranges = [(start, min(start + batch, page_count)) for start in range(0, page_count, batch)]
+        results = self.pdf_pool.map(
+            _extract_pdf_pages,
+            [file_path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges]
+        )
+        for pages in results:
+            yield from pages
     
-    def _extract_docx(self, file_path: str) -> str:
+    def _iter_docx(self, file_path: str) -> Iterator[str]:
         doc = DocxDocument(file_path)
-        text = ""
         for para in doc.paragraphs:
-            text += para.text + "\n"
-        return text
+            yield para.text + "\n"
     
-    def _extract_txt(self, file_path: str) -> str:
+    def _iter_txt(self, file_path: str) -> Iterator[str]:
         with open(file_path, "r", encoding="utf-8") as f:
-            return f.read()
+            for block in iter(lambda: f.read(TXT_READ_SIZE), ""):
+                yield block
     
     def chunk_text(self, text: str) -> List[str]:
-        tokens = self.tokenizer.encode(text)
-        chunks = []
-        
-        start = 0
-        while start < len(tokens):
-            end = start + self.chunk_size
-            chunk_tokens = tokens[start:end]
-            chunk_text = self.tokenizer.decode(chunk_tokens)
-            chunks.append(chunk_text)
-            start = end - self.chunk_overlap
-        
-        return chunks
+        return [chunk.text for chunk in self.iter_chunks([text])]
+    
+    def iter_chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        """Chunk a stream of text segments in a single linear pass.
+
+        Only the text of the chunk currently being filled is held in memory,
+        so the first chunks are available while later pages are still parsed.
+        """
+        return self.chunker.iter_chunks(segments)
+    
+    def iter_document_chunks(self, file_path: str, file_type: str) -> Iterator[TextChunk]:
+        return self.iter_chunks(self.iter_segments(file_path, file_type))
     
     def get_file_hash(self, file_path: str) -> str:
         hasher = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(settings.UPLOAD_BUFFER_SIZE), b""):
                 hasher.update(chunk)
         return hasher.hexdigest()
     
     def process_document(self, file_path: str, file_type: str) -> Tuple[List[str], str]:
-        text = self.extract_text(file_path, file_type)
-        chunks = self.chunk_text(text)
+        chunks = [chunk.text for chunk in self.iter_document_chunks(file_path, file_type)]
         content_hash = self.get_file_hash(file_path)
         return chunks, content_hash
 
@@ -0,0 +1,277 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..database.connection import SessionLocal
+from ..database.models import Document, DocumentChunk
+from .chunker import hash_text
+from .document_processor import document_processor
+from .rag_pipeline import rag_pipeline
+
+
+class IngestionQueue:
+    """Runs document parsing, embedding and indexing on a background worker pool.
+
+    Progress for in-flight and recently finished documents is kept in memory
+    and exposed through `get_progress`; the `Document` row remains the durable
+    record of the final status. Because chunks are streamed, `chunks_total`
+    grows as extraction proceeds and is final once the stage is "processed".
+
+    Uploads are deduplicated by content hash: a byte-identical file copies the
+    vectors of the existing document, and for revised files only chunks whose
+    text hash has not been indexed before are sent to the embedding API.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._progress: Dict[int, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="ingestion"
+            )
+        return self._executor
+
+    def submit(
+        self,
+        document_id: int,
+        file_path: str,
+        file_type: str,
+        filename: str,
+        user_id: int,
+        content_hash: Optional[str] = None
+    ) -> None:
+        """Queue a document that has already been saved with status "processing".
+
+        Pass `content_hash` when the file was hashed while it was saved, so it
+        is not read an extra time.
+        """
+        self._set_progress(
+            document_id,
+            stage="queued",
+            chunks_total=0,
+            chunks_embedded=0,
+            chunks_indexed=0,
+            error=None
+        )
+        self.executor.submit(self._run, document_id, file_path, file_type, filename, user_id, content_hash)
+
+    def get_progress(self, document_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            progress = self._progress.get(document_id)
+            return dict(progress) if progress is not None else None
+
+    def forget(self, document_id: int) -> None:
+        with self._lock:
+            self._progress.pop(document_id, None)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def recover(self, upload_dir: str) -> None:
+        """Re-queue documents left "processing" by a previous run.
+
+        Shutdown drops queued jobs, so at startup such rows would otherwise
+        never finish. Any partial index is removed first; documents whose
+        upload is gone are marked failed.
+        """
+        with SessionLocal() as db:
+            documents = db.query(Document).filter(Document.status == "processing").all()
+            requeue = []
+            for document in documents:
+                file_path = os.path.join(upload_dir, document.filename)
+                if os.path.exists(file_path):
+                    requeue.append(dict(
+                        document_id=document.id,
+                        file_path=file_path,
+                        file_type=document.file_type,
+                        filename=document.original_filename,
+                        user_id=document.owner_id,
+                        content_hash=document.content_hash
+                    ))
+                else:
+                    document.status = "failed"
+            db.commit()
+
+        for job in requeue:
+            rag_pipeline.delete_document(job["document_id"])
+            self.submit(**job)
+        if documents:
+            failed = len(documents) - len(requeue)
+            print(f"✓ Re-queued {len(requeue)} interrupted documents"
+                  + (f"; {failed} without an upload marked failed" if failed else ""))
+
+    def _set_progress(self, document_id: int, **fields: Any) -> None:
+        with self._lock:
+            self._progress.setdefault(document_id, {}).update(fields)
+
+    def _run(
+        self,
+        document_id: int,
+        file_path: str,
+        file_type: str,
+        filename: str,
+        user_id: int,
+        content_hash: Optional[str] = None
+    ) -> None:
+        # Sessions are opened per step so no connection is held while the
+        # document is parsed and embedded
+        try:
+            content_hash = content_hash or document_processor.get_file_hash(file_path)
+            chunk_hashes: List[str] = []
+            chunk_rows: List[Dict[str, Any]] = []
+
+            with SessionLocal() as db:
+                duplicate = db.query(Document.id, Document.chunk_count).filter(
+                    Document.content_hash == content_hash,
+                    Document.status == "processed",
+                    Document.id != document_id
+                ).first()
+
+            chunk_count = None
+            if duplicate is not None:
+                chunk_count = self._link_duplicate(duplicate.id, duplicate.chunk_count, document_id, filename, user_id)
+                if chunk_count is not None:
+                    with SessionLocal() as db:
+                        chunk_rows = [
+                            {"document_id": document_id, "chunk_index": chunk_index, "content_hash": chunk_hash}
+                            for chunk_index, chunk_hash in db.query(
+                                DocumentChunk.chunk_index, DocumentChunk.content_hash
+                            ).filter(DocumentChunk.document_id == duplicate.id)
+                        ]
+
+            if chunk_count is None:
+                self._set_progress(document_id, stage="indexing")
+                # Extraction, chunking and embedding are streamed: the first chunks
+                # are indexed while later pages are still being parsed
+                chunks = document_processor.iter_document_chunks(file_path, file_type)
+
+                def on_progress(embedded: int, indexed: int) -> None:
+                    self._set_progress(
+                        document_id,
+                        chunks_total=embedded,
+                        chunks_embedded=embedded,
+                        chunks_indexed=indexed
+                    )
+
+                def find_existing(texts: List[str]) -> Dict[int, str]:
+                    # Also records the hashes so they can be stored once indexing succeeds
+                    hashes = [hash_text(text) for text in texts]
+                    chunk_hashes.extend(hashes)
+                    with SessionLocal() as db:
+                        return self._find_existing_chunks(db, document_id, hashes)
+
+                chunk_count = rag_pipeline.index_document(
+                    document_id=document_id,
+                    chunks=chunks,
+                    filename=filename,
+                    user_id=user_id,
+                    on_progress=on_progress,
+                    find_existing=find_existing
+                )
+                chunk_rows = [
+                    {"document_id": document_id, "chunk_index": i, "content_hash": chunk_hash}
+                    for i, chunk_hash in enumerate(chunk_hashes)
+                ]
+
+            with SessionLocal() as db:
+                document = db.query(Document).filter(Document.id == document_id).first()
+                if document is None:
+                    # Deleted while it was being processed
+                    rag_pipeline.delete_document(document_id)
+                    self.forget(document_id)
+                    return
+                db.bulk_insert_mappings(DocumentChunk, chunk_rows)
+                document.content_hash = content_hash
+                document.chunk_count = chunk_count
+                document.status = "processed"
+                db.commit()
+            self._set_progress(document_id, stage="processed")
+            print(f"✓ Indexed document {document_id} ({chunk_count} chunks)")
+
+        except Exception as e:
+            print(f"❌ Error processing document {document_id}: {e}")
+            # Drop whatever was indexed before the failure so searches don't
+            # return chunks of a document that is marked failed
+            rag_pipeline.delete_document(document_id)
+            self._mark_failed(document_id)
+            self._set_progress(document_id, stage="failed", error=str(e))
+
+    def _mark_failed(self, document_id: int) -> None:
+        try:
+            with SessionLocal() as db:
+                db.query(Document).filter(Document.id == document_id).update(
+                    {"status": "failed"}, synchronize_session=False
+                )
+                db.commit()
+        except Exception as e:
+            print(f"❌ Could not mark document {document_id} as failed: {e}")
+
+    def _link_duplicate(
+        self,
+        source_document_id: int,
+        source_chunk_count: int,
+        document_id: int,
+        filename: str,
+        user_id: int
+    ) -> Optional[int]:
+        """Index a byte-identical upload from an existing document's vectors.
+
+        Returns the chunk count, or None if the source vectors are unavailable
+        and the document must be processed normally.
+        """
+        self._set_progress(document_id, stage="linking", chunks_total=source_chunk_count)
+        try:
+            chunk_count = rag_pipeline.copy_document(
+                source_document_id=source_document_id,
+                document_id=document_id,
+                chunk_count=source_chunk_count,
+                filename=filename,
+                user_id=user_id
+            )
+        except LookupError as e:
+            print(f"⚠️ Could not reuse document {source_document_id}: {e}")
+            return None
+
+        self._set_progress(
+            document_id,
+            chunks_embedded=chunk_count,
+            chunks_indexed=chunk_count
+        )
+        print(f"♻️ Document {document_id} is identical to document {source_document_id}; reused its vectors")
+        return chunk_count
+
+    def _find_existing_chunks(self, db: Session, document_id: int, hashes: List[str]) -> Dict[int, str]:
+        """Map window positions to vector ids of processed chunks with the same hash"""
+        rows = db.query(
+            DocumentChunk.content_hash,
+            DocumentChunk.document_id,
+            DocumentChunk.chunk_index
+        ).join(Document, Document.id == DocumentChunk.document_id).filter(
+            DocumentChunk.content_hash.in_(set(hashes)),
+            Document.status == "processed",
+            DocumentChunk.document_id != document_id
+        ).all()
+        sources = {
+            chunk_hash: rag_pipeline.chunk_id(source_document_id, chunk_index)
+            for chunk_hash, source_document_id, chunk_index in rows
+        }
+        return {
+            position: sources[chunk_hash]
+            for position, chunk_hash in enumerate(hashes)
+            if chunk_hash in sources
+        }
+
+
+ingestion_queue = IngestionQueue(max_workers=settings.INGESTION_WORKERS)
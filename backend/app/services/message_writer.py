@@ -0,0 +1,162 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, insert, update
+
+from ..core.config import settings
+from ..database.connection import AsyncSessionLocal
+from ..database.models import ChatMessage, ChatSession
+
+Turn = Tuple[List[Dict[str, Any]], asyncio.Future]  # (message rows, commit future)
+
+
+class ChatMessageWriter:
+    """Write-behind persistence for chat messages.
+
+    Chat endpoints hand over a whole turn (question and answer) with
+    `submit` instead of committing each message themselves. A background
+    task collects turns from all requests for up to `flush_interval_ms` (or
+    until `batch_size` turns are waiting) and writes them with one bulk
+    INSERT in one transaction, so a turn is stored completely or not at all.
+    The same transaction bumps the sessions' `updated_at` (last activity).
+    The future returned by `submit` resolves once the turn is committed;
+    callers that need read-your-writes await it. A failed batch is retried
+    turn by turn, so one bad turn (e.g. for a session deleted meanwhile)
+    cannot take the others down with it.
+    """
+
+    def __init__(self, batch_size: int = 100, flush_interval_ms: float = 20.0, max_retries: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self._queue: List[Turn] = []
+        self._pending: Dict[int, List[asyncio.Future]] = {}
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.submitted = 0  # turns ever submitted; lets readers detect concurrent writes
+        self.flushes = 0
+
+    def submit(
+        self,
+        session_id: int,
+        messages: List[Tuple[str, str]],
+        asked_at: Optional[datetime] = None
+    ) -> asyncio.Future:
+        """Queue (role, content) messages of one turn; resolves when they are committed.
+
+        The first message is stamped `asked_at` (when the request arrived),
+        the others with the time of submission.
+        """
+        self._ensure_started()
+        now = datetime.utcnow()
+        rows = [
+            {
+                "session_id": session_id,
+                "role": role,
+                "content": content,
+                "created_at": asked_at if i == 0 and asked_at is not None else now
+            }
+            for i, (role, content) in enumerate(messages)
+        ]
+        committed = asyncio.get_running_loop().create_future()
+        self._queue.append((rows, committed))
+        self._pending.setdefault(session_id, []).append(committed)
+        committed.add_done_callback(lambda _: self._settled(session_id, committed))
+        self.submitted += 1
+        self._wake.set()
+        return committed
+
+    async def wait_for_session(self, session_id: int) -> None:
+        """Wait until every turn submitted so far for `session_id` is written (or has failed)"""
+        pending = list(self._pending.get(session_id, ()))
+        if pending:
+            await asyncio.wait(pending)
+
+    async def shutdown(self) -> None:
+        """Write everything still queued and stop the background task"""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        self._closing = False
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def _settled(self, session_id: int, committed: asyncio.Future) -> None:
+        pending = self._pending.get(session_id)
+        if pending is not None:
+            pending.remove(committed)
+            if not pending:
+                del self._pending[session_id]
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self._queue and not self._closing and len(self._queue) < self.batch_size:
+                # Let concurrent requests join the batch (group commit)
+                await asyncio.sleep(self.flush_interval)
+            # Turns submitted while a batch is being written form the next one
+            while self._queue:
+                batch, self._queue = self._queue[:self.batch_size], self._queue[self.batch_size:]
+                await self._write(batch)
+            if self._closing:
+                return
+
+    async def _write(self, batch: List[Turn]) -> None:
+        try:
+            await self._insert([row for rows, _ in batch for row in rows])
+        except Exception as e:
+            print(f"⚠️ Chat message batch of {len(batch)} turns failed ({e}); retrying turn by turn")
+            for rows, committed in batch:
+                await self._write_turn(rows, committed)
+            return
+        self.flushes += 1
+        for _, committed in batch:
+            if not committed.done():
+                committed.set_result(None)
+
+    async def _write_turn(self, rows: List[Dict[str, Any]], committed: asyncio.Future) -> None:
+        # At least one attempt, even with max_retries=0
+        for attempt in range(max(1, self.max_retries)):
+            try:
+                await self._insert(rows)
+                if not committed.done():
+                    committed.set_result(None)
+                return
+            except Exception as e:
+                error = e
+                await asyncio.sleep(0.1 * 2 ** attempt)
+        print(f"❌ Could not save chat turn for session {rows[0]['session_id']}: {error}")
+        if not committed.done():
+            committed.set_exception(error)
+
+    @staticmethod
+    async def _insert(rows: List[Dict[str, Any]]) -> None:
+        # Each session's last activity is its own newest message in the batch
+        last_activity: Dict[int, datetime] = {}
+        for row in rows:
+            session_id = row["session_id"]
+            last_activity[session_id] = max(last_activity.get(session_id, row["created_at"]), row["created_at"])
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(ChatMessage), rows)
+            await db.execute(
+                update(ChatSession).where(
+                    ChatSession.id.in_(sorted(last_activity))
+                ).values(updated_at=case(last_activity, value=ChatSession.id))
+            )
+            await db.commit()
+
+
+message_writer = ChatMessageWriter(
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    flush_interval_ms=settings.CHAT_WRITE_FLUSH_MS,
+    max_retries=settings.CHAT_WRITE_MAX_RETRIES
+)
@@ -0,0 +1,154 @@
+import base64
+import binascii
+import hashlib
+import io
+import re
+from typing import Dict, Optional
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from ..core.config import settings
+from .blob_store import get_blob_store
+
+PHOTO_ID_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+DATA_URL_PATTERN = re.compile(r"^data:image/[\w.+-]+;base64,", re.IGNORECASE)
+JPEG_QUALITY = 85
+
+
+class InvalidPhotoError(ValueError):
+    """The uploaded data is not a usable image"""
+
+
+class ProfilePhotoService:
+    """Profile photos as content-addressed blobs instead of base64 in the users table.
+
+    An upload is center-cropped to a square, resized to a `size` and a
+    `thumb_size` JPEG and written to the blob store under the SHA-256 of the
+    uploaded bytes, which is all the user row keeps. Because a photo id never
+    changes content, photos are served with a strong ETag and a year-long
+    immutable Cache-Control, and re-uploading the same image costs nothing.
+    Photo URLs are unauthenticated (images are loaded by <img> tags); the
+    hash makes them unguessable.
+
+    Blobs are not deleted when a user replaces or removes a photo: identical
+    uploads share one photo id, and a "no one else uses it" check before the
+    delete would race with a concurrent upload of the same image. An
+    orphaned photo costs a few KB.
+    """
+
+    def __init__(
+        self,
+        size: int = 256,
+        thumb_size: int = 64,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_pixels: int = 40_000_000,
+        public_url: str = ""
+    ):
+        self.sizes: Dict[str, int] = {"full": size, "thumb": thumb_size}
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.base_url = f"{public_url.rstrip('/')}{settings.API_V1_STR}/users/photos"
+
+    @property
+    def blob_store(self):
+        return get_blob_store()
+
+    def store(self, data: bytes) -> str:
+        """Resize and store an uploaded image; returns its photo id"""
+        if len(data) > self.max_bytes:
+            raise InvalidPhotoError(f"Image must be less than {self.max_bytes // (1024 * 1024)}MB")
+        photo_id = hashlib.sha256(data).hexdigest()
+        if all(self.blob_store.exists(self._key(photo_id, variant)) for variant in self.sizes):
+            return photo_id
+
+        image = self._open(data)
+        # Largest variant first; each smaller one is resized from the previous
+        for variant, size in sorted(self.sizes.items(), key=lambda item: -item[1]):
+            image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+            self.blob_store.put(self._key(photo_id, variant), buffer.getvalue(), "image/jpeg")
+        return photo_id
+
+    def store_data_url(self, value: str) -> str:
+        """Store a photo sent as a data URL (or bare base64), as the profile form does"""
+        encoded = DATA_URL_PATTERN.sub("", value.strip(), count=1)
+        if len(encoded) > self.max_bytes * 4 // 3 + 4:
+            raise InvalidPhotoError(f"Image must be less than {self.max_bytes // (1024 * 1024)}MB")
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise InvalidPhotoError("Profile photo must be a base64 encoded image")
+        return self.store(data)
+
+    def is_valid(self, photo_id: str, variant: str = "full") -> bool:
+        return bool(PHOTO_ID_PATTERN.match(photo_id)) and variant in self.sizes
+
+    def read(self, photo_id: str, variant: str = "full") -> Optional[bytes]:
+        if not self.is_valid(photo_id, variant):
+            return None
+        return self.blob_store.get(self._key(photo_id, variant))
+
+    def url(self, photo_id: Optional[str], variant: str = "full") -> Optional[str]:
+        if not photo_id:
+            return None
+        return f"{self.base_url}/{photo_id}" + ("" if variant == "full" else f"?size={variant}")
+
+    def is_photo_url(self, value: str) -> bool:
+        """True for URLs this service hands out, which clients echo back unchanged on profile saves"""
+        return value.split("?", 1)[0].rsplit("/", 1)[0].endswith(f"{settings.API_V1_STR}/users/photos")
+
+    def migrate_inline_photos(self, engine: Engine) -> None:
+        """Move base64 photos left in the legacy users.profile_photo column into the blob store"""
+        if "profile_photo" not in {column["name"] for column in inspect(engine).get_columns("users")}:
+            return
+        with engine.begin() as conn:
+            rows = conn.execute(text(
+                "SELECT id, profile_photo FROM users WHERE profile_photo IS NOT NULL AND profile_photo <> ''"
+            )).fetchall()
+            moved = 0
+            for user_id, value in rows:
+                try:
+                    photo_id = self.store_data_url(value)
+                except InvalidPhotoError as e:
+                    print(f"⚠️ Dropping unreadable profile photo of user {user_id}: {e}")
+                    photo_id = None
+                conn.execute(
+                    text("UPDATE users SET profile_photo_id = :photo_id, profile_photo = NULL WHERE id = :id"),
+                    {"photo_id": photo_id, "id": user_id}
+                )
+                moved += photo_id is not None
+            if rows:
+                print(f"✓ Moved {moved} profile photos out of the users table")
+
+    def _open(self, data: bytes) -> Image.Image:
+        try:
+            image = Image.open(io.BytesIO(data))
+            if image.width * image.height > self.max_pixels:
+                raise InvalidPhotoError("Image dimensions are too large")
+            # JPEGs can be decoded at a fraction of their size, which is much cheaper than a full decode
+            image.draft("RGB", (self.sizes["full"] * 2, self.sizes["full"] * 2))
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, (255, 255, 255))
+                background.paste(image, mask=image.getchannel("A"))
+                return background
+            return image.convert("RGB")
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            raise InvalidPhotoError("File is not a supported image")
+
+    @staticmethod
+    def _key(photo_id: str, variant: str) -> str:
+        return f"profile_photos/{photo_id}_{variant}.jpg"
+
+
+profile_photos = ProfilePhotoService(
+    size=settings.PROFILE_PHOTO_SIZE,
+    thumb_size=settings.PROFILE_PHOTO_THUMB_SIZE,
+    max_bytes=settings.PROFILE_PHOTO_MAX_BYTES,
+    max_pixels=settings.PROFILE_PHOTO_MAX_PIXELS,
+    public_url=settings.PUBLIC_API_URL
+)
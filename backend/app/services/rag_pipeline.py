@@ -1,8 +1,19 @@
-from typing import List, Dict, Any, Optional, Generator
+import asyncio
+import time
+from collections import deque
+from itertools import islice
+from typing import (
+    List, Dict, Any, Optional, Generator, AsyncGenerator, Awaitable, Callable, Deque, Iterable, Iterator, Tuple, Union
+)
 
+from ..core.config import settings
 from ..rag.embeddings import get_embeddings_generator
 from ..rag.vector_store import get_vector_store
-from ..rag.llm import get_llm_handler
+from ..rag.lexical_index import get_lexical_index
+from ..rag.reranker import get_reranker
+from ..rag.llm import get_llm_handler, ERROR_RESPONSES, PROCESSING_ERROR
+from .answer_cache import AnswerCache, conversation_digest
+from .chunker import TextChunk
 
 
 class RAGPipeline:
@@ -11,6 +22,13 @@ class RAGPipeline:
         self._embeddings = None
         self._vector_store = None
         self._llm = None
+        self._lexical_index = None
+        self._reranker = None
+        self.answer_cache = AnswerCache(
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        ) if settings.ANSWER_CACHE_ENABLED else None
     
     @property
     def embeddings(self):
@@ -24,41 +42,274 @@ class RAGPipeline:
             self._vector_store = get_vector_store()
         return self._vector_store
     
+    @property
+    def lexical_index(self):
+        if self._lexical_index is None and settings.HYBRID_SEARCH_ENABLED:
+            self._lexical_index = get_lexical_index()
+        return self._lexical_index
+    
+    @property
+    def reranker(self):
+        if self._reranker is None and settings.RERANK_ENABLED:
+            self._reranker = get_reranker()
+        return self._reranker
+    
     @property
     def llm(self):
         if self._llm is None:
             self._llm = get_llm_handler()
         return self._llm
     
+    @staticmethod
+    def chunk_id(document_id: int, chunk_index: int) -> str:
+        return f"doc_{document_id}_chunk_{chunk_index}"
+    
     def index_document(
         self,
         document_id: int,
-        chunks: List[str],
+        chunks: Iterable[Union[str, TextChunk]],
+        filename: str,
+        user_id: int,
+        on_progress: Optional[Callable[[int, int], None]] = None,
+        find_existing: Optional[Callable[[List[str]], Dict[int, str]]] = None
+    ) -> int:
+        """Index document chunks into the vector store.
+
+        `chunks` may be a lazy iterator; it is embedded in windows and streamed
+        into the vector store, so upserts of one window overlap with embedding
+        of the next. Progress is reported through
+        `on_progress(chunks_embedded, chunks_indexed)`. `TextChunk` items also
+        record their character span in the chunk metadata.
+
+        `find_existing(texts)` may map positions in a window to ids of vectors
+        already stored for identical text; those vectors are copied instead of
+        calling the embedding API.
+        """
+        self._invalidate_answers(document_id)
+        window = settings.EMBEDDING_BATCH_SIZE * settings.EMBEDDING_MAX_CONCURRENCY
+        counts = {"embedded": 0, "indexed": 0, "reused": 0}
+        # BM25 rows are written only once their vectors are upserted; batches
+        # settle in the order their records were produced
+        unindexed: Deque[Tuple[str, str]] = deque()
+
+        def report() -> None:
+            if on_progress:
+                on_progress(counts["embedded"], counts["indexed"])
+
+        def records() -> Iterator[Dict[str, Any]]:
+            chunk_iter = iter(chunks)
+            while True:
+                window_chunks = list(islice(chunk_iter, window))
+                if not window_chunks:
+                    return
+                texts = [chunk.text if isinstance(chunk, TextChunk) else chunk for chunk in window_chunks]
+                embeddings, reused = self._embed_window(texts, find_existing)
+                start = counts["embedded"]
+                counts["embedded"] += len(window_chunks)
+                counts["reused"] += reused
+                report()
+
+                for i, chunk in enumerate(window_chunks, start):
+                    metadata = {
+                        "document_id": document_id,
+                        "chunk_index": i,
+                        "filename": filename,
+                        "user_id": user_id
+                    }
+                    if isinstance(chunk, TextChunk):
+                        metadata["char_start"] = chunk.start
+                        metadata["char_end"] = chunk.end
+                    unindexed.append((self.chunk_id(document_id, i), texts[i - start]))
+                    yield {
+                        "id": self.chunk_id(document_id, i),
+                        "document": texts[i - start],
+                        "embedding": embeddings[i - start],
+                        "metadata": metadata
+                    }
+
+        def on_upserted(count: int) -> None:
+            upserted = [unindexed.popleft() for _ in range(count)]
+            self._index_lexical([row[0] for row in upserted], document_id, [row[1] for row in upserted])
+            counts["indexed"] += count
+            report()
+
+        self.vector_store.add_records(records(), on_upserted=on_upserted)
+
+        if counts["reused"]:
+            print(f"♻️ Reused {counts['reused']} of {counts['indexed']} chunk embeddings for document {document_id}")
+        return counts["indexed"]
+    
+    def _embed_window(
+        self,
+        texts: List[str],
+        find_existing: Optional[Callable[[List[str]], Dict[int, str]]]
+    ) -> Tuple[List[List[float]], int]:
+        """Embeddings for `texts` and how many were reused from the vector store"""
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        reused = 0
+        existing = find_existing(texts) if find_existing else {}
+        if existing:
+            fetched = self.vector_store.fetch(sorted(set(existing.values())))
+            for position, vector_id in existing.items():
+                if vector_id in fetched:
+                    vectors[position] = fetched[vector_id]["values"]
+                    reused += 1
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            new_vectors = self.embeddings.generate_embeddings([texts[i] for i in missing])
+            for i, vector in zip(missing, new_vectors):
+                vectors[i] = vector
+        return vectors, reused
+    
+    def copy_document(
+        self,
+        source_document_id: int,
+        document_id: int,
+        chunk_count: int,
         filename: str,
         user_id: int
     ) -> int:
-        """Index document chunks into the vector store"""
-        embeddings = self.embeddings.generate_embeddings(chunks)
-        
-        ids = [f"doc_{document_id}_chunk_{i}" for i in range(len(chunks))]
-        metadatas = [
-            {
-                "document_id": document_id,
-                "chunk_index": i,
-                "filename": filename,
-                "user_id": user_id
-            }
-            for i in range(len(chunks))
-        ]
-        
-        self.vector_store.add_documents(
-            documents=chunks,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=ids
+        """Index a byte-identical duplicate by copying the source document's vectors.
+
+        Raises LookupError if any source chunk is missing from the vector store.
+        """
+        batch_size = 100
+        for start in range(0, chunk_count, batch_size):
+            indices = range(start, min(start + batch_size, chunk_count))
+            source_ids = [self.chunk_id(source_document_id, i) for i in indices]
+            fetched = self.vector_store.fetch(source_ids)
+            if len(fetched) != len(source_ids):
+                raise LookupError(f"Vectors for document {source_document_id} are incomplete")
+
+            documents = []
+            embeddings = []
+            metadatas = []
+            for source_id in source_ids:
+                metadata = fetched[source_id]["metadata"]
+                documents.append(metadata.pop("text", ""))
+                embeddings.append(fetched[source_id]["values"])
+                metadata.update({
+                    "document_id": document_id,
+                    "filename": filename,
+                    "user_id": user_id
+                })
+                metadatas.append(metadata)
+
+            ids = [self.chunk_id(document_id, i) for i in indices]
+            self.vector_store.add_documents(
+                documents=documents,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                ids=ids
+            )
+            self._index_lexical(ids, document_id, documents)
+        return chunk_count
+    
+    def _index_lexical(self, ids: List[str], document_id: int, texts: List[str]) -> None:
+        if self.lexical_index is not None:
+            self.lexical_index.add(ids, [document_id] * len(ids), texts)
+    
+    def _retrieval_size(self, n_results: int) -> int:
+        """How many vector hits to fetch; hybrid search fuses a larger pool down to n_results"""
+        return max(n_results, settings.HYBRID_CANDIDATES) if self.lexical_index is not None else n_results
+    
+    def _lexical_search(self, query: str, n_results: int) -> List[Tuple[str, float]]:
+        if self.lexical_index is None:
+            return []
+        return self.lexical_index.search(query, self._retrieval_size(n_results))
+    
+    def _fuse(
+        self,
+        results: Dict[str, Any],
+        lexical_hits: List[Tuple[str, float]],
+        n_results: int,
+        fetched: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """Reciprocal-rank fusion of vector results and BM25 hits, cut to n_results.
+
+        Chunks only found lexically are read from `fetched` (vector_store.fetch
+        output), which the caller supplies for the ids in `_lexical_only`.
+        """
+        ids = results.get("ids", [[]])[0] if results.get("ids") else []
+        if not lexical_hits:
+            return self._truncate(results, n_results)
+
+        k = settings.HYBRID_RRF_K
+        scores: Dict[str, float] = {}
+        for rank, vector_id in enumerate(ids):
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank + 1)
+        for rank, (vector_id, _) in enumerate(lexical_hits):
+            scores[vector_id] = scores.get(vector_id, 0.0) + 1.0 / (k + rank + 1)
+
+        documents = results.get("documents", [[]])[0] if results.get("documents") else []
+        metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+        chunks = {vector_id: (documents[i], metadatas[i]) for i, vector_id in enumerate(ids)}
+        for vector_id, found in (fetched or {}).items():
+            metadata = dict(found["metadata"])
+            chunks.setdefault(vector_id, (metadata.pop("text", ""), metadata))
+
+        fused_ids = [vector_id for vector_id in sorted(scores, key=scores.get, reverse=True) if vector_id in chunks]
+        fused_ids = fused_ids[:n_results]
+        return {
+            "ids": [fused_ids],
+            "documents": [[chunks[vector_id][0] for vector_id in fused_ids]],
+            "metadatas": [[chunks[vector_id][1] for vector_id in fused_ids]]
+        }
+    
+    @staticmethod
+    def _lexical_only(results: Dict[str, Any], lexical_hits: List[Tuple[str, float]]) -> List[str]:
+        ids = set(results.get("ids", [[]])[0] if results.get("ids") else [])
+        return [vector_id for vector_id, _ in lexical_hits if vector_id not in ids]
+    
+    @staticmethod
+    def _truncate(results: Dict[str, Any], n_results: int) -> Dict[str, Any]:
+        return {key: [values[0][:n_results]] if values else [[]] for key, values in results.items()}
+    
+    def _candidate_count(self, n_results: int) -> int:
+        """Chunks to retrieve before the rerank stage cuts them down"""
+        return max(n_results, settings.RERANK_CANDIDATES) if self.reranker is not None else n_results
+    
+    def _rerank(self, query: str, results: Dict[str, Any], n_results: int) -> Dict[str, Any]:
+        if self.reranker is None:
+            return self._truncate(results, n_results)
+        return self.reranker.rerank(query, results, min(n_results, self.reranker.top_k))
+    
+    def _retrieve(self, query: str, query_embedding: List[float], n_results: int) -> Dict[str, Any]:
+        """Vector search, fused with BM25 hits and reranked down to n_results"""
+        candidates = self._candidate_count(n_results)
+        results = self.vector_store.query(
+            query_embedding=query_embedding,
+            n_results=self._retrieval_size(candidates),
+            where=None
         )
-        
-        return len(chunks)
+        lexical_hits = self._lexical_search(query, candidates)
+        missing = self._lexical_only(results, lexical_hits)
+        fetched = self.vector_store.fetch(missing) if missing else {}
+        return self._rerank(query, self._fuse(results, lexical_hits, candidates, fetched), n_results)
+    
+    async def _aretrieve(self, query: str, query_embedding_task: Awaitable[List[float]], n_results: int):
+        """Async `_retrieve`; BM25 runs in a thread while the query is being embedded.
+
+        Returns (query_embedding, results).
+        """
+        candidates = self._candidate_count(n_results)
+        lexical = asyncio.create_task(asyncio.to_thread(self._lexical_search, query, candidates))
+        try:
+            query_embedding = await query_embedding_task
+            results = await self.vector_store.aquery(
+                query_embedding=query_embedding,
+                n_results=self._retrieval_size(candidates),
+                where=None
+            )
+        except BaseException:
+            lexical.cancel()
+            raise
+        lexical_hits = await lexical
+        missing = self._lexical_only(results, lexical_hits)
+        fetched = await asyncio.to_thread(self.vector_store.fetch, missing) if missing else {}
+        # Reranking is a few milliseconds of CPU at most (time-boxed), so it runs inline
+        return query_embedding, self._rerank(query, self._fuse(results, lexical_hits, candidates, fetched), n_results)
     
     def query(
         self,
@@ -71,6 +322,9 @@ class RAGPipeline:
         """Query the knowledge base"""
         context = []
         metadatas = []
+        chunk_ids = []
+        query_embedding = None
+        retrieval_query = query
         
         try:
             # OPTIMIZATION: Check for casual chat FIRST to skip expensive embedding generation (4s+)
@@ -81,21 +335,27 @@ class RAGPipeline:
                     "sources": []
                 }
 
+            # Follow-ups like "what about contractors?" are searched as standalone questions
+            retrieval_query = self._standalone_query(query, chat_history)
+
             # Generate embedding for query
-            query_embedding = self.embeddings.generate_single_embedding(query)
+            query_embedding = self.embeddings.generate_single_embedding(retrieval_query)
             
-            # Query vector store (no filtering, all users see all documents)
-            results = self.vector_store.query(
-                query_embedding=query_embedding,
-                n_results=n_results,
-                where=None
-            )
+            # Query vector store (no filtering, all users see all documents),
+            # fused with keyword hits and reranked when those stages are enabled
+            results = self._retrieve(retrieval_query, query_embedding, n_results)
             
             context = results.get("documents", [[]])[0] if results.get("documents") else []
             metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+            chunk_ids = results.get("ids", [[]])[0] if results.get("ids") else []
+
+            cached = self._cached_answer(retrieval_query, chunk_ids, query_embedding, chat_history)
+            if cached is not None:
+                print(f"⚡ Answer cache hit: '{retrieval_query}'")
+                return cached
             
             # Debug logging
-            print(f"\n🔍 RAG Query: '{query}'")
+            print(f"\n🔍 RAG Query: '{retrieval_query}'")
             print(f"📄 Retrieved {len(context)} document chunks")
             if context:
                 print(f"📌 Top result preview: {context[0][:100]}...")
@@ -105,6 +365,7 @@ class RAGPipeline:
         except Exception as e:
             print(f"❌ Vector store query error: {str(e)}")
             # Continue with empty context - LLM will provide general response
+            chunk_ids = []
         
         # Generate response (LLM handles empty context gracefully)
         try:
@@ -112,25 +373,16 @@ class RAGPipeline:
                 query=query,
                 context=context,
                 chat_history=chat_history,
-                user_role=user_role
+                user_role=user_role,
+                metadatas=metadatas
             )
             print(f"✅ Response generated successfully")
         except Exception as e:
             print(f"❌ LLM error: {str(e)}")
-            response = "I apologize, but I'm having trouble processing your request. Please try again."
+            response = PROCESSING_ERROR
         
-        # Build sources list
-        sources = []
-        seen_docs = set()
-        for meta in metadatas:
-            doc_key = (meta.get("filename", "Unknown"), meta.get("document_id", 0))
-            if doc_key not in seen_docs:
-                sources.append({
-                    "filename": meta.get("filename", "Unknown"),
-                    "chunk_index": meta.get("chunk_index", 0),
-                    "document_id": meta.get("document_id", 0)
-                })
-                seen_docs.add(doc_key)
+        sources = self._build_sources(metadatas)
+        self._store_answer(retrieval_query, chunk_ids, query_embedding, response, sources, metadatas, chat_history)
         
         return {
             "response": response,
@@ -147,6 +399,10 @@ class RAGPipeline:
     ) -> Generator[str, None, None]:
         """Stream query response"""
         context = []
+        metadatas = []
+        chunk_ids = []
+        query_embedding = None
+        retrieval_query = query
         
         try:
             # OPTIMIZATION: Check for casual chat FIRST to skip expensive embedding generation
@@ -156,36 +412,283 @@ class RAGPipeline:
                     yield chunk
                 return
 
-            query_embedding = self.embeddings.generate_single_embedding(query)
+            retrieval_query = self._standalone_query(query, chat_history)
+            query_embedding = self.embeddings.generate_single_embedding(retrieval_query)
             
             # Query all documents (no filtering)
-            results = self.vector_store.query(
-                query_embedding=query_embedding,
-                n_results=n_results,
-                where=None
-            )
+            results = self._retrieve(retrieval_query, query_embedding, n_results)
             
             context = results.get("documents", [[]])[0] if results.get("documents") else []
+            metadatas = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+            chunk_ids = results.get("ids", [[]])[0] if results.get("ids") else []
+
+            cached = self._cached_answer(retrieval_query, chunk_ids, query_embedding, chat_history)
+            if cached is not None:
+                print(f"⚡ Answer cache hit (stream): '{retrieval_query}'")
+                yield cached["response"]
+                return
             
         except Exception as e:
             print(f"Vector store stream query error: {str(e)}")
+            chunk_ids = []
         
-        # Stream response
+        # Stream response, keeping the text so a complete answer can be cached
+        parts = []
         try:
             for chunk in self.llm.generate_response_stream(
                 query=query,
                 context=context,
                 chat_history=chat_history,
-                user_role=user_role
+                user_role=user_role,
+                metadatas=metadatas
             ):
+                parts.append(chunk)
                 yield chunk
         except Exception as e:
             yield f"Error: {str(e)}"
+            return
+
+        if not any(part in ERROR_RESPONSES for part in parts):
+            self._store_answer(
+                retrieval_query, chunk_ids, query_embedding, "".join(parts),
+                self._build_sources(metadatas), metadatas, chat_history
+            )
+    
+    async def aquery(
+        self,
+        query: str,
+        user_id: Optional[int] = None,
+        n_results: int = 5,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_role: str = "employee",
+        load_history: Optional[Callable[[], Awaitable[List[Dict[str, str]]]]] = None
+    ) -> Dict[str, Any]:
+        """Async `query`; see `_astage` for how the stages overlap"""
+        stage = await self._astage(query, n_results, chat_history, load_history)
+        if stage["cached"] is not None:
+            return stage["cached"]
+
+        try:
+            response = await self.llm.agenerate_response(
+                query=query,
+                context=stage["context"],
+                chat_history=stage["chat_history"],
+                user_role=user_role,
+                metadatas=stage["metadatas"]
+            )
+        except Exception as e:
+            print(f"❌ LLM error: {str(e)}")
+            response = PROCESSING_ERROR
+
+        sources = self._build_sources(stage["metadatas"])
+        self._store_answer(
+            stage["retrieval_query"], stage["chunk_ids"], stage["query_embedding"], response, sources,
+            stage["metadatas"], stage["chat_history"]
+        )
+
+        return {
+            "response": response,
+            "sources": sources
+        }
+
+    async def aquery_stream(
+        self,
+        query: str,
+        user_id: Optional[int] = None,
+        n_results: int = 5,
+        chat_history: Optional[List[Dict[str, str]]] = None,
+        user_role: str = "employee",
+        load_history: Optional[Callable[[], Awaitable[List[Dict[str, str]]]]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Async `query_stream`; the LLM stream opens as soon as context is ready"""
+        stage = await self._astage(query, n_results, chat_history, load_history)
+        if stage["cached"] is not None:
+            yield stage["cached"]["response"]
+            return
+
+        parts = []
+        try:
+            async for chunk in self.llm.agenerate_response_stream(
+                query=query,
+                context=stage["context"],
+                chat_history=stage["chat_history"],
+                user_role=user_role,
+                metadatas=stage["metadatas"]
+            ):
+                parts.append(chunk)
+                yield chunk
+        except Exception as e:
+            yield f"Error: {str(e)}"
+            return
+
+        if not any(part in ERROR_RESPONSES for part in parts):
+            self._store_answer(
+                stage["retrieval_query"], stage["chunk_ids"], stage["query_embedding"], "".join(parts),
+                self._build_sources(stage["metadatas"]), stage["metadatas"], stage["chat_history"]
+            )
+
+    async def _astage(
+        self,
+        query: str,
+        n_results: int,
+        chat_history: Optional[List[Dict[str, str]]],
+        load_history: Optional[Callable[[], Awaitable[List[Dict[str, str]]]]]
+    ) -> Dict[str, Any]:
+        """Everything that has to happen before generation, run concurrently.
+
+        The LLM connection warm-up and `load_history()` start together with
+        the query embedding, and all of them overlap the vector search, so
+        generation starts one retrieval round trip after the request instead
+        of after every stage in turn. The exception is a follow-up question,
+        which needs the history to be rewritten into a standalone retrieval
+        query first.
+        """
+        started = time.perf_counter()
+        stage: Dict[str, Any] = {
+            "context": [],
+            "metadatas": [],
+            "chunk_ids": [],
+            "query_embedding": None,
+            "chat_history": chat_history,
+            "retrieval_query": query,
+            "cached": None
+        }
+        warm_up = asyncio.create_task(self.llm.awarm_up())
+        history = asyncio.create_task(load_history()) if load_history else None
+
+        try:
+            if self.llm._is_casual_chat(query):
+                # OPTIMIZATION: casual chat skips embedding and retrieval entirely
+                print(f"⚡ Casual chat detected: '{query}' - Skipping RAG lookup")
+            else:
+                if history is not None and self._may_rewrite(query):
+                    stage["chat_history"] = await self._await_history(history)
+                    history = None
+                if stage["chat_history"] and self._may_rewrite(query):
+                    stage["retrieval_query"] = await self.llm.arewrite_query(query, stage["chat_history"])
+                retrieval_query = stage["retrieval_query"]
+                query_embedding, results = await self._aretrieve(
+                    retrieval_query,
+                    self.embeddings.agenerate_single_embedding(retrieval_query),
+                    n_results
+                )
+                stage["query_embedding"] = query_embedding
+                stage["context"] = results.get("documents", [[]])[0] if results.get("documents") else []
+                stage["metadatas"] = results.get("metadatas", [[]])[0] if results.get("metadatas") else []
+                stage["chunk_ids"] = results.get("ids", [[]])[0] if results.get("ids") else []
+
+        except Exception as e:
+            print(f"❌ Vector store query error: {str(e)}")
+            stage["chunk_ids"] = []
+
+        if history is not None:
+            stage["chat_history"] = await self._await_history(history, stage["chat_history"])
+        if stage["chunk_ids"]:
+            # The cached answer must have been generated with the same conversation in the prompt
+            stage["cached"] = self._cached_answer(
+                stage["retrieval_query"], stage["chunk_ids"], stage["query_embedding"], stage["chat_history"]
+            )
+            if stage["cached"] is not None:
+                print(f"⚡ Answer cache hit: '{stage['retrieval_query']}'")
+            else:
+                print(f"\n🔍 RAG Query: '{stage['retrieval_query']}'")
+                print(f"📄 Retrieved {len(stage['context'])} document chunks")
+        if stage["cached"] is None:
+            # Normally finished already; if not, its connection is the quickest to reuse
+            await warm_up
+        else:
+            warm_up.cancel()
+        print(f"⏱️ Context ready in {(time.perf_counter() - started) * 1000:.0f}ms")
+        return stage
+
+    @staticmethod
+    async def _await_history(
+        history: Awaitable[List[Dict[str, str]]],
+        default: Optional[List[Dict[str, str]]] = None
+    ) -> Optional[List[Dict[str, str]]]:
+        try:
+            return await history
+        except Exception as e:
+            print(f"⚠️ Could not load chat history: {e}")
+            return default
+
+    def _may_rewrite(self, query: str) -> bool:
+        return settings.CHAT_REWRITE_FOLLOW_UPS and self.llm._is_follow_up(query)
+
+    def _standalone_query(self, query: str, chat_history: Optional[List[Dict[str, str]]]) -> str:
+        """`query` rewritten with the conversation when it is a follow-up question"""
+        if chat_history and self._may_rewrite(query):
+            return self.llm.rewrite_query(query, chat_history)
+        return query
+    
+    @staticmethod
+    def _build_sources(metadatas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One source entry per retrieved document"""
+        sources = []
+        seen_docs = set()
+        for meta in metadatas:
+            doc_key = (meta.get("filename", "Unknown"), meta.get("document_id", 0))
+            if doc_key not in seen_docs:
+                sources.append({
+                    "filename": meta.get("filename", "Unknown"),
+                    "chunk_index": meta.get("chunk_index", 0),
+                    "document_id": meta.get("document_id", 0)
+                })
+                seen_docs.add(doc_key)
+        return sources
+    
+    def _cached_answer(
+        self,
+        query: str,
+        chunk_ids: List[str],
+        query_embedding: Optional[List[float]],
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None or not chunk_ids:
+            return None
+        return self.answer_cache.get(query, chunk_ids, query_embedding, conversation_digest(chat_history))
+    
+    def _store_answer(
+        self,
+        query: str,
+        chunk_ids: List[str],
+        query_embedding: Optional[List[float]],
+        response: str,
+        sources: List[Dict[str, Any]],
+        metadatas: List[Dict[str, Any]],
+        chat_history: Optional[List[Dict[str, str]]] = None
+    ) -> None:
+        # Answers without retrieved context are not cached: there is no
+        # document whose re-indexing would invalidate them
+        if self.answer_cache is None or not chunk_ids or not response or response in ERROR_RESPONSES:
+            return
+        self.answer_cache.put(
+            query=query,
+            chunk_ids=chunk_ids,
+            query_embedding=query_embedding,
+            response=response,
+            sources=sources,
+            document_ids={meta.get("document_id") for meta in metadatas},
+            conversation=conversation_digest(chat_history)
+        )
+    
+    def _invalidate_answers(self, document_id: int) -> None:
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_document(document_id)
+    
+    async def aclose(self) -> None:
+        if self._vector_store is not None:
+            await self._vector_store.aclose()
+        if self._llm is not None:
+            await self._llm.aclose()
     
     def delete_document(self, document_id: int) -> None:
         """Delete document from vector store"""
+        self._invalidate_answers(document_id)
         try:
             self.vector_store.delete_by_document_id(document_id)
+            if self.lexical_index is not None:
+                self.lexical_index.delete_by_document_id(document_id)
         except Exception as e:
             print(f"Error deleting document: {e}")
 
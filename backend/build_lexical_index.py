@@ -0,0 +1,55 @@
+"""
+Backfill the BM25 keyword index used for hybrid search.
+Reads the chunk text of every processed document back from the vector store,
+so nothing is re-embedded. Safe to re-run: chunks already indexed are replaced.
+"""
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from app.database.connection import SessionLocal
+from app.database.models import Document
+from app.rag.lexical_index import get_lexical_index
+from app.rag.vector_store import get_vector_store
+from app.services.rag_pipeline import RAGPipeline
+
+BATCH_SIZE = 100
+
+
+def build_lexical_index():
+    """Index the text of all processed documents into the lexical index"""
+    print("🔄 Building lexical index...")
+    vector_store = get_vector_store()
+    lexical_index = get_lexical_index()
+
+    db = SessionLocal()
+    try:
+        documents = db.query(Document.id, Document.filename, Document.chunk_count).filter(
+            Document.status == "processed"
+        ).all()
+    finally:
+        db.close()
+
+    total = 0
+    for document_id, filename, chunk_count in documents:
+        lexical_index.delete_by_document_id(document_id)
+        indexed = 0
+        for start in range(0, chunk_count or 0, BATCH_SIZE):
+            ids = [RAGPipeline.chunk_id(document_id, i) for i in range(start, min(start + BATCH_SIZE, chunk_count))]
+            fetched = vector_store.fetch(ids)
+            found = [vector_id for vector_id in ids if vector_id in fetched]
+            lexical_index.add(
+                found,
+                [document_id] * len(found),
+                [fetched[vector_id]["metadata"].get("text", "") for vector_id in found]
+            )
+            indexed += len(found)
+        total += indexed
+        print(f"✓ {filename}: {indexed}/{chunk_count} chunks")
+
+    print(f"✅ Lexical index now holds {len(lexical_index)} chunks ({total} from {len(documents)} documents)")
+
+
+if __name__ == "__main__":
+    build_lexical_index()
@@ -8,7 +8,7 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-from app.database.connection import engine, SessionLocal, Base
+from app.database.connection import engine, SessionLocal, Base, upgrade_schema
 from app.database.models import User, Document, ChatSession, ChatMessage
 from app.core.security import get_password_hash
 
@@ -32,6 +32,7 @@ def init_database():
         # Create all tables
         print("📝 Creating database tables...")
         Base.metadata.create_all(bind=engine)
+        upgrade_schema()
         print("✅ Tables created successfully!")
         
         # List created tables
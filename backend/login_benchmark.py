@@ -0,0 +1,106 @@
+"""Login throughput under concurrent chat load.
+
+Measures chat latency on its own, then again while a wave of logins runs,
+and prints login throughput/latency and the password pool metrics from /health.
+
+    python login_benchmark.py [--base-url http://localhost:8000] [--logins 200]
+                              [--login-concurrency 50] [--chat-clients 10] [--baseline-seconds 5]
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+API = "/api/v1"
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary(values):
+    return f"p50 {percentile(values, 0.5) * 1000:7.1f}ms  p95 {percentile(values, 0.95) * 1000:7.1f}ms  (n={len(values)})"
+
+
+async def login(client, username, password):
+    start = time.perf_counter()
+    r = await client.post(f"{API}/auth/login", data={"username": username, "password": password})
+    return r.status_code, time.perf_counter() - start
+
+
+async def chat_client(client, headers, stop, latencies):
+    # Listing sessions is a sync endpoint: it competes with password work for the shared threadpool
+    while not stop.is_set():
+        start = time.perf_counter()
+        r = await client.get(f"{API}/chat/sessions", headers=headers)
+        r.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_chat_load(client, headers, clients, stop):
+    latencies = []
+    tasks = [asyncio.create_task(chat_client(client, headers, stop, latencies)) for _ in range(clients)]
+    return tasks, latencies
+
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.login_concurrency + args.chat_clients + 5)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        r = await client.post(f"{API}/auth/login", data={"username": args.username, "password": args.password})
+        if r.status_code != 200:
+            print(f"Login failed: {r.text}")
+            return
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        print("=" * 60)
+        print("LOGIN BENCHMARK")
+        print("=" * 60)
+
+        stop = asyncio.Event()
+        tasks, baseline = await run_chat_load(client, headers, args.chat_clients, stop)
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+        print(f"Chat latency, no logins:      {summary(baseline)}")
+
+        stop = asyncio.Event()
+        tasks, during = await run_chat_load(client, headers, args.chat_clients, stop)
+        semaphore = asyncio.Semaphore(args.login_concurrency)
+
+        async def one_login():
+            async with semaphore:
+                return await login(client, args.username, args.password)
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one_login() for _ in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await asyncio.gather(*tasks)
+
+        ok = [latency for status, latency in results if status == 200]
+        rejected = sum(1 for status, _ in results if status == 503)
+        failed = len(results) - len(ok) - rejected
+        print(f"Chat latency, during logins:  {summary(during)}")
+        print(f"Logins:                       {summary(ok)}")
+        print(f"Login throughput:             {len(ok) / elapsed:.1f}/s over {elapsed:.1f}s")
+        print(f"Rejected (503): {rejected}   Failed: {failed}")
+
+        health = (await client.get("/health")).json()
+        print(f"Password pool: {health.get('password_hasher')}")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--login-concurrency", type=int, default=50)
+    parser.add_argument("--chat-clients", type=int, default=10)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,116 @@
+"""Shared test setup: a throwaway SQLite database, local backends and an offline tokenizer"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = tempfile.mkdtemp(prefix="rag-tests-")
+
+# Set before anything imports app.core.config / app.database.connection
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'test.db')}"
+os.environ["VECTOR_STORE_BACKEND"] = "local"
+os.environ["LOCAL_VECTOR_STORE_PATH"] = os.path.join(DATA_DIR, "vector_index")
+os.environ["LEXICAL_INDEX_PATH"] = os.path.join(DATA_DIR, "lexical_index")
+os.environ["BLOB_STORE_PATH"] = os.path.join(DATA_DIR, "blobs")
+os.environ["UPLOAD_DIR"] = os.path.join(DATA_DIR, "uploads")
+os.environ["LLM_PROVIDERS"] = "local"
+os.environ.pop("EMBEDDING_CACHE_PATH", None)
+sys.path.insert(0, BACKEND_DIR)
+
+import tiktoken  # noqa: E402
+
+try:
+    tiktoken.get_encoding("cl100k_base")
+except Exception:
+    # The cl100k_base ranks are downloaded on first use; without network, tests
+    # tokenize with a byte-level encoding that has the same interface
+    _byte_encoding = tiktoken.Encoding(
+        name="cl100k_base",
+        pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={},
+    )
+    tiktoken.get_encoding = lambda name: _byte_encoding
+
+
+@pytest.fixture(scope="session")
+def database():
+    """Create the schema in the test database"""
+    from app.database import models  # noqa: F401  (registers the tables)
+    from app.database.connection import Base, engine, upgrade_schema
+
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
+    return engine
+
+
+@pytest.fixture
+def client(database):
+    """API client signed in as the seeded admin user"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        response = client.post("/api/v1/auth/login", data={"username": "admin", "password": "admin123"})
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        yield client
+
+
+@pytest.fixture
+def run(database):
+    """Run a coroutine on a fresh event loop; pooled async connections are closed afterwards"""
+    import asyncio
+    from app.database.connection import async_engine
+
+    async def main(coro):
+        try:
+            return await coro
+        finally:
+            await async_engine.dispose()
+
+    return lambda coro: asyncio.run(main(coro))
+
+
+class FakeEmbeddings:
+    """Deterministic stand-in for the Gemini embedder; set `fail_after` to make calls fail"""
+
+    def __init__(self, dimension: int = 8):
+        self.dimension = dimension
+        self.calls = []
+        self.fail_after = None
+
+    def vector(self, text):
+        import numpy as np
+        from app.services.chunker import hash_text
+
+        rng = np.random.default_rng(int(hash_text(text)[:8], 16))
+        return rng.normal(size=self.dimension).tolist()
+
+    def generate_embeddings(self, texts):
+        if self.fail_after is not None and len(self.calls) >= self.fail_after:
+            raise RuntimeError("embedding API unavailable")
+        self.calls.append(list(texts))
+        return [self.vector(text) for text in texts]
+
+    def generate_single_embedding(self, text):
+        return self.vector(text)
+
+    async def agenerate_single_embedding(self, text):
+        return self.vector(text)
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    """The shared RAG pipeline on a fresh local vector store, in-memory BM25 index and fake embedder"""
+    from app.rag.lexical_index import BM25Index
+    from app.rag.local_vector_store import LocalVectorStore
+    from app.services.rag_pipeline import rag_pipeline
+
+    monkeypatch.setattr(rag_pipeline, "_vector_store", LocalVectorStore(str(tmp_path / "vectors"), dimension=8))
+    monkeypatch.setattr(rag_pipeline, "_lexical_index", BM25Index())
+    monkeypatch.setattr(rag_pipeline, "_embeddings", FakeEmbeddings())
+    if rag_pipeline.answer_cache is not None:
+        rag_pipeline.answer_cache.clear()
+    return rag_pipeline
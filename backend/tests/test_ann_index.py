@@ -0,0 +1,78 @@
+import numpy as np
+
+from app.rag.ann_index import ASSIGNMENTS_FILE, IVFIndex
+from app.rag.local_vector_store import LocalVectorStore
+
+DIM = 16
+
+
+def clustered(n, clusters=20, seed=0):
+    """Unit vectors scattered around `clusters` random centres, like chunk embeddings of a few topics"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, DIM))
+    points = centres[rng.integers(clusters, size=n)] + 0.3 * rng.normal(size=(n, DIM))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype(np.float32)
+
+
+def exact_top(vectors, query, k):
+    return set(np.argsort(-(vectors @ query))[:k])
+
+
+def test_candidates_have_high_recall():
+    vectors = clustered(3000)
+    index = IVFIndex(nlist=40, nprobe=8)
+    index.train(vectors)
+    queries = clustered(50, seed=1)
+
+    recall = []
+    for query in queries:
+        candidates = index.candidates(query)
+        scores = vectors[candidates] @ query
+        found = set(candidates[np.argsort(-scores)[:10]])
+        recall.append(len(found & exact_top(vectors, query, 10)) / 10)
+        assert len(candidates) < len(vectors) / 2
+    assert np.mean(recall) >= 0.9
+
+
+def test_probing_every_list_is_exact():
+    vectors = clustered(500)
+    index = IVFIndex(nlist=10)
+    index.train(vectors)
+    query = clustered(1, seed=2)[0]
+    assert sorted(index.candidates(query, nprobe=10)) == list(range(500))
+
+
+def test_added_rows_are_searchable():
+    vectors = clustered(1000)
+    index = IVFIndex(nprobe=4)
+    index.train(vectors[:800])
+    index.add(vectors[800:])
+    assert len(index.assignments) == 1000
+    assert 950 in index.candidates(vectors[950])
+
+
+def test_store_snapshots_on_training_not_on_every_add(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dimension=DIM, index_type="ivf", ann_min_rows=500)
+    vectors = clustered(1000)
+
+    def add(start, end):
+        store.add_documents(
+            documents=["text"] * (end - start),
+            embeddings=vectors[start:end].tolist(),
+            metadatas=[{"document_id": 1}] * (end - start),
+            ids=[f"doc_1_chunk_{i}" for i in range(start, end)]
+        )
+
+    add(0, 600)  # trains the index
+    snapshot = tmp_path / ASSIGNMENTS_FILE
+    assert len(np.load(snapshot)) == 600
+    add(600, 900)
+    assert len(np.load(snapshot)) == 600
+
+    # A lagging snapshot is loaded and the newer rows are assigned on load
+    reloaded = LocalVectorStore(str(tmp_path), dimension=DIM, index_type="ivf", ann_min_rows=500)
+    assert len(reloaded._ann.assignments) == 900
+    assert reloaded.query(vectors[850].tolist(), n_results=1)["ids"][0] == ["doc_1_chunk_850"]
+
+    store.snapshot()
+    assert len(np.load(snapshot)) == 900
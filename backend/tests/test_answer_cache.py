@@ -0,0 +1,69 @@
+import time
+
+from app.services.answer_cache import AnswerCache, conversation_digest, normalize_query
+
+SOURCES = [{"filename": "policy.txt"}]
+
+
+def put(cache, query="What is the leave policy?", chunks=("doc_1_chunk_0",), embedding=None,
+        response="Twenty days.", document_ids=(1,), conversation=""):
+    cache.put(query, chunks, embedding, response, SOURCES, document_ids, conversation=conversation)
+
+
+def test_normalize_query():
+    assert normalize_query("  What is the LEAVE   policy?? ") == "what is the leave policy"
+
+
+def test_hit_needs_the_same_question_and_chunks():
+    cache = AnswerCache()
+    put(cache)
+    assert cache.get("what is the leave policy", ["doc_1_chunk_0"])["response"] == "Twenty days."
+    assert cache.get("What is the leave policy?", ["doc_1_chunk_1"]) is None
+    assert cache.get("What is the sick leave policy?", ["doc_1_chunk_0"]) is None
+
+
+def test_conversation_is_part_of_the_key():
+    cache = AnswerCache()
+    history = [{"role": "summary", "content": "Asked about contractors"}, {"role": "user", "content": "Hi"}]
+    put(cache, conversation=conversation_digest(history))
+    assert cache.get("What is the leave policy?", ["doc_1_chunk_0"]) is None
+    assert cache.get(
+        "What is the leave policy?", ["doc_1_chunk_0"], conversation=conversation_digest(list(history))
+    ) is not None
+    assert conversation_digest(history) != conversation_digest(history[1:])
+    assert conversation_digest([]) == conversation_digest(None) == ""
+
+
+def test_similar_question_hits_above_threshold():
+    cache = AnswerCache(similarity_threshold=0.95)
+    put(cache, embedding=[1.0, 0.0])
+    assert cache.get("How many leave days do I get?", ["doc_1_chunk_0"], [0.99, 0.05]) is not None
+    assert cache.get("How many leave days do I get?", ["doc_1_chunk_0"], [0.5, 0.5]) is None
+    assert cache.get("How many leave days?", ["doc_1_chunk_0"], [0.99, 0.05], conversation="other") is None
+
+
+def test_reindexing_a_document_drops_its_answers():
+    cache = AnswerCache()
+    put(cache, document_ids=(1, 2))
+    put(cache, query="Holidays?", chunks=("doc_3_chunk_0",), document_ids=(3,))
+    cache.invalidate_document(2)
+    assert cache.get("What is the leave policy?", ["doc_1_chunk_0"]) is None
+    assert cache.get("Holidays?", ["doc_3_chunk_0"]) is not None
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = AnswerCache(max_entries=2)
+    put(cache, query="a")
+    put(cache, query="b")
+    cache.get("a", ["doc_1_chunk_0"])
+    put(cache, query="c")
+    assert cache.get("b", ["doc_1_chunk_0"]) is None
+    assert cache.stats()["entries"] == 2
+
+
+def test_expired_answers_are_misses(monkeypatch):
+    cache = AnswerCache(ttl_seconds=60)
+    put(cache)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("What is the leave policy?", ["doc_1_chunk_0"]) is None
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.chat import _decode_cursor, _encode_cursor
+from app.database.connection import SessionLocal
+from app.database.models import ChatMessage, ChatSession, User
+
+API = "/api/v1/chat"
+START = datetime(2024, 3, 1, 9, 0)
+
+
+@pytest.fixture
+def admin_sessions(client):
+    """Seven admin sessions; pairs share an updated_at, so pages must break ties by id"""
+    with SessionLocal() as db:
+        admin = db.query(User).filter(User.username == "admin").one()
+        sessions = [
+            ChatSession(title=f"Chat {i}", user_id=admin.id, updated_at=START + timedelta(minutes=i // 2))
+            for i in range(7)
+        ]
+        db.add_all(sessions)
+        db.flush()
+        for i in range(5):
+            db.add(ChatMessage(
+                session_id=sessions[0].id, role="user", content=f"message {i}",
+                created_at=START + timedelta(seconds=i // 2)
+            ))
+        db.commit()
+        return [session.id for session in sessions]
+
+
+def pages(client, url, limit):
+    cursor, result = None, []
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        result.append([row["id"] for row in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return result
+
+
+def test_cursor_round_trip():
+    assert _decode_cursor(_encode_cursor(START, 42)) == (START, 42)
+
+
+def test_session_pages_cover_the_listing_once(client, admin_sessions):
+    everything = [row["id"] for row in client.get(f"{API}/sessions").json()]
+    assert set(admin_sessions) <= set(everything)
+
+    result = pages(client, f"{API}/sessions", limit=2)
+    assert all(len(page) == 2 for page in result[:-1])
+    assert [session_id for page in result for session_id in page] == everything
+
+
+def test_message_pages_go_back_in_time(client, admin_sessions):
+    result = pages(client, f"{API}/sessions/{admin_sessions[0]}/messages", limit=2)
+    contents = client.get(f"{API}/sessions/{admin_sessions[0]}").json()["messages"]
+    # Each page is chronological; later pages are older
+    assert [message_id for page in reversed(result) for message_id in page] == [m["id"] for m in contents]
+
+
+def test_invalid_cursor_is_rejected(client):
+    response = client.get(f"{API}/sessions", params={"limit": 2, "cursor": "not-a-cursor"})
+    assert response.status_code == 400
@@ -0,0 +1,66 @@
+import pytest
+import tiktoken
+
+from app.services.chunker import TextChunker, hash_text
+
+
+@pytest.fixture(scope="module")
+def tokenizer():
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def document(paragraphs=40):
+    return "".join(
+        f"Paragraph {i} explains rule {i}. Employees must follow it carefully.\n\n" for i in range(paragraphs)
+    )
+
+
+def test_chunks_are_exact_slices_of_the_document(tokenizer):
+    text = document()
+    # Segments as a PDF extractor yields them: one per page
+    segments = [text[i:i + 700] for i in range(0, len(text), 700)]
+    chunks = list(TextChunker(tokenizer, chunk_size=120, chunk_overlap=20).iter_chunks(segments))
+
+    assert len(chunks) > 3
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start:chunk.end]
+        assert 0 < chunk.token_count <= 120
+
+
+def test_chunks_cover_the_document_with_overlap(tokenizer):
+    text = document()
+    chunks = list(TextChunker(tokenizer, chunk_size=120, chunk_overlap=20).iter_chunks([text]))
+
+    assert chunks[0].start == 0
+    assert chunks[-1].end == len(text)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert previous.start < chunk.start < previous.end
+
+
+def test_chunk_ends_snap_to_paragraph_breaks(tokenizer):
+    # A paragraph is shorter than the last 20% of a chunk, so every chunk can end at one
+    chunks = list(TextChunker(tokenizer, chunk_size=400, chunk_overlap=40).iter_chunks([document(100)]))
+    assert len(chunks) > 1
+    assert all(chunk.text.endswith("\n\n") for chunk in chunks[:-1])
+
+
+def test_spans_are_character_offsets_for_non_ascii_text(tokenizer):
+    text = "Überstunden werden vergütet. Café, naïve, 日本語のテキスト. " * 30
+    chunks = list(TextChunker(tokenizer, chunk_size=64, chunk_overlap=8).iter_chunks([text[:500], text[500:]]))
+    for chunk in chunks:
+        assert chunk.text == text[chunk.start:chunk.end]
+    assert chunks[-1].end == len(text)
+
+
+def test_short_text_is_one_chunk(tokenizer):
+    chunks = list(TextChunker(tokenizer, chunk_size=100, chunk_overlap=10).iter_chunks(["", "Short text."]))
+    assert [(chunk.text, chunk.start, chunk.end) for chunk in chunks] == [("Short text.", 0, 11)]
+
+
+def test_overlap_must_be_smaller_than_chunk_size(tokenizer):
+    with pytest.raises(ValueError):
+        TextChunker(tokenizer, chunk_size=10, chunk_overlap=10)
+
+
+def test_hash_text_is_stable():
+    assert hash_text("abc") == hash_text("abc") != hash_text("abd")
@@ -0,0 +1,54 @@
+from app.rag.context_packer import MIN_TRUNCATED_TOKENS, ContextPacker
+
+DOCUMENT = " ".join(f"word{i}" for i in range(300))
+
+
+def chunk(start, end, document_id=1, **meta):
+    return DOCUMENT[start:end], {"document_id": document_id, "char_start": start, "char_end": end, **meta}
+
+
+def pack(chunks, **options):
+    return ContextPacker(**options).pack([text for text, _ in chunks], [meta for _, meta in chunks])
+
+
+def test_overlapping_chunks_are_merged_by_offsets():
+    # Retrieved out of order; the merged passage reads in document order
+    assert pack([chunk(100, 300), chunk(0, 150), chunk(120, 200)]) == [DOCUMENT[0:300]]
+
+
+def test_separate_ranges_stay_separate_in_rank_order():
+    assert pack([chunk(500, 600), chunk(0, 100)]) == [DOCUMENT[500:600], DOCUMENT[0:100]]
+
+
+def test_chunks_without_offsets_merge_on_shared_text():
+    first, second = DOCUMENT[0:600], DOCUMENT[300:900]
+    packed = ContextPacker().pack([second, first], [
+        {"document_id": 1, "chunk_index": 1},
+        {"document_id": 1, "chunk_index": 0},
+    ])
+    assert packed == [DOCUMENT[0:900]]
+
+
+def test_near_duplicate_passages_are_dropped():
+    packed = pack([chunk(0, 200), chunk(0, 200, document_id=2), chunk(300, 400, document_id=2)])
+    assert packed == [DOCUMENT[0:200], DOCUMENT[300:400]]
+
+
+def test_last_passage_is_cut_to_the_budget():
+    packer = ContextPacker(token_budget=300)
+    tokens = len(packer.encoding.encode(DOCUMENT[0:200]))
+    packed = packer.pack(*zip(*[chunk(0, 200), chunk(1000, 1800, document_id=2)]))
+    assert packed[0] == DOCUMENT[0:200]
+    assert 300 - tokens >= MIN_TRUNCATED_TOKENS
+    assert len(packer.encoding.encode(packed[1])) == 300 - tokens
+
+
+def test_history_keeps_the_summary_and_latest_turns():
+    packer = ContextPacker()
+    history = [{"role": "summary", "content": "Asked about leave."}] + [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "x" * 40} for i in range(10)
+    ]
+    text = packer.pack_history(history, token_budget=200)
+    assert text.startswith("Summary of earlier conversation: Asked about leave.")
+    assert text.endswith("turn 9 " + "x" * 40)
+    assert "turn 0 " not in text
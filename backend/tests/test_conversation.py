@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database.connection import SessionLocal
+from app.database.models import ChatMessage, ChatSession
+from app.services.conversation import ConversationMemory
+from app.services.rag_pipeline import rag_pipeline
+
+UPDATED_AT = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def chat(database):
+    """A session with five messages, a minute apart; returns its id"""
+    with SessionLocal() as db:
+        session = ChatSession(title="Leave", updated_at=UPDATED_AT)
+        db.add(session)
+        db.flush()
+        for i in range(5):
+            db.add(ChatMessage(
+                session_id=session.id,
+                role="user" if i % 2 == 0 else "assistant",
+                content=f"message {i}",
+                created_at=UPDATED_AT - timedelta(minutes=5 - i)
+            ))
+        db.commit()
+        return session.id
+
+
+class FakeLLM:
+    def __init__(self):
+        self.folded = []
+
+    async def asummarize(self, summary, messages):
+        self.folded.append([message["content"] for message in messages])
+        return f"summary of {len(messages)} messages"
+
+
+def contents(history):
+    return [message["content"] for message in history]
+
+
+def test_history_is_read_once_then_served_from_the_cache(run, chat):
+    memory = ConversationMemory(window=2, summary_batch=2, summary_max_messages=4)
+    assert contents(run(memory.aload_history(chat))) == [f"message {i}" for i in range(5)]
+    memory.record(chat, [("user", "message 5"), ("assistant", "message 6")])
+    assert contents(run(memory.aload_history(chat)))[-2:] == ["message 5", "message 6"]
+    assert memory.stats() == {"sessions": 1, "hits": 1, "misses": 1}
+
+
+def test_summary_folds_messages_outside_the_window(run, chat, monkeypatch):
+    llm = FakeLLM()
+    monkeypatch.setattr(rag_pipeline, "_llm", llm)
+    memory = ConversationMemory(window=2, summary_batch=2, summary_max_messages=4)
+    run(memory.aload_history(chat))
+
+    run(memory.aupdate_summary(chat))
+    assert llm.folded == [["message 0", "message 1", "message 2"]]
+    expected = ["summary of 3 messages", "message 3", "message 4"]
+    assert contents(run(memory.aload_history(chat))) == expected
+    assert contents(run(ConversationMemory(window=2).aload_history(chat))) == expected
+    with SessionLocal() as db:
+        assert db.get(ChatSession, chat).updated_at == UPDATED_AT
+
+    # Too few new messages outside the window to fold again
+    run(memory.aupdate_summary(chat))
+    assert len(llm.folded) == 1
+
+
+def test_overflowing_tail_is_reread_after_a_summary(run, chat, monkeypatch):
+    monkeypatch.setattr(rag_pipeline, "_llm", FakeLLM())
+    memory = ConversationMemory(window=2, summary_batch=2, summary_max_messages=2)
+    history = run(memory.aload_history(chat))
+    assert contents(history) == ["message 1", "message 2", "message 3", "message 4"]
+
+    run(memory.aupdate_summary(chat))
+    assert memory.stats()["sessions"] == 0
+    assert contents(run(memory.aload_history(chat)))[0] == "summary of 2 messages"
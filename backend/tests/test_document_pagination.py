@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.api.documents import _decode_cursor, _encode_cursor
+from app.database.connection import SessionLocal
+from app.database.models import Document
+
+API = "/api/v1/documents/"
+START = datetime(2024, 3, 1, 9, 0)
+
+
+@pytest.fixture
+def documents(client):
+    """Seven ready .docx documents with repeated names, sizes and timestamps (ties break by id)"""
+    with SessionLocal() as db:
+        rows = [
+            Document(
+                filename=f"stored-{i}.docx",
+                original_filename=f"handbook-{i % 3}.docx",
+                file_type="docx",
+                file_size=1000 * (i % 2),
+                status="ready",
+                owner_id=1,
+                created_at=START + timedelta(minutes=i // 2)
+            )
+            for i in range(7)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+
+
+def test_cursor_round_trip():
+    assert _decode_cursor(_encode_cursor("created_at", START, 7), "created_at") == (START, 7)
+    assert _decode_cursor(_encode_cursor("size", 1000, 7), "size") == (1000, 7)
+
+
+@pytest.mark.parametrize("sort", ["created_at", "name", "size"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_match_the_unpaged_listing(client, documents, sort, order):
+    params = {"file_type": "docx", "sort": sort, "order": order}
+    everything = [row["id"] for row in client.get(API, params=params).json()]
+    assert set(documents) <= set(everything)
+
+    paged, cursor = [], None
+    while True:
+        response = client.get(API, params={**params, "limit": 2, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        paged += [row["id"] for row in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert paged == everything
+
+
+def test_cursor_of_another_sort_is_rejected(client, documents):
+    cursor = client.get(API, params={"limit": 2}).headers["X-Next-Cursor"]
+    response = client.get(API, params={"limit": 2, "sort": "name", "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_count_by_status(client, documents):
+    counts = client.get(f"{API}count", params={"file_type": "docx"}).json()
+    assert counts["total"] == sum(counts["by_status"].values()) >= 7
@@ -0,0 +1,69 @@
+import time
+
+from app.rag.embedding_cache import EmbeddingCache
+
+MODEL = "models/text-embedding-004"
+
+
+def test_get_returns_stored_vector():
+    cache = EmbeddingCache()
+    cache.set(MODEL, "retrieval_document", "hello", [0.5, 0.25])
+    assert cache.get(MODEL, "retrieval_document", "hello") == [0.5, 0.25]
+    assert cache.stats()["hits"] == 1
+
+
+def test_task_types_do_not_collide():
+    cache = EmbeddingCache()
+    cache.set(MODEL, "retrieval_document", "hello", [1.0])
+    assert cache.get(MODEL, "retrieval_query", "hello") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = EmbeddingCache(max_entries=2)
+    cache.set(MODEL, "retrieval_document", "a", [1.0])
+    cache.set(MODEL, "retrieval_document", "b", [2.0])
+    cache.get(MODEL, "retrieval_document", "a")
+    cache.set(MODEL, "retrieval_document", "c", [3.0])
+    assert cache.get(MODEL, "retrieval_document", "b") is None
+    assert cache.get(MODEL, "retrieval_document", "a") == [1.0]
+    assert cache.get(MODEL, "retrieval_document", "c") == [3.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts():
+    # float32 vectors of 4 values are 16 bytes each
+    cache = EmbeddingCache(max_bytes=40)
+    for i in range(5):
+        cache.set(MODEL, "retrieval_document", str(i), [float(i)] * 4)
+    assert len(cache) == 2
+    assert cache.stats()["bytes"] == 32
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = EmbeddingCache(ttl_seconds=10)
+    cache.set(MODEL, "retrieval_document", "old", [1.0])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 11)
+    assert cache.get(MODEL, "retrieval_document", "old") is None
+    assert len(cache) == 0
+
+
+def test_sqlite_file_warms_a_new_cache(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(persist_path=path)
+    cache.set_many(MODEL, "retrieval_document", [("a", [1.0, 2.0]), ("b", [3.0, 4.0])])
+
+    restarted = EmbeddingCache(persist_path=path)
+    assert restarted.get(MODEL, "retrieval_document", "a") == [1.0, 2.0]
+    assert restarted.get(MODEL, "retrieval_document", "b") == [3.0, 4.0]
+
+
+def test_evicted_entries_are_removed_from_the_file(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    cache = EmbeddingCache(max_entries=1, persist_path=path)
+    cache.set(MODEL, "retrieval_document", "a", [1.0])
+    cache.set(MODEL, "retrieval_document", "b", [2.0])
+
+    restarted = EmbeddingCache(max_entries=10, persist_path=path)
+    assert restarted.get(MODEL, "retrieval_document", "a") is None
+    assert restarted.get(MODEL, "retrieval_document", "b") == [2.0]
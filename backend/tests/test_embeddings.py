@@ -0,0 +1,50 @@
+import pytest
+
+from app.rag.embeddings import EmbeddingsGenerator
+
+
+class FakeGenai:
+    """Embeds a text as [len(text)]; batches containing "fail" raise"""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_content(self, model, content, task_type, title=None):
+        self.batches.append(list(content))
+        if any("fail" in text for text in content):
+            raise RuntimeError("provider error")
+        return {"embedding": [[float(len(text))] for text in content]}
+
+
+@pytest.fixture
+def generator():
+    generator = EmbeddingsGenerator()
+    generator.batch_size = 2
+    generator.max_retries = 0
+    generator._genai = FakeGenai()
+    return generator
+
+
+def test_results_keep_input_order_and_duplicates_are_embedded_once(generator):
+    texts = ["a", "bbb", "a", "cc", "dddd"]
+    assert generator.generate_embeddings(texts) == [[1.0], [3.0], [1.0], [2.0], [4.0]]
+    assert sorted(text for batch in generator._genai.batches for text in batch) == ["a", "bbb", "cc", "dddd"]
+
+
+def test_cached_texts_are_not_sent_again(generator):
+    generator.generate_embeddings(["a", "bb"])
+    generator._genai.batches.clear()
+    generator.generate_embeddings(["a", "bb", "ccc"])
+    assert generator._genai.batches == [["ccc"]]
+
+
+def test_failed_batch_raises_and_successful_batches_are_cached(generator):
+    with pytest.raises(RuntimeError):
+        generator.generate_embeddings(["a", "bb", "fail", "ccc", "dddd", "e"])
+
+    generator._genai.batches.clear()
+    assert generator.generate_embeddings(["a", "bb", "ok!", "ccc", "dddd", "e"]) == [
+        [1.0], [2.0], [3.0], [3.0], [4.0], [1.0]
+    ]
+    # Only the batch that failed is embedded again
+    assert generator._genai.batches == [["ok!", "ccc"]]
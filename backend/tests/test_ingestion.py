@@ -0,0 +1,106 @@
+import pytest
+
+from app.core.config import settings
+from app.database.connection import SessionLocal
+from app.database.models import Document, DocumentChunk
+from app.services.ingestion import IngestionQueue
+
+TEXT = "".join(f"Section {i}. The leave policy grants twenty days of paid leave per year.\n\n" for i in range(120))
+
+
+@pytest.fixture
+def upload(tmp_path, database):
+    """Save a text file and its "processing" document row; returns (document id, path)"""
+    def make(text=TEXT, name="policy.txt"):
+        path = tmp_path / name
+        path.write_text(text)
+        with SessionLocal() as db:
+            document = Document(
+                filename=name, original_filename=name, file_type="txt",
+                file_size=len(text), status="processing", owner_id=1
+            )
+            db.add(document)
+            db.commit()
+            return document.id, str(path)
+    return make
+
+
+def status_of(document_id):
+    with SessionLocal() as db:
+        return db.query(Document.status, Document.chunk_count).filter(Document.id == document_id).one()
+
+
+def test_document_is_indexed_and_marked_processed(pipeline, upload):
+    queue = IngestionQueue()
+    document_id, path = upload()
+    queue._run(document_id, path, "txt", "policy.txt", 1)
+
+    status, chunk_count = status_of(document_id)
+    assert status == "processed"
+    assert chunk_count > 1
+    assert pipeline.vector_store.get_document_count() == chunk_count
+    assert len(pipeline.lexical_index) == chunk_count
+    assert queue.get_progress(document_id)["stage"] == "processed"
+    with SessionLocal() as db:
+        assert db.query(DocumentChunk).filter(DocumentChunk.document_id == document_id).count() == chunk_count
+
+
+def test_failure_removes_the_partial_index(pipeline, upload, monkeypatch):
+    # One chunk per embedding call, and the second call fails
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_CONCURRENCY", 1)
+    pipeline.embeddings.fail_after = 1
+    queue = IngestionQueue()
+    document_id, path = upload()
+    queue._run(document_id, path, "txt", "policy.txt", 1)
+
+    assert status_of(document_id).status == "failed"
+    assert queue.get_progress(document_id)["stage"] == "failed"
+    assert pipeline.vector_store.get_document_count() == 0
+    assert len(pipeline.lexical_index) == 0
+
+
+def test_recover_requeues_documents_whose_upload_exists(pipeline, upload, tmp_path, monkeypatch):
+    queue = IngestionQueue()
+    submitted = []
+    monkeypatch.setattr(queue, "submit", lambda **job: submitted.append(job))
+    kept_id, _ = upload(name="kept.txt")
+    lost_id, lost_path = upload(name="lost.txt")
+    (tmp_path / "lost.txt").unlink()
+
+    queue.recover(str(tmp_path))
+
+    assert [job["document_id"] for job in submitted] == [kept_id]
+    assert submitted[0]["file_path"] == str(tmp_path / "kept.txt")
+    assert status_of(kept_id).status == "processing"
+    assert status_of(lost_id).status == "failed"
+
+
+def test_identical_upload_reuses_the_original_vectors(pipeline, upload):
+    queue = IngestionQueue()
+    original_id, path = upload(name="original.txt")
+    queue._run(original_id, path, "txt", "original.txt", 1)
+    calls = len(pipeline.embeddings.calls)
+
+    copy_id, copy_path = upload(name="copy.txt")
+    queue._run(copy_id, copy_path, "txt", "copy.txt", 1)
+
+    assert len(pipeline.embeddings.calls) == calls
+    assert status_of(copy_id) == status_of(original_id)
+    hits = pipeline.vector_store.query(pipeline.embeddings.vector("x"), n_results=100, where={"document_id": copy_id})
+    assert {meta["filename"] for meta in hits["metadatas"][0]} == {"copy.txt"}
+
+
+def test_revised_upload_only_embeds_changed_chunks(pipeline, upload):
+    queue = IngestionQueue()
+    original_id, path = upload(name="v1.txt")
+    queue._run(original_id, path, "txt", "v1.txt", 1)
+    pipeline.embeddings.calls.clear()
+
+    revised = TEXT + "Appendix. Contractors follow a separate leave policy.\n\n"
+    revised_id, revised_path = upload(revised, name="v2.txt")
+    queue._run(revised_id, revised_path, "txt", "v2.txt", 1)
+
+    embedded = [text for call in pipeline.embeddings.calls for text in call]
+    assert 0 < len(embedded) < status_of(revised_id).chunk_count
+    assert any("Contractors" in text for text in embedded)
@@ -0,0 +1,86 @@
+import pytest
+
+from app.core.config import settings
+from app.rag.lexical_index import BM25Index, tokenize
+
+CHUNKS = {
+    "doc_1_chunk_0": "Submit Form 27B to payroll before the fifth of each month.",
+    "doc_1_chunk_1": "Payroll questions go to the finance team.",
+    "doc_2_chunk_0": "Annual leave is twenty days; unused leave carries over.",
+}
+
+
+def build(path=None):
+    index = BM25Index(path)
+    index.add(list(CHUNKS), [int(vector_id.split("_")[1]) for vector_id in CHUNKS], list(CHUNKS.values()))
+    return index
+
+
+def test_tokenize_drops_stopwords_and_punctuation():
+    assert tokenize("What is Form 27B?") == ["form", "27b"]
+
+
+def test_search_ranks_exact_terms_first():
+    index = build()
+    hits = index.search("form 27b payroll", n_results=5)
+    assert [vector_id for vector_id, _ in hits] == ["doc_1_chunk_0", "doc_1_chunk_1"]
+    assert index.search("the of", n_results=5) == []
+
+
+def test_deleted_and_replaced_rows_are_not_returned():
+    index = build()
+    index.delete_by_document_id(1)
+    assert index.search("payroll", n_results=5) == []
+    index.add(["doc_2_chunk_0"], [2], ["Sick leave needs a doctor's note."])
+    assert [vector_id for vector_id, _ in index.search("sick", n_results=5)] == ["doc_2_chunk_0"]
+    assert index.search("annual", n_results=5) == []
+    assert len(index) == 1
+
+
+def test_index_is_reloaded_from_its_log(tmp_path):
+    index = build(str(tmp_path))
+    index.delete_by_document_id(2)
+    reloaded = BM25Index(str(tmp_path))
+    assert len(reloaded) == 2
+    assert reloaded.search("leave", n_results=5) == []
+    assert reloaded.search("finance", n_results=5)[0][0] == "doc_1_chunk_1"
+
+
+def results(ids):
+    return {
+        "ids": [ids],
+        "documents": [[f"text of {vector_id}" for vector_id in ids]],
+        "metadatas": [[{"chunk": vector_id} for vector_id in ids]],
+    }
+
+
+def test_fusion_favours_chunks_found_by_both_retrievers(pipeline):
+    fused = pipeline._fuse(results(["a", "b", "c"]), [("c", 9.0), ("d", 5.0)], 3, fetched={})
+    assert fused["ids"][0] == ["c", "a", "b"]
+    assert fused["documents"][0][0] == "text of c"
+
+
+def test_fusion_reads_lexical_only_chunks_from_fetched(pipeline):
+    lexical_hits = [("d", 9.0), ("a", 5.0)]
+    assert pipeline._lexical_only(results(["a", "b"]), lexical_hits) == ["d"]
+    fetched = {"d": {"values": [], "metadata": {"text": "text of d", "chunk": "d"}}}
+    fused = pipeline._fuse(results(["a", "b"]), lexical_hits, 3, fetched)
+    assert fused["ids"][0] == ["a", "d", "b"]
+    assert fused["documents"][0][1] == "text of d"
+    assert fused["metadatas"][0][1] == {"chunk": "d"}
+
+
+def test_lexical_rows_follow_upserted_vectors(pipeline, monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_BATCH_SIZE", 2)
+    monkeypatch.setattr(settings, "EMBEDDING_MAX_CONCURRENCY", 1)
+    pipeline.embeddings.fail_after = 2
+    chunks = [f"Paragraph {i} about payroll deadlines." for i in range(6)]
+    with pytest.raises(RuntimeError):
+        pipeline.index_document(7, chunks, "payroll.txt", 1)
+    assert len(pipeline.lexical_index) == pipeline.vector_store.count
+
+    pipeline.embeddings.fail_after = None
+    assert pipeline.index_document(7, chunks, "payroll.txt", 1) == 6
+    assert len(pipeline.lexical_index) == 6
+    pipeline.delete_document(7)
+    assert pipeline.lexical_index.search("payroll", n_results=10) == []
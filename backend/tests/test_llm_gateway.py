@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+
+from app.rag.llm_gateway import (
+    CircuitBreaker,
+    LLMGateway,
+    LocalProvider,
+    ProviderUnavailableError,
+    StreamInterruptedError,
+)
+
+QUESTION = "Context...\nUSER QUESTION: how many leave days"
+
+
+class FakeProvider(LocalProvider):
+    """Local provider that can fail before its first token or after `fail_after_tokens` tokens"""
+
+    def __init__(self, name, first_token_ms=1.0, failing=False, fail_after_tokens=None):
+        super().__init__(first_token_ms=first_token_ms, token_ms=0)
+        self.name = name
+        self.failing = failing
+        self.fail_after_tokens = fail_after_tokens
+        self.calls = 0
+
+    def complete(self, *args):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError(f"{self.name} is down")
+        return super().complete(*args)
+
+    async def acomplete(self, *args):
+        self.calls += 1
+        await asyncio.sleep(self.first_token_ms / 1000)
+        if self.failing:
+            raise ConnectionError(f"{self.name} is down")
+        return f"{self.name}: " + await super().acomplete(*args)
+
+    async def astream(self, *args):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError(f"{self.name} is down")
+        async for i, token in _aenumerate(super().astream(*args)):
+            if i == self.fail_after_tokens:
+                raise ConnectionError(f"{self.name} dropped the stream")
+            yield token
+
+
+async def _aenumerate(chunks):
+    i = 0
+    async for chunk in chunks:
+        yield i, chunk
+        i += 1
+
+
+def gateway(*providers, **options):
+    options.setdefault("hedge_enabled", False)
+    return LLMGateway(list(providers), failure_threshold=2, cooldown_seconds=0.05, **options)
+
+
+def test_breaker_opens_half_opens_and_closes():
+    breaker = CircuitBreaker("primary", failure_threshold=2, cooldown_seconds=0.05, slow_call_seconds=1.0)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial call at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success("complete", 0.01)
+    assert breaker.state == "closed"
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker("primary", failure_threshold=1, slow_call_seconds=0.5)
+    breaker.record_success("complete", 2.0)
+    assert breaker.state == "open"
+
+
+def test_failover_skips_an_open_circuit():
+    primary, secondary = FakeProvider("primary", failing=True), FakeProvider("secondary")
+    llm = gateway(primary, secondary)
+    for _ in range(3):
+        assert llm.complete("system", QUESTION) == "how many leave days"
+    assert primary.calls == 2
+    assert llm.stats()["providers"]["primary"]["state"] == "open"
+
+
+def test_slow_primary_is_hedged():
+    primary, secondary = FakeProvider("primary", first_token_ms=500), FakeProvider("secondary")
+    llm = gateway(primary, secondary, hedge_enabled=True, hedge_min_delay_ms=10, hedge_max_delay_ms=20)
+    assert asyncio.run(llm.acomplete("system", QUESTION)) == "secondary: how many leave days"
+    assert (llm.hedges, llm.hedge_wins) == (1, 1)
+
+
+def test_stream_fails_over_before_the_first_token():
+    llm = gateway(FakeProvider("primary", failing=True), FakeProvider("secondary"))
+
+    async def collect():
+        return "".join([chunk async for chunk in llm.astream("system", QUESTION)])
+
+    assert asyncio.run(collect()).strip() == "how many leave days"
+
+
+def test_stream_is_not_spliced_after_the_first_token():
+    secondary = FakeProvider("secondary")
+    llm = gateway(FakeProvider("primary", fail_after_tokens=2), secondary)
+
+    async def collect(chunks):
+        async for chunk in llm.astream("system", QUESTION):
+            chunks.append(chunk)
+
+    chunks = []
+    with pytest.raises(StreamInterruptedError):
+        asyncio.run(collect(chunks))
+    assert chunks == ["how ", "many "]
+    assert secondary.calls == 0
+
+
+def test_no_providers():
+    with pytest.raises(ProviderUnavailableError):
+        asyncio.run(gateway().acomplete("system", QUESTION))
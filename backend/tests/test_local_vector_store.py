@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from app.rag.local_vector_store import LocalVectorStore
+
+DIM = 8
+
+
+def vectors(n, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, DIM)).tolist()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(str(tmp_path), dimension=DIM)
+
+
+def add(store, document_id, embeddings):
+    store.add_documents(
+        documents=[f"text {document_id}-{i}" for i in range(len(embeddings))],
+        embeddings=embeddings,
+        metadatas=[{"document_id": document_id, "chunk_index": i} for i in range(len(embeddings))],
+        ids=[f"doc_{document_id}_chunk_{i}" for i in range(len(embeddings))]
+    )
+
+
+def test_query_returns_nearest_first(store):
+    embeddings = vectors(20)
+    add(store, 1, embeddings)
+    results = store.query(embeddings[7], n_results=3)
+    assert results["ids"][0][0] == "doc_1_chunk_7"
+    assert results["documents"][0][0] == "text 1-7"
+    assert "text" not in results["metadatas"][0][0]
+
+
+def test_where_filter(store):
+    add(store, 1, vectors(5, seed=1))
+    add(store, 2, vectors(5, seed=2))
+    results = store.query(vectors(1, seed=3)[0], n_results=10, where={"document_id": 2})
+    assert {meta["document_id"] for meta in results["metadatas"][0]} == {2}
+
+
+def test_existing_ids_are_overwritten(store):
+    add(store, 1, vectors(3, seed=1))
+    replacement = vectors(3, seed=2)
+    add(store, 1, replacement)
+    assert store.count == 3
+    assert store.query(replacement[2], n_results=1)["ids"][0] == ["doc_1_chunk_2"]
+
+
+def test_delete_and_reload(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dimension=DIM)
+    add(store, 1, vectors(4, seed=1))
+    add(store, 2, vectors(4, seed=2))
+    store.delete_by_document_id(1)
+    assert store.get_document_count() == 4
+
+    reloaded = LocalVectorStore(str(tmp_path), dimension=DIM)
+    assert reloaded.get_document_count() == 4
+    ids = reloaded.query(vectors(1, seed=3)[0], n_results=10)["ids"][0]
+    assert all(vector_id.startswith("doc_2_") for vector_id in ids)
+
+
+def test_fetch_returns_normalised_values(store):
+    add(store, 1, [[3.0, 4.0] + [0.0] * (DIM - 2)])
+    fetched = store.fetch(["doc_1_chunk_0", "missing"])
+    assert list(fetched) == ["doc_1_chunk_0"]
+    assert fetched["doc_1_chunk_0"]["values"][:2] == pytest.approx([0.6, 0.8])
+
+
+def test_wrong_dimension_is_rejected(store):
+    with pytest.raises(ValueError):
+        add(store, 1, [[1.0, 2.0]])
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.database.connection import SessionLocal
+from app.database.models import ChatMessage, ChatSession
+from app.services.message_writer import ChatMessageWriter
+
+
+@pytest.fixture
+def sessions(database):
+    with SessionLocal() as db:
+        rows = [ChatSession(title=f"Chat {i}", updated_at=datetime(2024, 1, 1)) for i in range(2)]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+
+
+def messages_of(session_id):
+    with SessionLocal() as db:
+        return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.id).all()
+
+
+def updated_at(session_id):
+    with SessionLocal() as db:
+        return db.get(ChatSession, session_id).updated_at
+
+
+def test_concurrent_turns_are_written_in_one_batch(run, sessions):
+    first, second = sessions
+    writer = ChatMessageWriter(flush_interval_ms=50)
+    asked_at = datetime.utcnow() - timedelta(seconds=30)
+
+    async def main():
+        await asyncio.gather(
+            writer.submit(first, [("user", "Q1"), ("assistant", "A1")], asked_at=asked_at),
+            writer.submit(second, [("user", "Q2"), ("assistant", "A2")]),
+        )
+        await writer.shutdown()
+
+    run(main())
+    assert writer.flushes == 1
+
+    question, answer = messages_of(first)
+    assert (question.content, answer.content) == ("Q1", "A1")
+    assert question.created_at == asked_at < answer.created_at
+    # Each session's last activity is its own newest message
+    assert updated_at(first) == answer.created_at
+    assert updated_at(second) == messages_of(second)[-1].created_at
+
+
+def test_failed_turn_does_not_take_the_batch_down(run, sessions):
+    good, bad = sessions
+    writer = ChatMessageWriter(flush_interval_ms=50, max_retries=0)
+
+    async def insert(rows):
+        if any(row["session_id"] == bad for row in rows):
+            raise RuntimeError("session was deleted")
+        await ChatMessageWriter._insert(rows)
+
+    writer._insert = insert
+
+    async def main():
+        results = await asyncio.gather(
+            writer.submit(good, [("user", "Q"), ("assistant", "A")]),
+            writer.submit(bad, [("user", "Q"), ("assistant", "A")]),
+            return_exceptions=True,
+        )
+        await writer.wait_for_session(bad)
+        await writer.shutdown()
+        return results
+
+    saved, failed = run(main())
+    assert saved is None
+    assert isinstance(failed, RuntimeError)
+    assert [message.content for message in messages_of(good)] == ["Q", "A"]
+    assert messages_of(bad) == []
@@ -0,0 +1,45 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.password_hasher import PasswordHasher, PasswordHasherBusyError, password_hasher
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_queue=1)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify(hasher):
+    hashed = hasher.hash("s3cret")
+    assert hasher.verify("s3cret", hashed)
+    assert not hasher.verify("wrong", hashed)
+    assert asyncio.run(hasher.averify("s3cret", asyncio.run(hasher.ahash("s3cret"))))
+    assert hasher.stats()["completed"] == 5
+
+
+def test_calls_beyond_the_queue_fail_fast(hasher):
+    release = threading.Event()
+    running = hasher._submit(release.wait)
+    queued = hasher._submit(lambda: None)
+    with pytest.raises(PasswordHasherBusyError):
+        hasher._submit(lambda: None)
+
+    stats = hasher.stats()
+    assert (stats["running"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+    release.set()
+    running.result(), queued.result()
+    assert hasher.stats()["queued"] == 0
+
+
+def test_busy_login_is_a_503(client, monkeypatch):
+    async def busy(*args):
+        raise PasswordHasherBusyError("64 password operations in progress")
+
+    monkeypatch.setattr(password_hasher, "averify", busy)
+    response = client.post("/api/v1/auth/login", data={"username": "admin", "password": "admin123"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,43 @@
+import time
+
+from app.core.principal_cache import Principal, PrincipalCache
+
+ALICE = Principal(id=1, username="alice", role="user", is_active=True)
+
+
+def test_principal_is_cached_until_it_expires(monkeypatch):
+    cache = PrincipalCache(ttl_seconds=30)
+    assert cache.get(1) is None
+    cache.put(ALICE, cache.generation(1))
+    assert cache.get(1) == ALICE
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 31)
+    assert cache.get(1) is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 2}
+
+
+def test_load_racing_an_invalidation_is_not_cached():
+    cache = PrincipalCache()
+    generation = cache.generation(1)
+    cache.invalidate(1)  # e.g. an admin deactivates the user while the old row is being read
+    cache.put(ALICE, generation)
+    assert cache.get(1) is None
+    cache.put(ALICE._replace(is_active=False), cache.generation(1))
+    assert cache.get(1).is_active is False
+
+
+def test_least_recently_used_principal_is_evicted():
+    cache = PrincipalCache(max_entries=2)
+    for user_id in (1, 2):
+        cache.put(ALICE._replace(id=user_id), 0)
+    cache.get(1)
+    cache.put(ALICE._replace(id=3), 0)
+    assert cache.get(2) is None
+    assert cache.get(1) is not None and cache.get(3) is not None
+
+
+def test_zero_ttl_disables_caching():
+    cache = PrincipalCache(ttl_seconds=0)
+    cache.put(ALICE, 0)
+    assert cache.get(1) is None
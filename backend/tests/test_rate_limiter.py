@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from app.rag.rate_limiter import TokenBucket
+
+
+def test_burst_up_to_capacity_does_not_wait():
+    bucket = TokenBucket(rate=1.0, capacity=5)
+    start = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.05
+
+
+def test_acquire_waits_for_refill():
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    bucket.acquire()
+    start = time.monotonic()
+    bucket.acquire()
+    # One token refills in 1/20 s
+    assert time.monotonic() - start >= 0.04
+
+
+def test_rate_is_respected_over_many_calls():
+    bucket = TokenBucket(rate=100.0, capacity=1)
+    start = time.monotonic()
+    for _ in range(11):
+        bucket.acquire()
+    # The first call is free, the next ten wait 10ms each
+    assert time.monotonic() - start >= 0.09
+
+
+def test_requests_larger_than_capacity_are_capped():
+    bucket = TokenBucket(rate=1000.0, capacity=2)
+    start = time.monotonic()
+    bucket.acquire(tokens=10)
+    assert time.monotonic() - start < 0.05
+
+
+def test_zero_rate_disables_limiting():
+    bucket = TokenBucket(rate=0, capacity=1)
+    for _ in range(100):
+        bucket.acquire()
+
+
+def test_async_and_sync_callers_share_the_bucket():
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    bucket.acquire()
+
+    async def take():
+        start = time.monotonic()
+        await bucket.aacquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(take()) >= 0.04
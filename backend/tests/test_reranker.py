@@ -0,0 +1,41 @@
+from app.rag.reranker import Reranker
+
+
+def results(documents):
+    return {
+        "ids": [[f"chunk_{i}" for i in range(len(documents))]],
+        "documents": [documents],
+        "metadatas": [[{"rank": i} for i in range(len(documents))]],
+    }
+
+
+def test_chunks_covering_the_query_move_up():
+    reranked = Reranker(top_k=2).rerank("overtime pay rate", results([
+        "Office hours are nine to five.",
+        "The overtime pay rate is 1.5x the base rate.",
+    ]))
+    assert reranked["ids"][0] == ["chunk_1", "chunk_0"]
+    assert reranked["metadatas"][0] == [{"rank": 1}, {"rank": 0}]
+
+
+def test_near_duplicates_do_not_crowd_out_other_chunks():
+    documents = [
+        "The overtime pay rate applies on weekends and holidays.",
+        "The overtime pay rate applies on weekends and holidays.",
+        "Overtime needs approval from a manager.",
+    ]
+    assert Reranker(mmr_lambda=0.5).rerank("overtime pay rate", results(documents), 2)["ids"][0] == ["chunk_0", "chunk_2"]
+    assert Reranker(mmr_lambda=1.0).rerank("overtime pay rate", results(documents), 2)["ids"][0] == ["chunk_0", "chunk_1"]
+
+
+def test_retrieval_order_is_kept_when_the_time_budget_runs_out():
+    reranked = Reranker(top_k=2, time_budget_ms=0).rerank("overtime pay rate", results([
+        "Office hours are nine to five.",
+        "The overtime pay rate is 1.5x the base rate.",
+    ]))
+    assert reranked["ids"][0] == ["chunk_0", "chunk_1"]
+
+
+def test_single_result_is_returned_as_is():
+    single = results(["Only one chunk."])
+    assert Reranker().rerank("anything", single) is single
@@ -0,0 +1,80 @@
+import hashlib
+import os
+import uuid
+
+import pytest
+
+from app.api import documents as documents_api
+from app.core.config import settings
+from app.database.connection import SessionLocal
+from app.database.models import Document
+
+API = "/api/v1/documents"
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """Ingestion jobs the uploads queue, instead of running them.
+
+    Request it before `client`: the uploaded files are removed after the app
+    shuts down, so a later startup does not resume the jobs.
+    """
+    jobs = []
+    monkeypatch.setattr(documents_api.ingestion_queue, "submit", lambda **job: jobs.append(job))
+    yield jobs
+    for job in jobs:
+        os.remove(job["file_path"])
+
+
+def upload(client, content, filename="policy.txt"):
+    return client.post(f"{API}/upload", files={"file": (filename, content, "text/plain")})
+
+
+def set_status(document_id, status):
+    with SessionLocal() as db:
+        db.get(Document, document_id).status = status
+        db.commit()
+
+
+def test_upload_is_hashed_and_queued(submitted, client):
+    content = f"Leave policy {uuid.uuid4()}\n".encode() * 100
+    response = upload(client, content)
+    assert response.status_code == 202
+
+    job = submitted[-1]
+    assert job["document_id"] == response.json()["id"]
+    assert job["content_hash"] == hashlib.sha256(content).hexdigest()
+    with open(job["file_path"], "rb") as f:
+        assert f.read() == content
+
+
+def test_oversized_upload_is_rejected(submitted, client, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 1000)
+    before = set(os.listdir(settings.UPLOAD_DIR))
+    assert upload(client, b"x" * 1001).status_code == 413
+    assert upload(client, b"x" * 1000).status_code == 202
+    assert len(set(os.listdir(settings.UPLOAD_DIR)) - before) == 1  # no partial file left behind
+    assert len(submitted) == 1
+
+
+def test_identical_upload_is_accepted_by_default(submitted, client):
+    content = f"Handbook {uuid.uuid4()}".encode()
+    assert upload(client, content).status_code == 202
+    assert upload(client, content, "copy.txt").status_code == 202
+    assert submitted[0]["content_hash"] == submitted[1]["content_hash"]
+
+
+def test_identical_upload_is_refused_when_configured(submitted, client, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_REJECT_DUPLICATES", True)
+    content = f"Handbook {uuid.uuid4()}".encode()
+    first = upload(client, content)
+    assert first.status_code == 202
+
+    response = upload(client, content, "copy.txt")
+    assert response.status_code == 409
+    assert f"(document {first.json()['id']})" in response.json()["detail"]
+
+    # A failed document does not block a retry
+    set_status(first.json()["id"], "failed")
+    assert upload(client, content, "retry.txt").status_code == 202
+    assert len(submitted) == 2
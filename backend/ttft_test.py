@@ -0,0 +1,62 @@
+import json
+import sys
+import time
+
+import requests
+
+BASE_URL = sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"
+
+queries = [
+    "What is the leave policy?",
+    "How do I submit expenses?",
+    "What are office hours?"
+]
+
+
+def main():
+    print("=" * 60)
+    print("TIME-TO-FIRST-TOKEN TEST - /chat/stream")
+    print("=" * 60)
+
+    auth_response = requests.post(
+        f"{BASE_URL}/api/v1/auth/login",
+        data={"username": "admin", "password": "admin123"}
+    )
+    if auth_response.status_code != 200:
+        print(f"Login failed: {auth_response.text}")
+        return
+    headers = {"Authorization": f"Bearer {auth_response.json()['access_token']}"}
+
+    session = requests.Session()
+    session_id = None
+    for query in queries:
+        print(f"\nQuery: {query}")
+        print("-" * 60)
+
+        start = time.time()
+        first_token = None
+        with session.post(
+            f"{BASE_URL}/api/v1/chat/stream",
+            json={"message": query, "session_id": session_id},
+            headers=headers,
+            stream=True
+        ) as r:
+            for line in r.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                data = json.loads(line[6:])
+                if "content" in data and first_token is None:
+                    first_token = time.time() - start
+                session_id = data.get("session_id", session_id)
+        total = time.time() - start
+
+        print(f"First token: {first_token:.3f}s" if first_token is not None else "First token: none")
+        print(f"Total: {total:.3f}s")
+
+    print("\n" + "=" * 60)
+    print("TTFT TEST COMPLETE")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -514,7 +514,7 @@ function Chat() {
               }}
             >
               {user?.profile_photo ? (
-                <img src={user.profile_photo} alt="" style={{
+                <img src={user.profile_photo_thumb || user.profile_photo} alt="" style={{
                   width: '36px',
                   height: '36px',
                   borderRadius: '50%',
@@ -8,6 +8,8 @@ import api from '../services/api';
 import { getUser, logout, isAdmin } from '../utils/auth';
 import ProfileModal from '../components/ProfileModal';
 
+const DOCUMENTS_PAGE_SIZE = 50;
+
 // Role configurations
 const ROLE_CONFIG = {
     admin: {
@@ -59,6 +61,7 @@ function Dashboard() {
     const [user, setUser] = useState(null);
     const [stats, setStats] = useState({ documents: 0, sessions: 0, users: 0 });
     const [documents, setDocuments] = useState([]);
+    const [documentsCursor, setDocumentsCursor] = useState(null);
     const [loading, setLoading] = useState(true);
     const [showProfileMenu, setShowProfileMenu] = useState(false);
     const [showProfileModal, setShowProfileModal] = useState(false);
@@ -94,15 +97,19 @@ function Dashboard() {
     const loadData = async () => {
         setLoading(true);
         try {
-            // Load documents
-            const docsRes = await api.get('/documents/');
+            // Load the first page of documents and the total count
+            const [docsRes, countRes] = await Promise.all([
+                api.get('/documents/', { params: { limit: DOCUMENTS_PAGE_SIZE } }),
+                api.get('/documents/count')
+            ]);
             setDocuments(docsRes.data || []);
+            setDocumentsCursor(docsRes.headers['x-next-cursor'] || null);
 
             // Load chat sessions
             const sessionsRes = await api.get('/chat/sessions');
 
             setStats({
-                documents: Array.isArray(docsRes.data) ? docsRes.data.length : 0,
+                documents: countRes.data?.total ?? 0,
                 sessions: Array.isArray(sessionsRes.data) ? sessionsRes.data.length : 0,
                 users: 0
             });
@@ -127,6 +134,18 @@ function Dashboard() {
         }
     };
 
+    const loadMoreDocuments = async () => {
+        try {
+            const res = await api.get('/documents/', {
+                params: { limit: DOCUMENTS_PAGE_SIZE, cursor: documentsCursor }
+            });
+            setDocuments(prev => [...prev, ...(res.data || [])]);
+            setDocumentsCursor(res.headers['x-next-cursor'] || null);
+        } catch (error) {
+            console.error('Failed to load more documents:', error);
+        }
+    };
+
     // Chat functions
     const handleSendMessage = async (message) => {
         if (!message?.trim() || chatLoading) return;
@@ -183,7 +202,7 @@ function Dashboard() {
             alert('Document uploaded successfully!');
         } catch (error) {
             console.error('Upload failed:', error);
-            alert('Failed to upload document');
+            alert(error.response?.data?.detail || 'Failed to upload document');
         } finally {
             setUploading(false);
             if (fileInputRef.current) fileInputRef.current.value = '';
@@ -271,7 +290,7 @@ function Dashboard() {
                             onClick={() => setShowProfileMenu(!showProfileMenu)}
                         >
                             {user?.profile_photo ? (
-                                <img src={user.profile_photo} alt="" className="avatar" style={{ width: '36px', height: '36px' }} />
+                                <img src={user.profile_photo_thumb || user.profile_photo} alt="" className="avatar" style={{ width: '36px', height: '36px' }} />
                             ) : (
                                 <div style={{
                                     width: '36px', height: '36px', borderRadius: '50%',
@@ -420,7 +439,7 @@ function Dashboard() {
                 <div>
                     <div style={{ display: 'flex', justifyContent: 'space-between', alignItems: 'center', marginBottom: '16px' }}>
                         <h3 style={{ fontSize: '1.25rem', fontWeight: '600' }}>
-                            All Documents ({documents.length})
+                            All Documents ({stats.documents})
                         </h3>
                         <select
                             className="input select"
@@ -507,6 +526,13 @@ function Dashboard() {
                                     ))}
                                 </tbody>
                             </table>
+                            {documentsCursor && (
+                                <div style={{ textAlign: 'center', padding: '16px' }}>
+                                    <button className="btn btn-ghost" onClick={loadMoreDocuments}>
+                                        Load more
+                                    </button>
+                                </div>
+                            )}
                         </div>
                     )}
                 </div>
@@ -64,8 +64,12 @@ export const documentsAPI = {
     });
     return response.data;
   },
-  list: async () => {
-    const response = await api.get('/documents/');
+  list: async (params = {}) => {
+    const response = await api.get('/documents/', { params });
+    return response.data;
+  },
+  count: async (params = {}) => {
+    const response = await api.get('/documents/count', { params });
     return response.data;
   },
   get: async (id) => {